@@ -1,5 +1,6 @@
 from .base import BaseAccessPolicy
-from mastery.models import Subject, UserGroup, UserSchool, Group
+from .scope import get_principal_scope
+from mastery.models import Subject, UserGroup, Group
 from django.db.models import Q, Exists, OuterRef
 import logging
 
@@ -20,6 +21,12 @@ class GoalAccessPolicy(BaseAccessPolicy):
             "principal": ["authenticated"],
             "effect": "allow",
         },
+        # Inspectors and school admins can export the goals scope_queryset gives them
+        {
+            "action": ["export"],
+            "principal": ["role:admin", "role:inspector"],
+            "effect": "allow",
+        },
         # Students can create individual goals for themselves
         {
             "action": ["create"],
@@ -74,15 +81,11 @@ class GoalAccessPolicy(BaseAccessPolicy):
         if requester.is_superadmin:
             return qs
         try:
-            teacher_group_ids = list(
-                requester.teacher_groups.values_list('id', flat=True))
-            teacher_basis_group_ids = list(
-                requester.teacher_groups.filter(type='basis').values_list('id', flat=True))
-            student_group_ids = list(
-                requester.student_groups.values_list('id', flat=True))
-            school_employee_ids = UserSchool.objects.filter(
-                user_id=requester.id, role__name__in=["admin", "inspector"]).values_list(
-                "school_id", flat=True).distinct()
+            scope = get_principal_scope(request)
+            teacher_group_ids = scope.teacher_group_ids
+            teacher_basis_group_ids = scope.teacher_basis_group_ids
+            student_group_ids = scope.student_group_ids
+            school_employee_ids = scope.employee_school_ids
 
             # Everyone can see goals they created
             filters = Q(created_by=requester)
@@ -102,21 +105,23 @@ class GoalAccessPolicy(BaseAccessPolicy):
                     group_id__in=teacher_group_ids,  # Groups the teacher teaches
                     group__subject_id=OuterRef('subject_id'),  # Subject from the goal
                 )
-
-                qs = qs.annotate(teacher_teaches_student_subject=Exists(student_in_teacher_subject))
-                filters |= Q(student__isnull=False, teacher_teaches_student_subject=True)
+                filters |= Q(student__isnull=False) & Exists(student_in_teacher_subject)
 
             # Basis group teachers: All goals for students in their basis group
             if teacher_basis_group_ids:
-                filters |= Q(student__groups__id__in=teacher_basis_group_ids)
-                filters |= Q(group__members__groups__id__in=teacher_basis_group_ids)
+                # Semi-joins rather than joins through memberships, so that no rows are repeated
+                basis_student_ids = UserGroup.objects.filter(
+                    group_id__in=teacher_basis_group_ids).values('user_id')
+                filters |= Q(student_id__in=basis_student_ids)
+                filters |= Exists(UserGroup.objects.filter(
+                    group_id=OuterRef('group_id'), user_id__in=basis_student_ids))
 
             # Students: Own individual goals + group goals in their groups
             filters |= Q(student=requester)
             if student_group_ids:
                 filters |= Q(group_id__in=student_group_ids)
 
-            return qs.filter(filters).distinct()
+            return qs.filter(filters)
         except Exception:
             logger.exception("GoalAccessPolicy.scope_queryset")
             return qs.none()
@@ -145,32 +150,23 @@ class GoalAccessPolicy(BaseAccessPolicy):
         - Individual goals: Must be basis group teacher OR teach that subject to that student
         """
         try:
-            requester = request.user
             student_id = request.data.get('student_id')
             group_id = request.data.get('group_id')
 
             # Group goal: Must teach that group
             if group_id is not None:
-                return requester.teacher_groups.filter(id=group_id).exists()
+                return str(group_id) in get_principal_scope(request).teacher_group_ids
 
             # Individual goal: Basis group teacher OR teaches that subject to that student
             if student_id is not None:
                 subject_id = request.data.get('subject_id') or request.data.get('subject')
-
-                # Check if basis group teacher for this student
-                is_basis_teacher = requester.teacher_groups.filter(
-                    type='basis',
-                    members__id=student_id
-                ).exists()
-
-                # Check if teaches this subject to this student
-                teaches_subject = requester.teacher_groups.filter(
-                    subject_id=subject_id,
-                    members__id=student_id
+                scope = get_principal_scope(request)
+                return UserGroup.objects.filter(
+                    Q(group_id__in=scope.teacher_basis_group_ids) | Q(group__subject_id=subject_id),
+                    user_id=student_id,
+                    group_id__in=scope.teacher_group_ids,
                 ).exists()
 
-                return is_basis_teacher or teaches_subject
-
             return False
         except Exception:
             logger.exception("GoalAccessPolicy.can_teacher_create_goal")
@@ -196,26 +192,18 @@ class GoalAccessPolicy(BaseAccessPolicy):
         """
         try:
             target_goal = view.get_object()
-            requester = request.user
+            scope = get_principal_scope(request)
 
             # Group goal: Must teach that group
             if target_goal.group_id:
-                return requester.teacher_groups.filter(id=target_goal.group_id).exists()
+                return target_goal.group_id in scope.teacher_group_ids
 
             # Individual goal: Basis group teacher OR teaches that subject to that student
-            basis_group_ids = requester.teacher_groups.filter(type='basis').values_list('id', flat=True)
-            is_basis_teacher = UserGroup.objects.filter(
+            return UserGroup.objects.filter(
+                Q(group_id__in=scope.teacher_basis_group_ids) | Q(group__subject_id=target_goal.subject_id),
                 user_id=target_goal.student_id,
-                group_id__in=basis_group_ids
+                group_id__in=scope.teacher_group_ids,
             ).exists()
-
-            # Check if teaches this subject to this student
-            is_teacher_of_subject = requester.teacher_groups.filter(
-                subject_id=target_goal.subject_id,
-                members__id=target_goal.student_id
-            ).exists()
-
-            return is_basis_teacher or is_teacher_of_subject
         except Exception:
             logger.exception("GoalAccessPolicy.can_teacher_modify_goal")
             return False
@@ -238,10 +226,7 @@ class GoalAccessPolicy(BaseAccessPolicy):
             if not school_id:
                 return False
 
-            school_admin_ids = UserSchool.objects.filter(
-                user_id=request.user.id, role__name="admin").values_list("school_id", flat=True).distinct()
-
-            return school_id in school_admin_ids
+            return school_id in get_principal_scope(request).admin_school_ids
 
         except Exception:
             logger.exception("SubjectAccessPolicy.belongs_to_group")
@@ -1,6 +1,7 @@
 from .base import BaseAccessPolicy
+from .scope import get_principal_scope
 from django.db.models import Q
-from mastery.models import UserSchool, Group, UserGroup
+from mastery.models import UserGroup
 import logging
 logger = logging.getLogger(__name__)
 
@@ -20,6 +21,13 @@ class GroupAccessPolicy(BaseAccessPolicy):
             "effect": "allow",
             "condition": "is_admin_at_school",
         },
+        # Teachers and school employees can see the mastery matrix and status suggestions of groups in
+        # their scope_queryset
+        {
+            "action": ["mastery_matrix", "status_suggestions"],
+            "principal": ["role:teacher", "role:admin", "role:inspector"],
+            "effect": "allow",
+        },
         # Authenticated user can list according to scope_queryset
         {
             "action": ["list", "retrieve"],
@@ -35,30 +43,25 @@ class GroupAccessPolicy(BaseAccessPolicy):
         if user.is_superadmin:
             return qs
         try:
-            school_admin_ids = UserSchool.objects.filter(
-                user_id=user.id, role__name__in=["admin", "inspector"]
-            ).values_list("school_id", flat=True).distinct()
-            teacher_groups = user.teacher_groups
-            student_groups = user.student_groups
+            scope = get_principal_scope(request)
+            school_admin_ids = scope.employee_school_ids
 
-            # Basis groups where user is a teacher
-            basis_teacher_groups = teacher_groups.filter(type='basis')
-            # Students in those basis groups
+            # Students in basis groups where user is a teacher
             student_ids_in_basis_groups = UserGroup.objects.filter(
-                group__in=basis_teacher_groups,
+                group_id__in=scope.teacher_basis_group_ids,
                 role__name='student'
-            ).values_list('user_id', flat=True).distinct()
+            ).values('user_id')
             # Groups those students are members of
-            groups_of_basis_students = Group.objects.filter(
-                members__id__in=student_ids_in_basis_groups
-            ).distinct().values('id')
+            groups_of_basis_students = UserGroup.objects.filter(
+                user_id__in=student_ids_in_basis_groups
+            ).values('group_id')
 
             return qs.filter(
-                Q(id__in=teacher_groups.values("id"), is_enabled=True) |
-                Q(id__in=student_groups.values("id"), is_enabled=True) |
+                Q(id__in=scope.teacher_group_ids, is_enabled=True) |
+                Q(id__in=scope.student_group_ids, is_enabled=True) |
                 Q(school_id__in=school_admin_ids) |
                 Q(id__in=groups_of_basis_students, is_enabled=True)
-            ).distinct()
+            )
         except Exception:
             logger.exception("GroupAccessPolicy.scope_queryset")
             return qs.none()
@@ -68,8 +71,4 @@ class GroupAccessPolicy(BaseAccessPolicy):
         group = view.get_object()
         if not group or not group.school_id:
             return False
-        return UserSchool.objects.filter(
-            user_id=request.user.id,
-            school_id=group.school_id,
-            role__name="admin"
-        ).exists()
+        return group.school_id in get_principal_scope(request).admin_school_ids
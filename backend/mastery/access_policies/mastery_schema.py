@@ -1,4 +1,5 @@
 from .base import BaseAccessPolicy
+from .scope import get_principal_scope
 import logging
 logger = logging.getLogger(__name__)
 
@@ -28,8 +29,7 @@ class MasterySchemaAccessPolicy(BaseAccessPolicy):
         if user.is_superadmin:
             return qs
         try:
-            user_schools = user.get_schools()
-            return qs.filter(school_id__in=user_schools.values("id"))
+            return qs.filter(school_id__in=get_principal_scope(request).school_ids)
         except Exception:
             logger.exception("MasterySchemaAccessPolicy.scope_queryset")
             return qs.none()
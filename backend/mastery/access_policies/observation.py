@@ -1,7 +1,8 @@
 import logging
 from django.db.models import Q, Exists, OuterRef
 from .base import BaseAccessPolicy
-from mastery.models import Goal, UserGroup, UserSchool
+from .scope import get_principal_scope
+from mastery.models import Goal, UserGroup
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +21,12 @@ class ObservationAccessPolicy(BaseAccessPolicy):
             "principal": ["authenticated"],
             "effect": "allow",
         },
+        # Inspectors and school admins can export the observations scope_queryset gives them
+        {
+            "action": ["export"],
+            "principal": ["role:admin", "role:inspector"],
+            "effect": "allow",
+        },
         # Teachers can create observations for students they teach
         {
             "action": ["create"],
@@ -55,6 +62,12 @@ class ObservationAccessPolicy(BaseAccessPolicy):
             "effect": "allow",
             "condition": "is_admin_at_school"
         },
+        # Bulk create and update: each observation is checked with can_write_observations
+        {
+            "action": ["bulk"],
+            "principal": ["role:superadmin", "role:admin", "role:teacher", "role:student"],
+            "effect": "allow",
+        },
         # Everyone else: implicitly denied
     ]
 
@@ -75,13 +88,10 @@ class ObservationAccessPolicy(BaseAccessPolicy):
         if requester.is_superadmin:
             return qs
         try:
-            teacher_teaching_group_ids = list(requester.teacher_groups.filter(
-                type='teaching').values_list('id', flat=True))
-            teacher_basis_group_ids = list(requester.teacher_groups.filter(
-                type='basis').values_list('id', flat=True))
-            school_employee_ids = UserSchool.objects.filter(
-                user_id=requester.id, role__name__in=["admin", "inspector"]).values_list(
-                "school_id", flat=True).distinct()
+            scope = get_principal_scope(request)
+            teacher_teaching_group_ids = scope.teacher_teaching_group_ids
+            teacher_basis_group_ids = scope.teacher_basis_group_ids
+            school_employee_ids = scope.employee_school_ids
 
             # Everyone can see observations they created or observed
             filters = Q(created_by=requester)
@@ -103,18 +113,17 @@ class ObservationAccessPolicy(BaseAccessPolicy):
                     group_id__in=teacher_teaching_group_ids,
                     group__subject_id=OuterRef('subject_id'),
                 )
-                qs = qs.annotate(teacher_teaches_student_subject=Exists(
-                    memberships_in_teacher_group_on_subject))
-                filters |= Q(goal__student__isnull=False, teacher_teaches_student_subject=True)
+                filters |= Q(goal__student__isnull=False) & Exists(memberships_in_teacher_group_on_subject)
 
             # Basis teachers: All observations for students in their basis group
             if teacher_basis_group_ids:
-                filters |= Q(student__groups__id__in=teacher_basis_group_ids)
+                filters |= Q(student_id__in=UserGroup.objects.filter(
+                    group_id__in=teacher_basis_group_ids).values('user_id'))
 
             # Students: Observations about themselves (if visible)
             filters |= Q(student=requester, is_visible_to_student=True)
 
-            return qs.filter(filters).distinct()
+            return qs.filter(filters)
         except Exception:
             logger.exception("ObservationAccessPolicy.scope_queryset")
             return qs.none()
@@ -127,7 +136,6 @@ class ObservationAccessPolicy(BaseAccessPolicy):
         """
         try:
             goal_id = request.data.get("goal_id")
-            requester = request.user
 
             if not goal_id:
                 return False
@@ -141,22 +149,17 @@ class ObservationAccessPolicy(BaseAccessPolicy):
 
             # Group goal: Must teach that group
             if goal['group_id']:
-                return requester.teacher_groups.filter(id=goal['group_id']).exists()
+                return goal['group_id'] in get_principal_scope(request).teacher_group_ids
 
             # Individual goal: Basis group teacher OR teaches that subject to that student
             if goal['student_id']:
-                is_basis_teacher = requester.teacher_groups.filter(
-                    type='basis',
-                    members__id=goal['student_id']
-                ).exists()
-
-                teaches_subject = requester.teacher_groups.filter(
-                    subject_id=goal['subject_id'],
-                    members__id=goal['student_id']
+                scope = get_principal_scope(request)
+                return UserGroup.objects.filter(
+                    Q(group_id__in=scope.teacher_basis_group_ids) | Q(group__subject_id=goal['subject_id']),
+                    user_id=goal['student_id'],
+                    group_id__in=scope.teacher_group_ids,
                 ).exists()
 
-                return is_basis_teacher or teaches_subject
-
             return False
 
         except Exception:
@@ -213,25 +216,18 @@ class ObservationAccessPolicy(BaseAccessPolicy):
 
             # Group goal: Must teach that group
             if goal['group_id']:
-                return requester.teacher_groups.filter(id=goal['group_id']).exists()
+                return goal['group_id'] in get_principal_scope(request).teacher_group_ids
 
-            # Individual goal: Basis group teacher OR teaches that subject to that student
-            basis_group_ids = requester.teacher_groups.filter(
-                type='basis', school_id=goal['school_id']).values_list(
-                'id', flat=True)
-            is_basis_teacher = UserGroup.objects.filter(
+            # Individual goal: Basis group teacher OR teaches that subject to that student, at the school
+            scope = get_principal_scope(request)
+            return UserGroup.objects.filter(
+                Q(group_id__in=scope.teacher_basis_group_ids)
+                | Q(group__subject_id=target_observation.subject_id),
                 user_id=target_observation.student_id,
-                group_id__in=basis_group_ids
+                group_id__in=scope.teacher_group_ids,
+                group__school_id=goal['school_id'],
             ).exists()
 
-            teaches_subject_at_school = requester.teacher_groups.filter(
-                subject_id=target_observation.subject_id,
-                members__id=target_observation.student_id,
-                school_id=goal['school_id']
-            ).exists()
-
-            return is_basis_teacher or teaches_subject_at_school
-
         except Exception:
             logger.exception("ObservationAccessPolicy.can_teacher_modify_observation")
             return False
@@ -257,11 +253,66 @@ class ObservationAccessPolicy(BaseAccessPolicy):
             if not school_id:
                 return False
 
-            school_admin_ids = UserSchool.objects.filter(
-                user_id=request.user.id, role__name="admin").values_list("school_id", flat=True).distinct()
-
-            return school_id in school_admin_ids
+            return school_id in get_principal_scope(request).admin_school_ids
 
         except Exception:
             logger.exception("ObservationAccessPolicy.is_admin_at_school")
             return False
+
+    def can_write_observations(self, request, writes):
+        """
+        The create and modify conditions above, for many observations with one query.
+        writes: list of (observation, goal, student_id). For updates observation is the existing observation,
+        for creates it is None and goal and student_id are those of the new observation.
+        Returns a list with True for each write which is allowed.
+        """
+        requester = request.user
+        if requester.is_superadmin:
+            return [True] * len(writes)
+        scope = get_principal_scope(request)
+        role_names = scope.role_names
+
+        # Students of the writes in groups the requester teaches
+        taught = set()  # (student_id, subject_id, school_id)
+        taught_in_basis_group = set()  # (student_id, school_id)
+        if "teacher" in role_names:
+            student_ids = {observation.student_id if observation else goal.student_id
+                           for observation, goal, _ in writes} - {None}
+            memberships = UserGroup.objects.filter(
+                group_id__in=scope.teacher_group_ids, user_id__in=student_ids
+            ).values_list('user_id', 'group__type', 'group__subject_id', 'group__school_id')
+            for student_id, group_type, subject_id, school_id in memberships:
+                taught.add((student_id, subject_id, school_id))
+                if group_type == 'basis':
+                    taught_in_basis_group.add((student_id, school_id))
+        taught_at_any_school = {(student_id, subject_id) for student_id, subject_id, _ in taught}
+        taught_in_basis_group_at_any_school = {student_id for student_id, _ in taught_in_basis_group}
+
+        def teacher_can_create(goal):
+            # As can_teacher_create_observation
+            if goal.group_id:
+                return goal.group_id in scope.teacher_group_ids
+            return goal.student_id is not None and (
+                goal.student_id in taught_in_basis_group_at_any_school or
+                (goal.student_id, goal.subject_id) in taught_at_any_school)
+
+        def teacher_can_modify(observation, goal):
+            # As can_teacher_modify_observation, after the check of created_by
+            if goal.group_id:
+                return goal.group_id in scope.teacher_group_ids
+            return ((observation.student_id, goal.school_id) in taught_in_basis_group or
+                    (observation.student_id, observation.subject_id, goal.school_id) in taught)
+
+        allowed = []
+        for observation, goal, student_id in writes:
+            if "admin" in role_names and goal.school_id in scope.admin_school_ids:
+                allowed.append(True)
+            elif observation is None:
+                allowed.append(
+                    ("student" in role_names and str(student_id) == str(requester.id)) or
+                    ("teacher" in role_names and teacher_can_create(goal)))
+            else:
+                allowed.append(observation.created_by_id == requester.id and (
+                    ("student" in role_names and observation.student_id == requester.id) or
+                    ("teacher" in role_names and teacher_can_modify(observation, goal))))
+        return allowed
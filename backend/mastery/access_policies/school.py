@@ -1,4 +1,5 @@
 from .base import BaseAccessPolicy
+from .scope import get_principal_scope
 import logging
 logger = logging.getLogger(__name__)
 
@@ -27,8 +28,7 @@ class SchoolAccessPolicy(BaseAccessPolicy):
         if user.is_superadmin:
             return qs
         try:
-            user_schools = user.get_schools()
-            return qs.filter(id__in=user_schools.values("id"))
+            return qs.filter(id__in=get_principal_scope(request).school_ids)
         except Exception:
             logger.exception("SchoolAccessPolicy.scope_queryset")
             return qs.none()
@@ -0,0 +1,167 @@
+import uuid
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from rest_access_policy.access_policy import AnonymousUser as DRFAnonymousUser
+from mastery.models import UserGroup, UserSchool
+
+SCOPE_CACHE_KEY = "principal-scope:{user_id}"
+SCOPE_VERSION_KEY = "principal-scope-version:{kind}:{id}"
+
+
+class PrincipalScope:
+    """
+    What a user can reach through memberships: roles, groups by role and type, and schools by role.
+    Built from two queries, and cached on the request by get_principal_scope so that the view,
+    serializer fields and nested serializers of one request share it.
+    Between requests it is cached by get_cached_principal_scope, until invalidate_principal_scopes
+    is called for the user or one of the user's schools.
+    """
+
+    def __init__(self, user, group_memberships=(), school_memberships=()):
+        """
+        group_memberships: (group_id, group_type, school_id, role_name) for each UserGroup of the user
+        school_memberships: (school_id, role_name) for each UserSchool of the user
+        """
+        self.user_id = getattr(user, "id", None)
+        self.is_superadmin = bool(getattr(user, "is_superadmin", False))
+        self.group_ids_by_role = {}
+        self.group_ids_by_role_and_type = {}
+        self.school_ids_by_role = {}
+        group_school_ids = set()
+        for group_id, group_type, school_id, role_name in group_memberships:
+            self.group_ids_by_role.setdefault(role_name, set()).add(group_id)
+            self.group_ids_by_role_and_type.setdefault((role_name, group_type), set()).add(group_id)
+            if school_id:
+                group_school_ids.add(school_id)
+        for school_id, role_name in school_memberships:
+            self.school_ids_by_role.setdefault(role_name, set()).add(school_id)
+        # Schools the user belongs to, via group or school memberships (like User.get_schools)
+        self.school_ids = group_school_ids.union(*self.school_ids_by_role.values())
+
+    @classmethod
+    def for_user(cls, user):
+        if not user or isinstance(user, AnonymousUser) or isinstance(user, DRFAnonymousUser):
+            return cls(None)
+        group_memberships = UserGroup.objects.filter(user_id=user.id).values_list(
+            "group_id", "group__type", "group__school_id", "role__name")
+        school_memberships = UserSchool.objects.filter(user_id=user.id).values_list(
+            "school_id", "role__name")
+        return cls(user, group_memberships, school_memberships)
+
+    @property
+    def role_names(self):
+        """Names of the user's roles, without info about where they are held (e.g. teacher, admin)"""
+        role_names = set(self.group_ids_by_role).union(self.school_ids_by_role)
+        if self.is_superadmin:
+            role_names.add("superadmin")
+        return role_names
+
+    def group_ids(self, role_name, group_type=None):
+        """Ids of groups where the user has role_name, optionally only groups of group_type"""
+        if group_type is None:
+            return self.group_ids_by_role.get(role_name, set())
+        return self.group_ids_by_role_and_type.get((role_name, group_type), set())
+
+    @property
+    def teacher_group_ids(self):
+        return self.group_ids("teacher")
+
+    @property
+    def teacher_teaching_group_ids(self):
+        return self.group_ids("teacher", "teaching")
+
+    @property
+    def teacher_basis_group_ids(self):
+        return self.group_ids("teacher", "basis")
+
+    @property
+    def student_group_ids(self):
+        return self.group_ids("student")
+
+    def school_ids_with_role(self, *role_names):
+        """Ids of schools where the user has any of role_names through a UserSchool"""
+        return set().union(*(self.school_ids_by_role.get(role_name, set()) for role_name in role_names))
+
+    @property
+    def admin_school_ids(self):
+        return self.school_ids_with_role("admin")
+
+    @property
+    def employee_school_ids(self):
+        """Schools where the user is admin or inspector, and can see everything"""
+        return self.school_ids_with_role("admin", "inspector")
+
+    @property
+    def fingerprint(self):
+        """Text which changes whenever what the user can access changes, e.g. for ETags"""
+        def sorted_items(ids_by_key):
+            return sorted((str(key), sorted(ids)) for key, ids in ids_by_key.items())
+        return repr((self.user_id, self.is_superadmin, sorted_items(self.group_ids_by_role_and_type),
+                     sorted_items(self.school_ids_by_role), sorted(self.school_ids)))
+
+
+def get_principal_scope(request):
+    """
+    Return the PrincipalScope of request.user, looked up once per request.
+    The scope is kept on the underlying Django request, so DRF and Django views of it share one.
+    """
+    http_request = getattr(request, "_request", request)
+    user = getattr(request, "user", None)
+    scope = getattr(http_request, "principal_scope", None)
+    if scope is None or scope.user_id != getattr(user, "id", None):
+        scope = get_cached_principal_scope(user)
+        http_request.principal_scope = scope
+    return scope
+
+
+def get_cached_principal_scope(user):
+    """
+    Return the PrincipalScope of user from the cache, computing it if missing, expired or invalidated.
+    A cached scope is valid as long as the version stamps of the user and of the user's schools are unchanged.
+    """
+    timeout = settings.PRINCIPAL_SCOPE_CACHE_SECONDS
+    user_id = getattr(user, "id", None)
+    if not timeout or not user_id or getattr(user, "is_anonymous", True):
+        return PrincipalScope.for_user(user)
+
+    cache_key = SCOPE_CACHE_KEY.format(user_id=user_id)
+    cached = cache.get(cache_key)
+    if cached:
+        scope, versions = cached
+        if (scope.is_superadmin == bool(user.is_superadmin)
+                and versions == get_scope_versions(user_id, scope.school_ids)):
+            return scope
+
+    # Read the user's stamp before the memberships, so that a change made meanwhile invalidates the result
+    user_version = get_scope_versions(user_id)
+    scope = PrincipalScope.for_user(user)
+    versions = user_version + get_scope_versions(None, scope.school_ids)
+    cache.set(cache_key, (scope, versions), timeout)
+    return scope
+
+
+def get_scope_versions(user_id=None, school_ids=()):
+    """Return the version stamps of user_id and school_ids, as a tuple. Missing stamps are created"""
+    keys = [SCOPE_VERSION_KEY.format(kind="school", id=school_id) for school_id in sorted(school_ids)]
+    if user_id:
+        keys.insert(0, SCOPE_VERSION_KEY.format(kind="user", id=user_id))
+    versions = cache.get_many(keys)
+    for key in keys:
+        if key not in versions:
+            # A new random stamp, so an evicted stamp never comes back with the value of an older one
+            cache.add(key, uuid.uuid4().hex, None)
+            versions[key] = cache.get(key)
+    return tuple(versions[key] for key in keys)
+
+
+def invalidate_principal_scopes(user_ids=(), school_ids=()):
+    """
+    Make cached scopes of user_ids, and of all users at school_ids, stale by giving them new version stamps.
+    Call this when memberships change without model signals, e.g. through bulk_create or update.
+    """
+    stamps = {SCOPE_VERSION_KEY.format(kind="user", id=user_id): uuid.uuid4().hex for user_id in user_ids}
+    stamps.update(
+        {SCOPE_VERSION_KEY.format(kind="school", id=school_id): uuid.uuid4().hex for school_id in school_ids})
+    if stamps:
+        cache.set_many(stamps, None)
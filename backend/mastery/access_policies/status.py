@@ -2,7 +2,8 @@ import logging
 from django.db.models import Q, Exists, OuterRef
 from django.utils import timezone
 from .base import BaseAccessPolicy
-from mastery.models import Goal, UserGroup, UserSchool
+from .scope import get_principal_scope
+from mastery.models import Goal, UserGroup
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +22,12 @@ class StatusAccessPolicy(BaseAccessPolicy):
             "principal": ["authenticated"],
             "effect": "allow",
         },
+        # Inspectors and school admins can export the statuses scope_queryset gives them
+        {
+            "action": ["export"],
+            "principal": ["role:admin", "role:inspector"],
+            "effect": "allow",
+        },
         # Teachers can create statuses for students they teach
         {
             "action": ["create"],
@@ -62,13 +69,10 @@ class StatusAccessPolicy(BaseAccessPolicy):
         if requester.is_superadmin:
             return qs
         try:
-            teacher_group_ids = list(requester.teacher_groups.filter(
-                type='teaching').values_list('id', flat=True))
-            teacher_basis_group_ids = list(requester.teacher_groups.filter(
-                type='basis').values_list('id', flat=True))
-            school_employee_ids = UserSchool.objects.filter(
-                user_id=requester.id, role__name__in=["admin", "inspector"]).values_list(
-                "school_id", flat=True).distinct()
+            scope = get_principal_scope(request)
+            teacher_group_ids = scope.teacher_teaching_group_ids
+            teacher_basis_group_ids = scope.teacher_basis_group_ids
+            school_employee_ids = scope.employee_school_ids
 
             # Everyone can see statuses they created
             filters = Q(created_by=requester)
@@ -86,18 +90,17 @@ class StatusAccessPolicy(BaseAccessPolicy):
                     group_id__in=teacher_group_ids,
                     group__subject_id=OuterRef('subject_id'),
                 )
-                qs = qs.annotate(teacher_teaches_student_subject=Exists(
-                    memberships_in_teacher_group_on_subject))
-                filters |= Q(student__isnull=False, teacher_teaches_student_subject=True)
+                filters |= Q(student__isnull=False) & Exists(memberships_in_teacher_group_on_subject)
 
             # Basis teachers: All statuses for students in their basis group
             if teacher_basis_group_ids:
-                filters |= Q(student__groups__id__in=teacher_basis_group_ids)
+                filters |= Q(student_id__in=UserGroup.objects.filter(
+                    group_id__in=teacher_basis_group_ids).values('user_id'))
 
             # Students: Statuses about themselves, if current date is after end_at
             filters |= Q(student=requester, end_at__lt=timezone.now())
 
-            return qs.filter(filters).distinct()
+            return qs.filter(filters)
         except Exception:
             logger.exception("StatusAccessPolicy.scope_queryset")
             return qs.none()
@@ -110,20 +113,18 @@ class StatusAccessPolicy(BaseAccessPolicy):
             student_id = request.data.get("student_id")
             subject_id = request.data.get("subject_id")
             school_id = request.data.get("school_id")
-            requester = request.user
 
             if not student_id or not subject_id:
                 return False
 
             # Teaches that subject to that student
-            teaches_subject_at_school = requester.teacher_groups.filter(
-                subject_id=subject_id,
-                members__id=student_id,
-                school_id=school_id
+            return UserGroup.objects.filter(
+                user_id=student_id,
+                group_id__in=get_principal_scope(request).teacher_group_ids,
+                group__subject_id=subject_id,
+                group__school_id=school_id,
             ).exists()
 
-            return teaches_subject_at_school
-
         except Exception:
             logger.exception("StatusAccessPolicy.can_teacher_create_status")
             return False
@@ -134,17 +135,14 @@ class StatusAccessPolicy(BaseAccessPolicy):
         """
         try:
             target_status = view.get_object()
-            requester = request.user
-            school_id = target_status.school_id
 
-            teaches_subject = requester.teacher_groups.filter(
-                subject_id=target_status.subject_id,
-                members__id=target_status.student_id,
-                school_id=school_id
+            return UserGroup.objects.filter(
+                user_id=target_status.student_id,
+                group_id__in=get_principal_scope(request).teacher_group_ids,
+                group__subject_id=target_status.subject_id,
+                group__school_id=target_status.school_id,
             ).exists()
 
-            return teaches_subject
-
         except Exception:
             logger.exception("StatusAccessPolicy.can_teacher_modify_status")
             return False
@@ -163,10 +161,7 @@ class StatusAccessPolicy(BaseAccessPolicy):
             if not school_id:
                 return False
 
-            school_admin_ids = UserSchool.objects.filter(
-                user_id=request.user.id, role__name="admin").values_list("school_id", flat=True).distinct()
-
-            return school_id in school_admin_ids
+            return school_id in get_principal_scope(request).admin_school_ids
 
         except Exception:
             logger.exception("StatusAccessPolicy.belongs_to_school")
@@ -1,6 +1,7 @@
 from .base import BaseAccessPolicy
-from django.db.models import Q
-from mastery.models import Subject, UserSchool, UserGroup
+from .scope import get_principal_scope
+from django.db.models import Q, Exists, OuterRef
+from mastery.models import Goal, Group, Subject
 from rest_framework.exceptions import NotFound
 import logging
 
@@ -37,21 +38,15 @@ class SubjectAccessPolicy(BaseAccessPolicy):
         if requester.is_superadmin:
             return qs
         try:
-            school_ids_via_user_school = UserSchool.objects.filter(
-                user_id=requester.id).values_list(
-                "school_id", flat=True)
-            school_ids_via_user_group = UserGroup.objects.filter(
-                user_id=requester.id).values_list(
-                "group__school_id", flat=True)
-            school_ids = list(set(school_ids_via_user_school).union(set(school_ids_via_user_group)))
+            school_ids = get_principal_scope(request).school_ids
             return qs.filter(
                 # Subjects attached to groups which belong to a school where the user belongs
-                Q(groups__school_id__in=school_ids) |
+                Exists(Group.objects.filter(subject_id=OuterRef('pk'), school_id__in=school_ids)) |
                 # Subjects owned by schools where the user belongs
                 Q(owned_by_school_id__in=school_ids) |
                 # Subjects that have goals at schools where the user belongs
-                Q(goals__school_id__in=school_ids)
-            ).distinct()
+                Exists(Goal.objects.filter(subject_id=OuterRef('pk'), school_id__in=school_ids))
+            )
         except Exception:
             logger.exception("SubjectAccessPolicy.scope_queryset")
             return qs.none()
@@ -72,10 +67,7 @@ class SubjectAccessPolicy(BaseAccessPolicy):
             if not school_id:
                 return False
 
-            school_admin_ids = UserSchool.objects.filter(
-                user_id=request.user.id, role__name="admin").values_list("school_id", flat=True).distinct()
-
-            return school_id in school_admin_ids
+            return school_id in get_principal_scope(request).admin_school_ids
 
         except Exception:
             logger.exception("SubjectAccessPolicy.belongs_to_group")
@@ -1,6 +1,7 @@
 from .base import BaseAccessPolicy
-from django.db.models import Q
-from mastery.models import User, UserSchool, School
+from .scope import get_principal_scope
+from django.db.models import Q, Exists, OuterRef
+from mastery.models import UserGroup, UserSchool
 
 
 class UserAccessPolicy(BaseAccessPolicy):
@@ -27,33 +28,37 @@ class UserAccessPolicy(BaseAccessPolicy):
         if requester.is_superadmin:
             return qs
         try:
-            groups_where_current_user_is_teacher = requester.teacher_groups
-            groups_where_current_user_is_student = requester.student_groups
+            scope = get_principal_scope(request)
+            groups_where_current_user_is_teacher = scope.teacher_group_ids
+            groups_where_current_user_is_student = scope.student_group_ids
 
             # All schools where requester is admin or inspector
-            school_employee_ids = UserSchool.objects.filter(
-                user_id=requester.id, role__name__in=["admin", "inspector"]
-            ).values_list("school_id", flat=True).distinct()
+            school_employee_ids = scope.employee_school_ids
 
             # All teacher user IDs from schools the requester is member of
-            teacher_ids = User.objects.filter(
-                user_groups__group__school__in=requester.get_schools(),
-                user_groups__role__name='teacher'
-            ).values_list('id', flat=True)
+            teacher_ids = UserGroup.objects.filter(
+                group__school_id__in=scope.school_ids,
+                role__name='teacher'
+            ).values('user_id')
+
+            # Members of groups where the requester is a teacher or student
+            group_ids = groups_where_current_user_is_teacher | groups_where_current_user_is_student
 
             filters = Q(id=requester.id)  # Always include self
             filters |= Q(is_superadmin=True)  # Superadmins are visible to everyone
-            filters |= Q(user_groups__group__in=groups_where_current_user_is_teacher)
-            filters |= Q(user_groups__group__in=groups_where_current_user_is_student)
+            if group_ids:
+                filters |= Exists(UserGroup.objects.filter(user_id=OuterRef('pk'), group_id__in=group_ids))
             filters |= Q(id__in=teacher_ids)
 
             # School inspectors and admin: All users (students and teachers) at their schools
             if school_employee_ids:
                 # Users with membership in groups at their schools
-                filters |= Q(user_groups__group__school_id__in=school_employee_ids)
+                filters |= Exists(UserGroup.objects.filter(
+                    user_id=OuterRef('pk'), group__school_id__in=school_employee_ids))
                 # Users employed at their schools
-                filters |= Q(user_schools__school_id__in=school_employee_ids)
+                filters |= Exists(UserSchool.objects.filter(
+                    user_id=OuterRef('pk'), school_id__in=school_employee_ids))
 
-            return qs.filter(filters).distinct()
+            return qs.filter(filters)
         except Exception:
             return qs.none()
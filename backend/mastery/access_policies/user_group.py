@@ -1,6 +1,6 @@
 from .base import BaseAccessPolicy
+from .scope import get_principal_scope
 from django.db.models import Q
-from mastery.models import UserSchool, UserGroup
 import logging
 logger = logging.getLogger(__name__)
 
@@ -29,14 +29,12 @@ class UserGroupAccessPolicy(BaseAccessPolicy):
         if user.is_superadmin:
             return qs
         try:
-            school_admin_ids = UserSchool.objects.filter(
-                user_id=user.id, role__name__in=["admin", "inspector"]
-            ).values_list("school_id", flat=True).distinct()
+            school_admin_ids = get_principal_scope(request).employee_school_ids
 
             return qs.filter(
                 Q(group__school_id__in=school_admin_ids) |
                 Q(user_id=user.id)
-            ).distinct()
+            )
         except Exception:
             logger.exception("UserGroupAccessPolicy.scope_queryset")
             return qs.none()
@@ -1,7 +1,7 @@
 import os
 import json
 import logging
-import requests
+import re
 import urllib.parse
 from datetime import datetime
 from django.shortcuts import redirect
@@ -10,7 +10,10 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from oauthlib.oauth2 import WebApplicationClient
-from mastery.models import User, School
+from mastery.models import User, UserSchool
+from mastery.access_policies.scope import invalidate_principal_scopes
+from mastery.authentication import get_schools_by_org_number
+from mastery.data_import import http_client
 
 FEIDE_CLIENT_ID = os.environ.get("FEIDE_CLIENT_ID")
 FEIDE_CLIENT_SECRET = os.environ.get("FEIDE_CLIENT_SECRET")
@@ -21,6 +24,9 @@ FEIDE_LOGOUT_REDIR = os.environ.get("FEIDE_LOGOUT_REDIR")
 FEIDE_REALM = os.environ.get("FEIDE_REALM")
 FRONTEND = os.environ.get("FRONTEND")
 
+AFFILIATION_RE = re.compile(
+    r"^(?P<role>student|faculty|staff)@(?P<org_number>[^.@]+)\.feide\.osloskolen\.no$")
+
 logger = logging.getLogger(__name__)
 client = WebApplicationClient(FEIDE_CLIENT_ID)
 cached_provider_config = None
@@ -29,13 +35,13 @@ cached_provider_config = None
 def get_provider_config():
     global cached_provider_config
     if not cached_provider_config:
-        cached_provider_config = requests.get(FEIDE_DISCOVERY_URL).json()
+        cached_provider_config = http_client.get(FEIDE_DISCOVERY_URL).json()
     return cached_provider_config
 
 
 def get_user_info():
     uri, headers, _ = client.add_token(FEIDE_USER_INFO_URL)
-    return requests.get(uri, headers=headers).json()
+    return http_client.get(uri, headers=headers).json()
 
 
 def request_tokens_from_feide(code):
@@ -46,7 +52,7 @@ def request_tokens_from_feide(code):
         redirect_url=FEIDE_CALLBACK,
         code=code
     )
-    token_response = requests.post(
+    token_response = http_client.post(
         token_url,
         headers=headers,
         data=body,
@@ -55,6 +61,19 @@ def request_tokens_from_feide(code):
     return client.parse_request_body_response(json.dumps(token_response.json()))
 
 
+def parse_affiliations(feide_affiliations):
+    """
+    Parse eduPersonScopedAffiliation, e.g. ["student@975289990.feide.osloskolen.no"], into a set of
+    (role, org_number). Affiliations outside osloskolen are left out.
+    """
+    pairs = set()
+    for affiliation in feide_affiliations or []:
+        match = AFFILIATION_RE.match(affiliation)
+        if match:
+            pairs.add((match["role"], match["org_number"]))
+    return pairs
+
+
 def check_affiliations(feide_user_id, feide_affiliations):
     """
     Check if user has affiliation with an existing school which has been enabled.
@@ -69,26 +88,28 @@ def check_affiliations(feide_user_id, feide_affiliations):
     if not feide_user_id or not feide_affiliations:
         return result
 
-    for school in School.objects.all():
-        org_number = school.org_number
-        if f"student@{org_number}.feide.osloskolen.no" in feide_affiliations:
-            if school.is_service_enabled and school.is_service_enabled_for_students:
-                result["student_schools"].append(school)
-            else:
-                result["messages"].append(
-                    f"Du er elev ved {school.display_name}, men skolen har ikke aktivert tjenesten.")
-        if f"faculty@{org_number}.feide.osloskolen.no" in feide_affiliations:
-            if school.is_service_enabled:
-                result["teacher_schools"].append(school)
-            else:
-                result["messages"].append(
-                    f"Du er lærer ved {school.display_name}, men skolen har ikke aktivert tjenesten.")
-        if f"staff@{org_number}.feide.osloskolen.no" in feide_affiliations:
-            if school.is_service_enabled:
-                result["staff_schools"].append(school)
-            else:
-                result["messages"].append(
-                    f"Du er ansatt ved {school.display_name}, men skolen har ikke aktivert tjenesten.")
+    affiliations = parse_affiliations(feide_affiliations)
+    schools_by_org_number = get_schools_by_org_number({org_number for _, org_number in affiliations})
+    for org_number, schools in sorted(schools_by_org_number.items()):
+        for school in schools:
+            if ("student", org_number) in affiliations:
+                if school.is_service_enabled and school.is_service_enabled_for_students:
+                    result["student_schools"].append(school)
+                else:
+                    result["messages"].append(
+                        f"Du er elev ved {school.display_name}, men skolen har ikke aktivert tjenesten.")
+            if ("faculty", org_number) in affiliations:
+                if school.is_service_enabled:
+                    result["teacher_schools"].append(school)
+                else:
+                    result["messages"].append(
+                        f"Du er lærer ved {school.display_name}, men skolen har ikke aktivert tjenesten.")
+            if ("staff", org_number) in affiliations:
+                if school.is_service_enabled:
+                    result["staff_schools"].append(school)
+                else:
+                    result["messages"].append(
+                        f"Du er ansatt ved {school.display_name}, men skolen har ikke aktivert tjenesten.")
 
     return result
 
@@ -143,9 +164,9 @@ def feidecallback(request):
         )
         # Student and teacher roles are granted via imported groups
         # But ensure user gets staff role at schools they are affiliated with
-        if staff_schools:
-            for school in staff_schools:
-                school.set_employed_user(user, 'staff')
+        if UserSchool.ensure_user_schools(user, staff_schools, 'staff'):
+            # bulk_create sends no signals
+            invalidate_principal_scopes(user_ids=[user.id])
 
         request.session["feide_tokens"] = tokens
         request.session["feide_user_id"] = feide_user_id
@@ -139,7 +139,7 @@ def import_school(request, org_number):
 @extend_schema(
     operation_id="fetch_groups_for_school",
     summary="Fetch groups for school",
-    description="Fetch Feide groups for a single school (by org number) and store them at data_import/data/schools/<org>/groups.json. Returns simple counts.",
+    description="Fetch Feide groups for a single school (by org number) and store them at data_import/data/schools/<org>/groups.ndjson. Returns simple counts.",
     parameters=[
         OpenApiParameter(
             name='org_number',
@@ -155,7 +155,7 @@ def import_school(request, org_number):
 def fetch_groups_for_school(request, org_number):
     """
     Fetch Feide groups for a single school (by org number) and store them
-    at data_import/data/schools/<org>/groups.json. Returns simple counts.
+    at data_import/data/schools/<org>/groups.ndjson. Returns simple counts.
     """
     school = models.School.objects.filter(org_number=org_number).first()
     if not school:
@@ -189,7 +189,7 @@ def fetch_groups_for_school(request, org_number):
 @extend_schema(
     operation_id="fetch_memberships_for_school",
     summary="Fetch group memberships for school",
-    description="Fetch group memberships for a single school (by org number) and store at data_import/data/schools/<org>/users.json",
+    description="Fetch group memberships for a single school (by org number) and store at data_import/data/schools/<org>/memberships.ndjson",
     parameters=[
         OpenApiParameter(
             name='org_number',
@@ -204,7 +204,7 @@ def fetch_groups_for_school(request, org_number):
 @permission_classes([ImportAccessPolicy])
 def fetch_memberships_for_school(request, org_number):
     """
-    Fetch all group memberships for a single school (by org number) into data_import/data/schools/<org>/memberships.json
+    Fetch all group memberships for a single school (by org number) into data_import/data/schools/<org>/memberships.ndjson
     """
     school = models.School.objects.filter(org_number=org_number).first()
     if not school:
@@ -238,7 +238,7 @@ def fetch_memberships_for_school(request, org_number):
 @extend_schema(
     operation_id="fetch_groups_and_users",
     summary="Fetch group and user data for a school",
-    description="Fetch group memberships for a single school (by org number) and store at data_import/data/schools/<org>/users.json. Also fetch groups into data_import/data/schools/<org>/memberships.json.",
+    description="Fetch group memberships for a single school (by org number) and store at data_import/data/schools/<org>/memberships.ndjson. Also fetch groups into data_import/data/schools/<org>/groups.ndjson.",
     parameters=[
         OpenApiParameter(
             name='org_number',
@@ -301,7 +301,7 @@ def fetch_groups_and_users(request, org_number):
 @extend_schema(
     operation_id="import_groups_and_users",
     summary="Import groups and users",
-    description="Import groups and users for a specific school from previously fetched files.",
+    description="Import groups and users for a specific school from previously fetched files, data_import/data/schools/<org>/groups.ndjson and memberships.ndjson.",
     parameters=[
         OpenApiParameter(
             name='org_number',
@@ -442,7 +442,7 @@ def update_data_integrity(request, org_number):
 @extend_schema(
     operation_id="fetch_school_import_status",
     summary="Get school import status",
-    description="Return status for one school: Groups, Users, Memberships (last fetch count + time, DB count, diff) and last import timestamp.",
+    description="Return status for one school: Groups, Users, Memberships (last fetch count + time, DB count, diff) and last import timestamp. Fetch counts are read from the stats files next to the fetched .ndjson files, e.g. groups.stats.json.",
     parameters=[
         OpenApiParameter(
             name='org_number',
@@ -1,12 +1,25 @@
-from .. import models, serializers
-from django.db.models import Q, Prefetch, Exists, OuterRef
+from .. import exports, models, serializers, status_suggestions
+from django.db import transaction
+from django.db.models import Q, F, Count, Prefetch, Exists, OuterRef, Window
+from django.db.models.functions import RowNumber
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.http import http_date
 from datetime import datetime
-from rest_framework import viewsets
+from operator import attrgetter
+import hashlib
+import time
+from rest_framework import status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
 from rest_framework.filters import OrderingFilter
 from rest_framework.exceptions import ValidationError
+from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiParameter, extend_schema_view
 from rest_access_policy import AccessViewSetMixin
 from mastery.access_policies import GroupAccessPolicy, SchoolAccessPolicy, SubjectAccessPolicy, UserAccessPolicy, GoalAccessPolicy, RoleAccessPolicy, MasterySchemaAccessPolicy, ObservationAccessPolicy, UserSchoolAccessPolicy, UserGroupAccessPolicy, DataMaintenanceTaskAccessPolicy, StatusAccessPolicy
+from mastery.access_policies.scope import get_principal_scope
+from mastery.renderers import render_json
 from .api_functions import get_request_param
 import logging
 
@@ -37,6 +50,8 @@ def apply_valid_group_filter(query_params, qs):
 
 
 class FingerprintViewSetMixin:
+    # Path to the id of the school an instance belongs to, None for models which are not tied to a school
+    version_school_field = None
 
     def perform_create(self, serializer):
         super().perform_create(serializer)
@@ -44,12 +59,264 @@ class FingerprintViewSetMixin:
         instance.created_by = self.request.user
         instance.updated_by = self.request.user
         instance.save(update_fields=["created_by", "updated_by"])
+        self.bump_version(instance)
 
     def perform_update(self, serializer):
-        super().perform_update(serializer)
         instance = getattr(serializer, "instance", None)
+        # The instance may move to another school, both have changed
+        school_before = self.get_version_school_id(instance)
+        super().perform_update(serializer)
         instance.updated_by = self.request.user
         instance.save(update_fields=["updated_by"])
+        self.bump_version(instance, school_before)
+
+    def perform_destroy(self, instance):
+        school_id = self.get_version_school_id(instance)
+        super().perform_destroy(instance)
+        models.VersionStamp.bump([instance._meta.model_name], [school_id])
+
+    def get_version_school_id(self, instance):
+        if not self.version_school_field:
+            return None
+        try:
+            return attrgetter(self.version_school_field)(instance)
+        except AttributeError:
+            return None
+
+    def bump_version(self, instance, *school_ids):
+        school_ids = {self.get_version_school_id(instance), *school_ids} - {None}
+        models.VersionStamp.bump([instance._meta.model_name], school_ids)
+
+
+class ConditionalGetViewSetMixin:
+    """
+    Answer list and retrieve with an ETag, and with 304 Not Modified when it matches If-None-Match.
+    The ETag is made from the version stamps of version_models (see VersionStamp), the requester's
+    access scope and the request path, so it is known without running the list query or the serializer.
+    """
+    # Models whose changes can change responses of the view, as lower case model names
+    version_models = ()
+    # For responses that also depend on the time (e.g. group validity): a new ETag every period
+    version_period_seconds = None
+
+    def list(self, request, *args, **kwargs):
+        return self.get_conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.get_conditional_response(super().retrieve, request, *args, **kwargs)
+
+    def get_conditional_response(self, get_response, request, *args, **kwargs):
+        etag, last_modified = self.get_version_etag(request)
+        if_none_match = request.headers.get('If-None-Match', '')
+        if etag in [tag.strip() for tag in if_none_match.split(',')]:
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = get_response(request, *args, **kwargs)
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            response['ETag'] = etag
+            if last_modified:
+                # Informational only: access scope changes are not reflected, so If-Modified-Since is not used
+                response['Last-Modified'] = http_date(last_modified.timestamp())
+            response['Cache-Control'] = 'private, no-cache'
+        return response
+
+    def get_version_etag(self, request):
+        school_ids = self.get_version_school_ids(request)
+        stamps = models.VersionStamp.get_versions(self.version_models, school_ids)
+        parts = [request.get_full_path(), get_principal_scope(request).fingerprint]
+        if school_ids is not None:
+            # Rows which move in at another school change the ETag, also before that school has a stamp
+            parts.append(",".join(sorted(school_ids)))
+        parts.extend(f"{model_name}/{school_key}/{version}" for model_name, school_key, version, _ in stamps)
+        if self.version_period_seconds:
+            parts.append(str(int(time.time() // self.version_period_seconds)))
+        etag = 'W/"%s"' % hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:32]
+        last_modified = max((updated_at for _, _, _, updated_at in stamps), default=None)
+        return etag, last_modified
+
+    def get_version_school_ids(self, request):
+        """
+        The schools the response has data from, or None for all schools: the school parameter, else the
+        school of the requested row or the schools of the listed rows, read with one grouped values query
+        """
+        school_param, _ = get_request_param(request.query_params, 'school')
+        if school_param:
+            return {school_param}
+        school_field = getattr(self, 'version_school_field', None)
+        if not school_field:
+            return None
+        if self.action == 'retrieve':
+            lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+            qs = self.queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        else:
+            qs = self.filter_queryset(self.get_queryset()).prefetch_related(None)
+        lookup = school_field.replace('.', '__')
+        school_ids = {row[lookup] for row in qs.order_by().values(lookup).annotate(rows=Count('pk'))}
+        # Rows without a school (e.g. subjects from UDIR) may change with data at any school
+        return None if None in school_ids else school_ids
+
+
+class RelatedFieldsViewSetMixin:
+    """
+    Select and prefetch the relations the serializer reads (see serializers.get_related_lookups),
+    so that nested serializers and many-to-many ids do not cost queries for each row
+    """
+
+    def get_queryset(self):
+        select_related, prefetch_related = serializers.get_related_lookups(self.get_serializer_class())
+        qs = super().get_queryset()
+        if select_related:
+            qs = qs.select_related(*select_related)
+        if prefetch_related:
+            qs = qs.prefetch_related(*prefetch_related)
+        return qs
+
+
+class ExportViewSetMixin:
+    """
+    export action: all rows the requester can see at a school, optionally in a group, subject and period,
+    as a CSV or XLSX file. Rows are read with a server-side cursor and written as the response streams,
+    so memory use does not grow with the size of the export.
+    """
+    # (column header, values_list lookup)
+    export_columns = ()
+    export_school_field = 'school_id'
+    # A row matches a subject if any of these is the subject
+    export_subject_fields = ('subject_id',)
+    # Fields where the row's period begins and ends, for the from and to parameters
+    export_period_fields = ('created_at', 'created_at')
+    export_ordering = ('created_at', 'id')
+    export_chunk_size = 2000
+
+    @extend_schema(
+        summary="Export as CSV or XLSX",
+        parameters=[
+            OpenApiParameter(
+                name='school',
+                description='School to export from',
+                required=True,
+                type={'type': 'string'},
+                location=OpenApiParameter.QUERY
+            ),
+            OpenApiParameter(
+                name='group',
+                description='Only rows about the group or its students, in the subject of the group '
+                            'if it has one',
+                required=False,
+                type={'type': 'string'},
+                location=OpenApiParameter.QUERY
+            ),
+            OpenApiParameter(
+                name='subject',
+                description='Only rows in the subject',
+                required=False,
+                type={'type': 'string'},
+                location=OpenApiParameter.QUERY
+            ),
+            OpenApiParameter(
+                name='from',
+                description='Only rows from this date (YYYY-MM-DD)',
+                required=False,
+                type={'type': 'string', 'format': 'date'},
+                location=OpenApiParameter.QUERY
+            ),
+            OpenApiParameter(
+                name='to',
+                description='Only rows until this date (YYYY-MM-DD)',
+                required=False,
+                type={'type': 'string', 'format': 'date'},
+                location=OpenApiParameter.QUERY
+            ),
+            OpenApiParameter(
+                name='file_format',
+                description='"csv" (default) or "xlsx"',
+                required=False,
+                type={'type': 'string', 'enum': ['csv', 'xlsx']},
+                location=OpenApiParameter.QUERY
+            ),
+        ],
+        responses={
+            (200, 'text/csv'): OpenApiTypes.STR,
+            (200, exports.XLSX_CONTENT_TYPE): OpenApiTypes.BINARY,
+        },
+    )
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        query_params = request.query_params
+        school_param, _ = get_request_param(query_params, 'school')
+        group_param, _ = get_request_param(query_params, 'group')
+        subject_param, _ = get_request_param(query_params, 'subject')
+        file_format, _ = get_request_param(query_params, 'file_format')
+        file_format = file_format or 'csv'
+        if not school_param:
+            raise ValidationError(
+                {'error': 'missing-parameter', 'message': 'The "school" query parameter is required.'})
+        if file_format not in ('csv', 'xlsx'):
+            raise ValidationError(
+                {'error': 'invalid-parameter', 'message': 'The "file_format" must be "csv" or "xlsx".'})
+
+        qs = self.get_queryset().filter(**{self.export_school_field: school_param})
+        if group_param:
+            groups = GroupAccessPolicy().scope_queryset(request, models.Group.objects.filter(id=group_param))
+            group = groups.first()
+            if group is None:
+                raise ValidationError({'error': 'invalid-parameter', 'message': 'Unknown group.'})
+            student_ids = models.UserGroup.objects.filter(
+                group_id=group.id, role__name='student', deleted_at__isnull=True).values('user_id')
+            qs = self.filter_export_group(qs, group, student_ids)
+        if subject_param:
+            subject_filter = Q()
+            for field in self.export_subject_fields:
+                subject_filter |= Q(**{field: subject_param})
+            qs = qs.filter(subject_filter)
+        begin_field, end_field = self.export_period_fields
+        for name, lookup in (('from', f'{end_field}__date__gte'), ('to', f'{begin_field}__date__lte')):
+            value, _ = get_request_param(query_params, name)
+            if value:
+                try:
+                    qs = qs.filter(**{lookup: datetime.fromisoformat(value).date()})
+                except ValueError:
+                    raise ValidationError(
+                        {'error': 'invalid-parameter',
+                         'message': f'Invalid date format for "{name}" parameter. '
+                                    'Use ISO format (YYYY-MM-DD).'})
+
+        headers = [header for header, _ in self.export_columns]
+        rows = qs.order_by(*self.export_ordering).values_list(
+            *(lookup for _, lookup in self.export_columns)).iterator(chunk_size=self.export_chunk_size)
+        name = f"{self.basename}-{timezone.localdate().isoformat()}.{file_format}"
+        if file_format == 'xlsx':
+            response = StreamingHttpResponse(
+                exports.stream_xlsx(self.basename, headers, rows), content_type=exports.XLSX_CONTENT_TYPE)
+        else:
+            response = StreamingHttpResponse(
+                exports.stream_csv(headers, rows), content_type=exports.CSV_CONTENT_TYPE)
+        response['Content-Disposition'] = f'attachment; filename="{name}"'
+        return response
+
+    def filter_export_group(self, qs, group, student_ids):
+        """Rows about students in the group, in the group's subject if it has one"""
+        qs = qs.filter(student_id__in=student_ids)
+        if group.subject_id:
+            qs = qs.filter(subject_id=group.subject_id)
+        return qs
+
+
+class ValuesListViewSetMixin:
+    """
+    Fast list: rows are read with values_list() and shaped by the serializer's ValuesTransform, and encoded
+    directly, instead of making model instances and running serializer fields and the camel case renderer
+    for each row. The output is the same. Paginated lists, and serializers the transform can not handle,
+    use the normal list.
+    """
+
+    def list(self, request, *args, **kwargs):
+        transform = serializers.get_values_transform(self.get_serializer_class())
+        if transform is None or (self.paginator is not None and self.paginator.is_requested(request)):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        content = render_json(transform.to_representation(queryset))
+        return HttpResponse(content, content_type='application/json')
 
 
 @extend_schema_view(
@@ -65,9 +332,13 @@ class FingerprintViewSetMixin:
         ]
     )
 )
-class SchoolViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets.ModelViewSet):
+class SchoolViewSet(
+    FingerprintViewSetMixin, ConditionalGetViewSetMixin, AccessViewSetMixin, viewsets.ModelViewSet
+):
     queryset = models.School.objects.all()
     serializer_class = serializers.SchoolSerializer
+    version_school_field = "id"
+    version_models = ["school"]
     filterset_fields = ['is_service_enabled']
     access_policy = SchoolAccessPolicy
 
@@ -123,7 +394,10 @@ class SchoolViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets.ModelV
         ]
     )
 )
-class UserViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets.ModelViewSet):
+class UserViewSet(
+    FingerprintViewSetMixin, ValuesListViewSetMixin, RelatedFieldsViewSetMixin, AccessViewSetMixin,
+    viewsets.ModelViewSet
+):
     queryset = models.User.objects.all()
     serializer_class = serializers.UserSerializer
     access_policy = UserAccessPolicy
@@ -146,31 +420,32 @@ class UserViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets.ModelVie
                     {'error': 'missing-parameter', 'message': 'The "school" query parameter is required.'})
 
             # Build filters additively based on provided parameters
-            # Start with base filters for both possible paths (user_groups and user_schools)
-            user_group_filters = Q(
-                user_groups__group__school_id=school_param,
-                user_groups__deleted_at__isnull=True
+            # Start with base filters for both possible paths (user_groups and user_schools),
+            # as memberships of the user in semi-joins, so that users are not repeated
+            user_groups = models.UserGroup.objects.filter(
+                user_id=OuterRef('pk'),
+                group__school_id=school_param,
+                deleted_at__isnull=True
             )
-            user_school_filters = Q(user_schools__school_id=school_param)
+            user_schools = models.UserSchool.objects.filter(user_id=OuterRef('pk'), school_id=school_param)
 
             # Add group filter if specified (only applies to user_groups path)
             if groups_param:
                 group_ids = [group.strip() for group in groups_param.split(',') if group]
                 if group_ids:
-                    user_group_filters &= Q(user_groups__group_id__in=group_ids)
+                    user_groups = user_groups.filter(group_id__in=group_ids)
 
             # Add role filter if specified (applies to both paths)
             if roles_param:
                 role_names = [role.strip() for role in roles_param.split(',') if role]
                 if role_names:
-                    user_group_filters &= Q(user_groups__role__name__in=role_names)
-                    user_school_filters &= Q(user_schools__role__name__in=role_names)
+                    user_groups = user_groups.filter(role__name__in=role_names)
+                    user_schools = user_schools.filter(role__name__in=role_names)
                     include_superadmins = 'superadmin' in role_names
 
             # Add filter for what kind of teacher the user is
             if teacher_param:
-                user_group_filters &= Q(user_groups__group__type=teacher_param,
-                                        user_groups__role__name__in=['teacher'])
+                user_groups = user_groups.filter(group__type=teacher_param, role__name__in=['teacher'])
 
             # Add user id filter if specified
             if ids_param:
@@ -181,15 +456,15 @@ class UserViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets.ModelVie
             # Apply filters: if groups specified, only via user_groups; otherwise both paths
             if groups_param:
                 # Groups param restricts to only the user_groups path
-                qs = qs.filter(user_group_filters)
+                qs = qs.filter(Exists(user_groups))
             else:
                 # No groups: users can match via either user_groups OR user_schools
-                qs = qs.filter(user_group_filters | user_school_filters)
+                qs = qs.filter(Exists(user_groups) | Exists(user_schools))
 
             # If filtering by roles and superadmin is included, also include superadmins who may not have a UserSchool or UserGroup entry
             if include_superadmins:
                 qs = qs | self.access_policy().scope_queryset(self.request, super().get_queryset()).filter(is_superadmin=True)
-        return qs.distinct()
+        return qs
 
 
 @extend_schema_view(
@@ -226,9 +501,12 @@ class UserViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets.ModelVie
         ]
     )
 )
-class UserSchoolViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets.ModelViewSet):
+class UserSchoolViewSet(
+    FingerprintViewSetMixin, RelatedFieldsViewSetMixin, AccessViewSetMixin, viewsets.ModelViewSet
+):
     queryset = models.UserSchool.objects.all()
     serializer_class = serializers.NestedUserSchoolSerializer
+    version_school_field = "school_id"
     access_policy = UserSchoolAccessPolicy
 
     def get_serializer_class(self):
@@ -256,7 +534,7 @@ class UserSchoolViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets.Mo
                 qs = qs.filter(role__name=role_param)
 
         # non-list actions (retrieve, create, update, destroy) do not require parameters
-        return qs.distinct()
+        return qs
 
 
 @extend_schema_view(
@@ -300,9 +578,12 @@ class UserSchoolViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets.Mo
         ]
     )
 )
-class UserGroupViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets.ModelViewSet):
+class UserGroupViewSet(
+    FingerprintViewSetMixin, RelatedFieldsViewSetMixin, AccessViewSetMixin, viewsets.ModelViewSet
+):
     queryset = models.UserGroup.objects.all()
     serializer_class = serializers.NestedUserGroupSerializer
+    version_school_field = "group.school_id"
     access_policy = UserGroupAccessPolicy
 
     def get_queryset(self):
@@ -328,7 +609,7 @@ class UserGroupViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets.Mod
                 qs = qs.filter(role__name=role_param)
 
         # non-list actions (retrieve, create, update, destroy) do not require parameters
-        return qs.distinct()
+        return qs
 
 
 @extend_schema_view(
@@ -400,9 +681,15 @@ class UserGroupViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets.Mod
         ]
     )
 )
-class GroupViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets.ModelViewSet):
+class GroupViewSet(
+    FingerprintViewSetMixin, ConditionalGetViewSetMixin, AccessViewSetMixin, viewsets.ModelViewSet
+):
     queryset = models.Group.objects.all()
     serializer_class = serializers.GroupSerializer
+    version_school_field = "school_id"
+    version_models = ["group", "usergroup", "subject"]
+    # Groups come and go with valid_from and valid_to
+    version_period_seconds = 3600
     access_policy = GroupAccessPolicy
 
     def get_queryset(self):
@@ -436,17 +723,18 @@ class GroupViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets.ModelVi
 
             # Build user_groups filters additively if user or roles are specified
             if user_param or roles_param:
-                user_groups_filters = Q(user_groups__deleted_at__isnull=True)
+                user_groups = models.UserGroup.objects.filter(
+                    group_id=OuterRef('pk'), deleted_at__isnull=True)
 
                 if user_param:
-                    user_groups_filters &= Q(user_groups__user_id=user_param)
+                    user_groups = user_groups.filter(user_id=user_param)
 
                 if roles_param:
                     role_names = [role.strip() for role in roles_param.split(',') if role]
                     if role_names:
-                        user_groups_filters &= Q(user_groups__role__name__in=role_names)
+                        user_groups = user_groups.filter(role__name__in=role_names)
 
-                qs = qs.filter(user_groups_filters)
+                qs = qs.filter(Exists(user_groups))
 
             # Apply subject filter if specified
             if subject_param:
@@ -473,7 +761,207 @@ class GroupViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets.ModelVi
             return qs
 
         # non-list actions (retrieve, create, update, destroy) do not require parameters
-        return qs.distinct()
+        return qs
+
+    @extend_schema(
+        summary="Latest mastery value for each student and goal in the group",
+        description="Students of the group, the goals that apply to them and a grid of values, with one row "
+                    "for each student and one column for each goal. A value is the mastery_value of the "
+                    "latest observation the requester can see, or null. Goals are the group's goals, and "
+                    "individual goals of the students in the subject, which is the group's subject "
+                    "unless given.",
+        parameters=[
+            OpenApiParameter(
+                name='subject',
+                description='Subject of the individual goals, instead of the subject of the group',
+                required=False,
+                type={'type': 'string'},
+                location=OpenApiParameter.QUERY
+            ),
+        ],
+        responses={200: {'type': 'object', 'properties': {
+            'students': {'type': 'array', 'items': {'type': 'object'}},
+            'goals': {'type': 'array', 'items': {'type': 'object'}},
+            'values': {'type': 'array',
+                       'items': {'type': 'array', 'items': {'type': 'integer', 'nullable': True}}},
+        }}},
+    )
+    @action(detail=True, methods=['get'], url_path='mastery-matrix')
+    def mastery_matrix(self, request, pk=None):
+        group = self.get_object()
+        subject_param, _ = get_request_param(request.query_params, 'subject')
+        subject_id = subject_param or group.subject_id
+
+        students = self.get_group_students(group)
+        student_ids = [student_id for student_id, _ in students]
+
+        goal_filter = Q(group_id=group.id)
+        if subject_id:
+            goal_filter |= Q(student_id__in=student_ids, subject_id=subject_id)
+        goals_qs = models.Goal.objects.filter(goal_filter, deleted_at__isnull=True)
+        goals = list(GoalAccessPolicy().scope_queryset(request, goals_qs).order_by(
+            F('student_id').asc(nulls_first=True), F('sort_order').asc(nulls_last=True), 'id'
+        ).values_list('id', 'title', 'student_id', 'mastery_schema_id'))
+
+        # The latest visible observation for each (student, goal), picked in the database
+        observations = ObservationAccessPolicy().scope_queryset(request, models.Observation.objects.filter(
+            goal_id__in=[goal[0] for goal in goals], student_id__in=student_ids, deleted_at__isnull=True))
+        latest = observations.annotate(row_number=Window(
+            RowNumber(),
+            partition_by=[F('student_id'), F('goal_id')],
+            order_by=[F('observed_at').desc(nulls_last=True), F('created_at').desc(), F('id').desc()],
+        )).filter(row_number=1).values_list('student_id', 'goal_id', 'mastery_value')
+
+        row_by_student = {student_id: index for index, student_id in enumerate(student_ids)}
+        column_by_goal = {goal[0]: index for index, goal in enumerate(goals)}
+        values = [[None] * len(goals) for _ in students]
+        for student_id, goal_id, mastery_value in latest:
+            values[row_by_student[student_id]][column_by_goal[goal_id]] = mastery_value
+
+        return Response({
+            'students': [{'id': student_id, 'name': name} for student_id, name in students],
+            'goals': [
+                {'id': goal_id, 'title': title, 'student_id': student_id, 'mastery_schema_id': schema_id}
+                for goal_id, title, student_id, schema_id in goals
+            ],
+            'values': values,
+        })
+
+    @extend_schema(
+        summary="Suggested status values for the students in the group",
+        description="Suggests a mastery_value for a status of each student in the subject and period, "
+                    "aggregated from the observations the requester can see, on individual and group goals. "
+                    "Values are rescaled to, and kept within, the range of the mastery schema.",
+        parameters=[
+            OpenApiParameter(
+                name='begin_at',
+                description='Start of the period, ISO date or date and time',
+                required=True,
+                type={'type': 'string'},
+                location=OpenApiParameter.QUERY
+            ),
+            OpenApiParameter(
+                name='end_at',
+                description='End of the period, ISO date (inclusive) or date and time',
+                required=True,
+                type={'type': 'string'},
+                location=OpenApiParameter.QUERY
+            ),
+            OpenApiParameter(
+                name='subject',
+                description='Subject of the statuses, instead of the subject of the group',
+                required=False,
+                type={'type': 'string'},
+                location=OpenApiParameter.QUERY
+            ),
+            OpenApiParameter(
+                name='strategy',
+                description='How observations are aggregated: "recency_weighted_mean" (default), '
+                            '"last_n_median" or "trend" (value at end_at of the least squares line)',
+                required=False,
+                type={'type': 'string', 'enum': list(status_suggestions.STRATEGIES)},
+                location=OpenApiParameter.QUERY
+            ),
+            OpenApiParameter(
+                name='half_life_days',
+                description='For recency_weighted_mean: observations count half as much for every this '
+                            'many days they are older than end_at',
+                required=False,
+                type={'type': 'integer'},
+                location=OpenApiParameter.QUERY
+            ),
+            OpenApiParameter(
+                name='last_n',
+                description='For last_n_median: how many of the latest observations to use',
+                required=False,
+                type={'type': 'integer'},
+                location=OpenApiParameter.QUERY
+            ),
+            OpenApiParameter(
+                name='mastery_schema',
+                description="Mastery schema of the statuses, instead of the school's default schema",
+                required=False,
+                type={'type': 'string'},
+                location=OpenApiParameter.QUERY
+            ),
+        ],
+    )
+    @action(detail=True, methods=['get'], url_path='status-suggestions')
+    def status_suggestions(self, request, pk=None):
+        group = self.get_object()
+        query_params = request.query_params
+        subject_param, _ = get_request_param(query_params, 'subject')
+        subject_id = subject_param or group.subject_id
+        if not subject_id:
+            raise ValidationError(
+                {'error': 'missing-parameter', 'message': 'The "subject" query parameter is required.'})
+        begin_at = self.get_period_param(query_params, 'begin_at')
+        end_at = self.get_period_param(query_params, 'end_at', is_end=True)
+
+        strategy, _ = get_request_param(query_params, 'strategy')
+        strategy = strategy or status_suggestions.DEFAULT_STRATEGY
+        if strategy not in status_suggestions.STRATEGIES:
+            raise ValidationError(
+                {'error': 'invalid-parameter', 'message': f'Unknown strategy "{strategy}".'})
+        options = {}
+        for name in ('half_life_days', 'last_n'):
+            value, value_set = get_request_param(query_params, name)
+            if value_set:
+                try:
+                    options[name] = int(value)
+                except (TypeError, ValueError):
+                    options[name] = 0
+                if options[name] < 1:
+                    raise ValidationError(
+                        {'error': 'invalid-parameter', 'message': f'"{name}" must be a positive integer.'})
+
+        schema_param, _ = get_request_param(query_params, 'mastery_schema')
+        schemas = MasterySchemaAccessPolicy().scope_queryset(request, models.MasterySchema.objects.all())
+        if schema_param:
+            mastery_schema = schemas.filter(id=schema_param).first()
+            if mastery_schema is None:
+                raise ValidationError({'error': 'invalid-parameter', 'message': 'Unknown mastery schema.'})
+        else:
+            mastery_schema = schemas.filter(school_id=group.school_id, is_default=True).first()
+
+        students = self.get_group_students(group)
+        observations = ObservationAccessPolicy().scope_queryset(
+            request, models.Observation.objects.filter(subject_id=subject_id))
+        suggestions = status_suggestions.suggest_statuses(
+            observations, [student_id for student_id, _ in students], begin_at, end_at, strategy,
+            mastery_schema, options)
+        return Response([
+            {
+                'student_id': student_id,
+                'subject_id': subject_id,
+                'mastery_schema_id': mastery_schema.id if mastery_schema else None,
+                'begin_at': begin_at,
+                'end_at': end_at,
+                'strategy': strategy,
+                **suggestions[student_id],
+            }
+            for student_id, _ in students
+        ])
+
+    @staticmethod
+    def get_group_students(group):
+        """(user_id, name) of the students in group, by name"""
+        return list(models.UserGroup.objects.filter(
+            group_id=group.id, role__name='student', deleted_at__isnull=True, user__deleted_at__isnull=True
+        ).order_by('user__name', 'user_id').values_list('user_id', 'user__name'))
+
+    @staticmethod
+    def get_period_param(query_params, name, is_end=False):
+        value, _ = get_request_param(query_params, name)
+        if not value:
+            raise ValidationError(
+                {'error': 'missing-parameter', 'message': f'The "{name}" query parameter is required.'})
+        try:
+            return status_suggestions.parse_period_limit(value, is_end)
+        except ValueError:
+            raise ValidationError(
+                {'error': 'invalid-parameter',
+                 'message': f'Invalid date format for "{name}" parameter. Use ISO format (YYYY-MM-DD).'})
 
 
 @extend_schema_view(
@@ -510,9 +998,13 @@ class GroupViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets.ModelVi
         ]
     )
 )
-class SubjectViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets.ModelViewSet):
+class SubjectViewSet(
+    FingerprintViewSetMixin, ConditionalGetViewSetMixin, AccessViewSetMixin, viewsets.ModelViewSet
+):
     queryset = models.Subject.objects.all()
     serializer_class = serializers.SubjectSerializer
+    version_school_field = "owned_by_school_id"
+    version_models = ["subject", "group", "goal", "usergroup"]
     access_policy = SubjectAccessPolicy
 
     def get_queryset(self):
@@ -564,7 +1056,7 @@ class SubjectViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets.Model
                     qs = qs.filter(owned_by_school_id=school_param)
                 else:
                     qs = qs.filter(owned_by_school_id=None)
-            return qs.distinct()
+            return qs
         # non-list actions (retrieve, create, update, destroy) do not require parameters
         return qs
 
@@ -617,13 +1109,42 @@ class SubjectViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets.Model
         ]
     )
 )
-class GoalViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets.ModelViewSet):
+class GoalViewSet(
+    FingerprintViewSetMixin, ConditionalGetViewSetMixin, ExportViewSetMixin, AccessViewSetMixin,
+    viewsets.ModelViewSet
+):
     queryset = models.Goal.objects.all()
     serializer_class = serializers.GoalSerializer
+    version_school_field = "school_id"
+    version_models = ["goal", "usergroup", "observation"]
     filter_backends = [OrderingFilter]
     ordering_fields = ['created_at', 'updated_at', 'title', 'sort_order']
     ordering = ['sort_order']
     access_policy = GoalAccessPolicy
+    export_columns = (
+        ('id', 'id'),
+        ('title', 'title'),
+        ('description', 'description'),
+        ('group_id', 'group_id'),
+        ('group', 'group__display_name'),
+        ('student_id', 'student_id'),
+        ('student', 'student__name'),
+        ('subject_id', 'subject_id'),
+        ('subject', 'subject__display_name'),
+        ('mastery_schema', 'mastery_schema__title'),
+        ('sort_order', 'sort_order'),
+        ('is_relevant', 'is_relevant'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+    )
+    export_subject_fields = ('subject_id', 'group__subject_id')
+
+    def filter_export_group(self, qs, group, student_ids):
+        """The group's goals, and individual goals of its students in the group's subject"""
+        individual = Q(student_id__in=student_ids)
+        if group.subject_id:
+            individual &= Q(subject_id=group.subject_id)
+        return qs.filter(Q(group_id=group.id) | individual)
 
     def get_queryset(self):
         qs = self.access_policy().scope_queryset(self.request, super().get_queryset()).order_by('sort_order')
@@ -656,7 +1177,8 @@ class GoalViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets.ModelVie
                 # Student can be either the owner of a individual goal or a member of a group goal
                 qs = qs.filter(
                     Q(student_id=student_param) |
-                    Q(group__user_groups__user_id=student_param, group__user_groups__deleted_at__isnull=True)
+                    Exists(models.UserGroup.objects.filter(
+                        group_id=OuterRef('group_id'), user_id=student_param, deleted_at__isnull=True))
                 )
             if subject_param:
                 # Subject can be either on a individual goal or a group goal
@@ -697,9 +1219,12 @@ class GoalViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets.ModelVie
         ]
     )
 )
-class RoleViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets.ModelViewSet):
+class RoleViewSet(
+    FingerprintViewSetMixin, ConditionalGetViewSetMixin, AccessViewSetMixin, viewsets.ModelViewSet
+):
     queryset = models.Role.objects.all()
     serializer_class = serializers.RoleSerializer
+    version_models = ["role"]
     access_policy = RoleAccessPolicy
 
     def get_queryset(self):
@@ -721,9 +1246,13 @@ class RoleViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets.ModelVie
         ]
     )
 )
-class MasterySchemaViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets.ModelViewSet):
+class MasterySchemaViewSet(
+    FingerprintViewSetMixin, ConditionalGetViewSetMixin, AccessViewSetMixin, viewsets.ModelViewSet
+):
     queryset = models.MasterySchema.objects.all()
     serializer_class = serializers.MasterySchemaSerializer
+    version_school_field = "school_id"
+    version_models = ["masteryschema"]
     access_policy = MasterySchemaAccessPolicy
 
     def get_queryset(self):
@@ -797,10 +1326,43 @@ class MasterySchemaViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets
         ]
     )
 )
-class ObservationViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets.ModelViewSet):
+class ObservationViewSet(
+    FingerprintViewSetMixin, ConditionalGetViewSetMixin, ValuesListViewSetMixin, ExportViewSetMixin,
+    AccessViewSetMixin, viewsets.ModelViewSet
+):
     queryset = models.Observation.objects.all()
     serializer_class = serializers.ObservationSerializer
+    version_school_field = "goal.school_id"
+    version_models = ["observation", "usergroup", "group", "goal"]
     access_policy = ObservationAccessPolicy
+    export_columns = (
+        ('id', 'id'),
+        ('student_id', 'student_id'),
+        ('student', 'student__name'),
+        ('student_feide_id', 'student__feide_id'),
+        ('goal_id', 'goal_id'),
+        ('goal', 'goal__title'),
+        ('subject_id', 'subject_id'),
+        ('subject', 'subject__display_name'),
+        ('mastery_value', 'mastery_value'),
+        ('mastery_description', 'mastery_description'),
+        ('feedforward', 'feedforward'),
+        ('observed_at', 'observed_at'),
+        ('observer', 'observer__name'),
+        ('is_visible_to_student', 'is_visible_to_student'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+    )
+    export_school_field = 'goal__school_id'
+    export_period_fields = ('observed_at', 'observed_at')
+    export_ordering = ('student_id', 'observed_at', 'id')
+
+    def filter_export_group(self, qs, group, student_ids):
+        """Observations on the group's goals, and of its students in the group's subject"""
+        of_students = Q(student_id__in=student_ids)
+        if group.subject_id:
+            of_students &= Q(subject_id=group.subject_id)
+        return qs.filter(Q(goal__group_id=group.id) | of_students)
 
     def get_queryset(self):
         qs = self.access_policy().scope_queryset(self.request, super().get_queryset()).order_by('observed_at')
@@ -870,6 +1432,105 @@ class ObservationViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets.M
         # non-list actions (retrieve, create, update, destroy) do not require parameters
         return qs
 
+    # Largest number of observations in one bulk request
+    MAX_BULK_SIZE = 500
+
+    @extend_schema(
+        summary="Create and update many observations",
+        description="Takes a list of observations: those with an id are updated, the others are created. "
+                    "All are saved, or none: if any observation is invalid or not allowed, the response "
+                    "is a list of errors with one entry for each observation, empty if it has no errors.",
+        request=serializers.ObservationSerializer(many=True),
+        responses=serializers.ObservationSerializer(many=True),
+    )
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        items = request.data
+        if not isinstance(items, list) or not items:
+            raise ValidationError({'error': 'invalid-parameter',
+                                   'message': 'The request body must be a list of observations.'})
+        if len(items) > self.MAX_BULK_SIZE:
+            raise ValidationError({'error': 'invalid-parameter',
+                                   'message': f'At most {self.MAX_BULK_SIZE} observations at once.'})
+
+        # Everything referred to by the items, with one query per model
+        update_ids = [item['id'] for item in items if isinstance(item, dict) and item.get('id')]
+        existing = {
+            observation.id: observation for observation in self.access_policy().scope_queryset(
+                request, models.Observation.objects.filter(id__in=update_ids, deleted_at__isnull=True)
+            ).select_related('goal__group', 'goal__mastery_schema')
+        }
+        context = self.get_serializer_context()
+        context['related_instances'] = serializers.preload_related_instances(
+            serializers.ObservationSerializer, items, context, {'goal': ['group', 'mastery_schema']})
+
+        errors = [{} for _ in items]
+        observations = [None] * len(items)
+        changed_fields = set()
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                errors[index] = {'non_field_errors': ['Expected an observation.']}
+                continue
+            instance = existing.get(item['id']) if item.get('id') else None
+            if item.get('id') and instance is None:
+                errors[index] = {'id': ['Not found.']}
+                continue
+            serializer = serializers.ObservationSerializer(
+                instance, data=item, partial=instance is not None, context=context)
+            if not serializer.is_valid():
+                errors[index] = serializer.errors
+                continue
+            observations[index] = (instance, serializer.validated_data)
+            changed_fields.update(serializer.validated_data)
+
+        # Authorize all valid writes at once, against the observations as they are before the update
+        valid = [index for index, observation in enumerate(observations) if observation]
+        writes = [
+            (instance, instance.goal if instance else data['goal'], None if instance else data['student'].id)
+            for instance, data in (observations[index] for index in valid)
+        ]
+        is_allowed = self.access_policy().can_write_observations(request, writes)
+        is_student = 'student' in get_principal_scope(request).role_names
+        for index, allowed, (instance, _, student_id) in zip(valid, is_allowed, writes):
+            if not allowed:
+                errors[index] = {'non_field_errors': ['You do not have permission to save this observation.']}
+            elif instance is None and is_student and str(student_id) == str(request.user.id):
+                # As for single creates: students cannot create invisible observations
+                observations[index][1]['is_visible_to_student'] = True
+
+        if any(errors):
+            # 403 if all observations are valid, and the errors are about permissions
+            return Response(errors, status=status.HTTP_403_FORBIDDEN if len(valid) == len(items)
+                            else status.HTTP_400_BAD_REQUEST)
+
+        now = timezone.now()
+        saved = []
+        summary_keys = set()
+        for instance, data in observations:
+            if instance:
+                summary_keys.update(instance.get_summary_keys())
+            observation = instance or models.Observation(created_by=request.user)
+            for attr, value in data.items():
+                setattr(observation, attr, value)
+            observation.updated_by = request.user
+            observation.updated_at = now
+            observation.derive_subject()
+            saved.append(observation)
+        to_create = [observation for observation, (instance, _) in zip(saved, observations) if not instance]
+        to_update = [observation for observation, (instance, _) in zip(saved, observations) if instance]
+        with transaction.atomic():
+            models.Observation.objects.bulk_create(to_create)
+            if to_update:
+                update_fields = sorted(changed_fields | {'subject', 'updated_by', 'updated_at'})
+                models.Observation.objects.bulk_update(to_update, update_fields)
+            # bulk_create and bulk_update send no model signals
+            summary_keys.update((observation.student_id, observation.goal_id) for observation in saved)
+            models.ObservationSummary.refresh(summary_keys)
+        models.VersionStamp.bump(['observation'], {observation.goal.school_id for observation in saved})
+
+        return Response(serializers.ObservationSerializer(saved, many=True, context=context).data,
+                        status=status.HTTP_201_CREATED if to_create else status.HTTP_200_OK)
+
 
 @extend_schema_view(
     list=extend_schema(
@@ -943,10 +1604,33 @@ class DataMaintenanceTaskViewSet(FingerprintViewSetMixin, AccessViewSetMixin, vi
         ]
     )
 )
-class StatusViewSet(FingerprintViewSetMixin, AccessViewSetMixin, viewsets.ModelViewSet):
+class StatusViewSet(
+    FingerprintViewSetMixin, ValuesListViewSetMixin, ExportViewSetMixin, AccessViewSetMixin,
+    viewsets.ModelViewSet
+):
     queryset = models.Status.objects.all()
     serializer_class = serializers.StatusSerializer
+    version_school_field = "school_id"
     access_policy = StatusAccessPolicy
+    export_columns = (
+        ('id', 'id'),
+        ('title', 'title'),
+        ('student_id', 'student_id'),
+        ('student', 'student__name'),
+        ('student_feide_id', 'student__feide_id'),
+        ('subject_id', 'subject_id'),
+        ('subject', 'subject__display_name'),
+        ('begin_at', 'begin_at'),
+        ('end_at', 'end_at'),
+        ('mastery_value', 'mastery_value'),
+        ('mastery_description', 'mastery_description'),
+        ('feedforward', 'feedforward'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+    )
+    # Statuses whose period overlaps from - to
+    export_period_fields = ('begin_at', 'end_at')
+    export_ordering = ('student_id', 'begin_at', 'id')
 
     def get_queryset(self):
         qs = self.access_policy().scope_queryset(self.request, super().get_queryset())
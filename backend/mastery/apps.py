@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class MasteryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'mastery'
+
+    def ready(self):
+        # Connect signal receivers
+        from mastery import signals  # noqa: F401
@@ -1,7 +1,12 @@
 from typing import Optional, Tuple
+from django.conf import settings
+from django.core.cache import cache
 from rest_framework.authentication import SessionAuthentication
 from rest_framework.exceptions import AuthenticationFailed
-from mastery.models import User
+from mastery.models import School, User
+
+USER_CACHE_KEY = "session-user:{user_id}"
+SCHOOL_CACHE_KEY = "affiliation-schools:{org_number}"
 
 
 class SessionUserIdAuthentication(SessionAuthentication):
@@ -15,10 +20,63 @@ class SessionUserIdAuthentication(SessionAuthentication):
         if not user_id:
             # AnonymousUser allowed for public endpoints, trust DRF to handle security
             return None, None
-        try:
-            user = User.objects.get(id=user_id)
-        except User.DoesNotExist:
+        user = get_cached_user(user_id)
+        if user is None:
             raise AuthenticationFailed("Invalid session user")
         # Enforce CSRF validation for session-based authentication
         self.enforce_csrf(request)
         return user, None
+
+
+def get_cached_user(user_id):
+    """
+    Return the User with user_id, or None if there is none. Cached for USER_CACHE_SECONDS,
+    until the user is saved or deleted (see invalidate_cached_user)
+    """
+    timeout = settings.USER_CACHE_SECONDS
+    cache_key = USER_CACHE_KEY.format(user_id=user_id)
+    user = cache.get(cache_key) if timeout else None
+    if user is None:
+        user = User.objects.filter(id=user_id).first()
+        if user is not None and timeout:
+            cache.set(cache_key, user, timeout)
+    return user
+
+
+def invalidate_cached_user(user_id):
+    """Remove the user from the cache. Call this when users change through update(), which sends no signals"""
+    cache.delete(USER_CACHE_KEY.format(user_id=user_id))
+
+
+def invalidate_cached_users(user_ids):
+    """Remove users from the cache, like invalidate_cached_user, e.g. after bulk_update() of users"""
+    cache.delete_many([USER_CACHE_KEY.format(user_id=user_id) for user_id in user_ids])
+
+
+def get_schools_by_org_number(org_numbers):
+    """
+    Return {org_number: [School]} for org_numbers, with an empty list for unknown org numbers.
+    Cached per org number for SCHOOL_CACHE_SECONDS, until the school is saved or deleted
+    (see invalidate_cached_schools). The org numbers missing from the cache are read with one query.
+    """
+    timeout = settings.SCHOOL_CACHE_SECONDS
+    keys = {SCHOOL_CACHE_KEY.format(org_number=org_number): org_number for org_number in org_numbers}
+    cached = cache.get_many(keys) if timeout else {}
+    schools_by_org_number = {keys[key]: schools for key, schools in cached.items()}
+    missing = set(org_numbers) - set(schools_by_org_number)
+    if missing:
+        fetched = {org_number: [] for org_number in missing}
+        for school in School.objects.filter(org_number__in=missing).order_by('display_name', 'id'):
+            fetched[school.org_number].append(school)
+        if timeout:
+            cache.set_many(
+                {SCHOOL_CACHE_KEY.format(org_number=org_number): schools
+                 for org_number, schools in fetched.items()},
+                timeout)
+        schools_by_org_number.update(fetched)
+    return schools_by_org_number
+
+
+def invalidate_cached_schools(org_numbers):
+    """Remove the schools of org_numbers from the cache. Call this when schools change through update()"""
+    cache.delete_many([SCHOOL_CACHE_KEY.format(org_number=org_number) for org_number in org_numbers])
@@ -1,5 +1,8 @@
+from django.db import transaction
 from django.utils import timezone
 from mastery import models
+from mastery.access_policies.scope import invalidate_principal_scopes
+from mastery.authentication import invalidate_cached_users
 from django.db.models import Q, Count
 from mastery.constants import (
     DAYS_BEFORE_HARD_DELETE_OF_GROUP,
@@ -71,6 +74,11 @@ def update_data_integrity(org_number, options):
                       "message": f"Hard deletion for school {school.org_number} failed"})
     logger.debug(f"End hard-delete")
 
+    if not dry_run:
+        # Memberships at the school may be gone, cached access scopes of its users are stale
+        invalidate_principal_scopes(school_ids=[school.id])
+        models.VersionStamp.bump(["group", "user", "observation", "goal", "usergroup"], [school.id])
+
     yield {
         "result": {
             "entity": "all",
@@ -113,9 +121,11 @@ def soft_delete_users(school, now, maintained_earlier_than, dry_run=False):
     )
     if dry_run:
         return list(users.values("id", "feide_id", "name"))
-    count = users.count()
+    user_ids = list(users.values_list("id", flat=True))
     users.update(deleted_at=now)
-    return count
+    # update() sends no model signals, deleted users must not stay logged in from the cache
+    invalidate_cached_users(user_ids)
+    return len(user_ids)
 
 
 def soft_delete_observations(school, now, dry_run=False):
@@ -131,8 +141,12 @@ def soft_delete_observations(school, now, dry_run=False):
     ).filter(on_individual_goals_on_school | on_group_goals_on_school)
     if dry_run:
         return list(observations.values("id", "student__name", "student__feide_id", "goal__title"))
-    count = observations.count()
-    observations.update(deleted_at=now)
+    with transaction.atomic():
+        summary_keys = set(observations.values_list("student_id", "goal_id"))
+        count = observations.count()
+        observations.update(deleted_at=now)
+        # update() sends no model signals
+        models.ObservationSummary.refresh(summary_keys)
     return count
 
 
@@ -1,8 +1,8 @@
 import os
-import json
 import requests
 from requests.structures import CaseInsensitiveDict
-from .helpers import get_feide_access_token
+from .helpers import GROUP_KINDS, NdjsonWriter, get_feide_access_token, write_fetch_stats
+from . import http_client
 from urllib.parse import quote
 import logging
 
@@ -19,7 +19,7 @@ data_dir = os.path.join(script_dir, 'data')
 
 def _fetch_groups(url, token):
     """Helper function for pagination """
-    groups_response = requests.get(url, headers={"Authorization": "Bearer " + token})
+    groups_response = http_client.get(url, headers={"Authorization": "Bearer " + token})
     if groups_response.status_code != 200:
         logger.error("Failed to fetch groups: %d %s", groups_response.status_code, groups_response.text)
         raise Exception(f"Failed to fetch groups: {groups_response.status_code}: {groups_response.text}")
@@ -73,7 +73,7 @@ def _fetch_groups(url, token):
 
 
 def fetch_groups_from_feide(org_number: str):
-    """Fetch groups for a single school (by org number) and store them in a per-school file."""
+    """Fetch groups for a single school (by org number) and store them in a per-school groups.ndjson file."""
     token = get_feide_access_token()
 
     all_results = {
@@ -126,13 +126,14 @@ def fetch_groups_from_feide(org_number: str):
             seen_subjects.add(code)
     all_results['subjects'] = unique_subjects
 
-    # Write to per-school file
-    school_dir = os.path.join(data_dir, org_number)
-    os.makedirs(school_dir, exist_ok=True)
-    groups_file = os.path.join(school_dir, 'groups.json')
-
-    with open(groups_file, "w", encoding="utf-8") as f:
-        json.dump(all_results, f, indent=2, ensure_ascii=False)
+    # Write to per-school file, one line per group
+    groups_file = os.path.join(data_dir, org_number, 'groups.ndjson')
+    with NdjsonWriter(groups_file) as writer:
+        for kind in GROUP_KINDS:
+            for item in all_results[kind]:
+                writer.write({"kind": kind, "item": item})
+    groups_count = len(all_results["basis"]) + len(all_results["teaching"])
+    write_fetch_stats(groups_file, {"groups_count": groups_count}, writer.sha256)
 
     for group_type in all_results:
         logger.debug("Fetched %d %s groups", len(all_results[group_type]), group_type)
@@ -157,7 +158,7 @@ def fetch_school_group(org_number, access_token):
     school_group_id = f"fc:org:{FEIDE_REALM}:unit:{org_number}"
     endpoint_url = f"{GROUPS_BASE}/orgs/{FEIDE_REALM}/groups/{quote(school_group_id, safe='')}"
 
-    response = requests.get(endpoint_url, headers={"Authorization": f"Bearer {access_token}"})
+    response = http_client.get(endpoint_url, headers={"Authorization": f"Bearer {access_token}"})
     if response.status_code != 200:
         raise Exception(
             f"Failed to fetch groups for org {org_number}: {response.status_code} {response.text}")
@@ -1,7 +1,9 @@
 import os
-import json
-import requests
-from .helpers import create_user_item, get_feide_access_token
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from .helpers import (HostRateLimiter, NdjsonWriter, create_user_item, does_file_exist,
+                      get_feide_access_token, iter_school_groups, write_fetch_stats)
+from . import http_client
 from urllib.parse import quote
 import logging
 
@@ -9,107 +11,96 @@ logger = logging.getLogger(__name__)
 
 # API Configuration
 MEMEBERS_URL = os.environ.get('MEMEBERS_URL')
+# Number of groups fetched concurrently, and max requests per second against the members API host
+FEIDE_FETCH_WORKERS = int(os.environ.get('FEIDE_FETCH_WORKERS', '8'))
+FEIDE_REQUESTS_PER_SECOND = float(os.environ.get('FEIDE_REQUESTS_PER_SECOND', '20'))
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 data_dir = os.path.join(script_dir, 'data')
 
 
-def fetch_memberships_from_feide(org_number: str, anonymize=False):
-    """Fetch memberships for one school by reading its groups.json and hitting Feide members API."""
+def fetch_memberships_from_feide(org_number: str, anonymize=False, workers=None):
+    """
+    Fetch memberships for one school by reading its groups file and hitting Feide members API.
+    Up to workers groups (default FEIDE_FETCH_WORKERS) are fetched concurrently over pooled connections.
+    Each group is written to memberships.ndjson as soon as it is processed, in group order,
+    so the file is the same regardless of worker count.
+    """
     logger.debug("Starting membership fetch for organization: %s", org_number)
     token = get_feide_access_token()
 
     # Ensure per-school groups file exists
     school_dir = os.path.join(data_dir, org_number)
-    groups_file = os.path.join(school_dir, 'groups.json')
-    if not os.path.exists(groups_file):
-        logger.error("Groups file not found for school %s at path: %s", org_number, groups_file)
+    if not does_file_exist(org_number, 'groups'):
+        logger.error("Groups file not found for school %s in: %s", org_number, school_dir)
         raise Exception(f"Groups file not found for school {org_number}. Fetch groups first.")
 
-    # Load per-school groups
-    with open(groups_file, 'r', encoding="utf-8") as f:
-        groups_data = json.load(f)
-
-    # Collect group ids (basis + teaching are what we care about for memberships)
-    basis_groups = groups_data.get('basis', [])
-    teaching_groups = groups_data.get('teaching', [])
-    all_groups = basis_groups + teaching_groups
-
-    memberships = {}
     errors = []
     total_memberships = 0
     total_teacher_memberships = 0
     total_student_memberships = 0
     unique_users = set()
 
-    # Progress tracking
-    total_group_count = len(all_groups)
-
-    for index, group in enumerate(all_groups):
-        group_id = group.get('id')
-        if not group_id:
-            group_name = group.get('displayName', 'unknown')
-            logger.warning("Group without ID found: %s", group_name)
-            errors.append({"error": "data-error", "message": f"Group without id {group_name}"})
-            continue
-
-        logger.debug("Processing group %d/%d: %s", index + 1, total_group_count, group_id)
-
-        # Percent-encode the full Feide id when placing in the URL path
-        group_members_url = f"{MEMEBERS_URL}/{quote(group_id, safe='')}/members"
-        # Fetch members for this group
-        members_response = requests.get(group_members_url, headers={"Authorization": "Bearer " + token})
-
-        if members_response.status_code != 200:
-            logger.error("Failed to fetch members for group %s: HTTP %d",
-                         group_id, members_response.status_code)
-            errors.append({"error": "fetch-error", "message": f"Failed to fetch members for group {group_id}"})
-            raise Exception(
-                f"Failed to fetch members for group {group_id}: HTTP {members_response.status_code}")
-
-        memberships[group_id] = {"teachers": [], "students": [], "other": []}
-        feide_group_members = members_response.json() or []
-
-        # Track memberships by role
-
-        for feide_member in feide_group_members:
-            user_item = create_user_item(feide_member, anonymize=anonymize)
-            feide_id = user_item.get('feide_id')
-            unique_users.add(feide_id)
-
-            affiliations = user_item.get('affiliations', [])
-            if 'student' in affiliations:
-                memberships[group_id]['students'].append(user_item)
-                total_student_memberships += 1
-            elif 'faculty' in affiliations:
-                memberships[group_id]['teachers'].append(user_item)
-                total_teacher_memberships += 1
-            else:
-                memberships[group_id]['other'].append(user_item)
-            total_memberships += 1
-
-        # Periodic progress report every 10 groups
-        if (index + 1) % 10 == 0:
-            yield {
-                "result": {
-                    "entity": "membership",
-                    "action": "fetch",
-                    "errors": errors,
-                    "counts": {
-                        "teacher_membership":  {"fetched": total_teacher_memberships},
-                        "student_membership":  {"fetched": total_student_memberships},
-                        "unique_users":         {"fetched": len(unique_users)},
-                        "total_membership":    {"fetched": total_memberships},
-                    },
-                },
-                "is_done": False,
-            }
-
-    # Write per-school memberships file
-    os.makedirs(school_dir, exist_ok=True)
-    memberships_file = os.path.join(school_dir, 'memberships.json')
-    with open(memberships_file, "w", encoding="utf-8") as file:
-        json.dump(memberships, file, indent=2, ensure_ascii=False)
+    # Groups are read from the groups file as they are fetched, not loaded up front
+    groups_to_fetch = iter_groups_to_fetch(org_number, errors)
+
+    workers = max(1, workers or FEIDE_FETCH_WORKERS)
+    rate_limiter = HostRateLimiter(FEIDE_REQUESTS_PER_SECOND)
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="feide-members")
+
+    memberships_file = os.path.join(school_dir, 'memberships.ndjson')
+    try:
+        # Results come back in group order, while the next groups are fetched in the background
+        fetched = fetch_ahead(executor, lambda group: fetch_group_members(token, rate_limiter, group['id']),
+                              groups_to_fetch, ahead=2 * workers)
+        with NdjsonWriter(memberships_file) as writer:
+            for index, (group, feide_group_members) in enumerate(fetched):
+                group_id = group['id']
+                logger.debug("Processing group %d: %s", index + 1, group_id)
+                group_memberships = {"group_id": group_id, "teachers": [], "students": [], "other": []}
+
+                # Track memberships by role
+
+                for feide_member in feide_group_members:
+                    user_item = create_user_item(feide_member, anonymize=anonymize)
+                    feide_id = user_item.get('feide_id')
+                    unique_users.add(feide_id)
+
+                    affiliations = user_item.get('affiliations', [])
+                    if 'student' in affiliations:
+                        group_memberships['students'].append(user_item)
+                        total_student_memberships += 1
+                    elif 'faculty' in affiliations:
+                        group_memberships['teachers'].append(user_item)
+                        total_teacher_memberships += 1
+                    else:
+                        group_memberships['other'].append(user_item)
+                    total_memberships += 1
+                writer.write(group_memberships)
+
+                # Periodic progress report every 10 groups
+                if (index + 1) % 10 == 0:
+                    yield {
+                        "result": {
+                            "entity": "membership",
+                            "action": "fetch",
+                            "errors": errors,
+                            "counts": {
+                                "teacher_membership":  {"fetched": total_teacher_memberships},
+                                "student_membership":  {"fetched": total_student_memberships},
+                                "unique_users":         {"fetched": len(unique_users)},
+                                "total_membership":    {"fetched": total_memberships},
+                            },
+                        },
+                        "is_done": False,
+                    }
+        write_fetch_stats(
+            memberships_file,
+            {"users_count": len(unique_users), "memberships_count": total_memberships},
+            writer.sha256)
+    finally:
+        # On failure, drop groups still queued for fetching
+        executor.shutdown(wait=True, cancel_futures=True)
 
     yield {
         "result": {
@@ -125,3 +116,52 @@ def fetch_memberships_from_feide(org_number: str, anonymize=False):
         },
         "is_done": True,
     }
+
+
+def iter_groups_to_fetch(org_number, errors):
+    """
+    Yield the basis groups of school, then its teaching groups, reading the groups file once for each.
+    Groups without id are reported in errors.
+    """
+    for group_kind in ('basis', 'teaching'):
+        for kind, group in iter_school_groups(org_number):
+            if kind != group_kind:
+                continue
+            if not group.get('id'):
+                group_name = group.get('displayName', 'unknown')
+                logger.warning("Group without ID found: %s", group_name)
+                errors.append({"error": "data-error", "message": f"Group without id {group_name}"})
+                continue
+            yield group
+
+
+def fetch_ahead(executor, fetch, items, ahead):
+    """
+    Like executor.map(fetch, items), yielding (item, result) in order, but with at most ahead items
+    submitted at a time, so items are taken from the iterator only as results are used
+    """
+    pending = deque()
+    for item in items:
+        pending.append((item, executor.submit(fetch, item)))
+        if len(pending) >= ahead:
+            item, future = pending.popleft()
+            yield item, future.result()
+    while pending:
+        item, future = pending.popleft()
+        yield item, future.result()
+
+
+def fetch_group_members(token, rate_limiter, group_id):
+    """Fetch members of one Feide group. Runs in a worker thread, so it must not touch shared state."""
+    # Percent-encode the full Feide id when placing in the URL path
+    group_members_url = f"{MEMEBERS_URL}/{quote(group_id, safe='')}/members"
+    rate_limiter.wait(group_members_url)
+    members_response = http_client.get(group_members_url, headers={"Authorization": "Bearer " + token})
+
+    if members_response.status_code != 200:
+        logger.error("Failed to fetch members for group %s: HTTP %d",
+                     group_id, members_response.status_code)
+        raise Exception(
+            f"Failed to fetch members for group {group_id}: HTTP {members_response.status_code}")
+
+    return members_response.json() or []
@@ -0,0 +1,118 @@
+import os
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from django.db import transaction
+from django.utils import timezone
+from mastery import models
+from . import http_client
+
+logger = logging.getLogger(__name__)
+
+UDIR_GREP_URL = os.environ.get('UDIR_GREP_URL')
+# Cached grep codes older than this are refreshed from UDIR
+GREP_CACHE_TTL_DAYS = int(os.environ.get('GREP_CACHE_TTL_DAYS', '30'))
+# Number of grep codes fetched concurrently, and how long to wait for each
+UDIR_FETCH_WORKERS = int(os.environ.get('UDIR_FETCH_WORKERS', '8'))
+UDIR_TIMEOUT = float(os.environ.get('UDIR_TIMEOUT', '10'))
+
+# Fields of a cached grep code that can be used to create a Subject
+SUBJECT_FIELDS = ["display_name", "short_name", "grep_code", "grep_group_code"]
+
+
+def resolve_grep_codes(grep_codes):
+    """
+    Look up grep codes in the local cache, fetching unknown and expired ones from UDIR in one concurrent pass.
+    If refreshing an expired code fails, the expired entry is used.
+    Returns (subject_fields_by_grep_code, errors), subject_fields can be used to create a Subject.
+    """
+    grep_codes = {grep_code for grep_code in grep_codes if grep_code}
+    cached_by_grep_code = {
+        cached.grep_code: cached for cached in models.GrepCode.objects.filter(grep_code__in=grep_codes)}
+    stale_before = timezone.now() - timezone.timedelta(days=GREP_CACHE_TTL_DAYS)
+    to_fetch = sorted(
+        grep_code for grep_code in grep_codes
+        if grep_code not in cached_by_grep_code or cached_by_grep_code[grep_code].fetched_at < stale_before)
+
+    errors = []
+    fetched = fetch_subjects_from_udir(to_fetch)
+    now = timezone.now()
+    to_create = []
+    to_update = []
+    for grep_code, (udir_subject, error) in zip(to_fetch, fetched):
+        cached = cached_by_grep_code.get(grep_code)
+        if error:
+            if cached:
+                logger.warning("Using expired grep code %s, refresh failed: %s", grep_code, error)
+            else:
+                errors.append(error)
+            continue
+        if cached:
+            for field, value in udir_subject.items():
+                setattr(cached, field, value)
+            cached.fetched_at = now
+            cached.updated_at = now
+            to_update.append(cached)
+        else:
+            cached = models.GrepCode(**udir_subject, fetched_at=now)
+            cached_by_grep_code[grep_code] = cached
+            to_create.append(cached)
+
+    with transaction.atomic():
+        models.GrepCode.objects.bulk_create(to_create, ignore_conflicts=True)
+        models.GrepCode.objects.bulk_update(
+            to_update, ["display_name", "short_name", "grep_group_code", "fetched_at", "updated_at"])
+    if to_fetch:
+        logger.debug("Fetched %d of %d grep codes from UDIR", len(to_create) + len(to_update), len(to_fetch))
+
+    subject_fields_by_grep_code = {
+        grep_code: {field: getattr(cached, field) for field in SUBJECT_FIELDS}
+        for grep_code, cached in cached_by_grep_code.items()
+    }
+    return subject_fields_by_grep_code, errors
+
+
+def resolve_grep_code(grep_code):
+    """Look up a single grep code, see resolve_grep_codes. Returns (subject_fields, error_message)"""
+    subject_fields_by_grep_code, errors = resolve_grep_codes([grep_code])
+    if grep_code in subject_fields_by_grep_code:
+        return subject_fields_by_grep_code[grep_code], None
+    return None, errors[0] if errors else f"Unknown grep_code {grep_code}"
+
+
+def fetch_subjects_from_udir(grep_codes):
+    """Fetch grep codes concurrently from UDIR. Returns a list of (subject_fields, error_message), in order"""
+    if not grep_codes:
+        return []
+    with ThreadPoolExecutor(max_workers=min(UDIR_FETCH_WORKERS, len(grep_codes)),
+                            thread_name_prefix="udir-grep") as executor:
+        return list(executor.map(fetch_subject_from_udir, grep_codes))
+
+
+def fetch_subject_from_udir(grep_code):
+    """
+    Fetch a subject from the UDIR grep API.
+    Returns (subject_fields, error_message), where subject_fields can be used to create a Subject.
+    """
+    try:
+        udir_response = http_client.get(f"{UDIR_GREP_URL}/{grep_code}", timeout=UDIR_TIMEOUT)
+    except Exception as e:
+        message = f"UDIR http trouble: {e} for grep_code {grep_code}"
+        logger.warning(message)
+        return None, message
+
+    if udir_response.status_code == 200:
+        udir_subject = udir_response.json()
+        display_name = udir_subject.get('tittel', [{}])[0].get('verdi')
+        short_name = udir_subject.get('kortform', [{}])[0].get('verdi')
+        grep_group_code = udir_subject['opplaeringsfag'][0]['kode'] if udir_subject.get(
+            'opplaeringsfag') and len(udir_subject['opplaeringsfag']) > 0 else None
+        return {
+            "display_name": display_name,
+            "short_name": short_name,
+            "grep_code": grep_code,
+            "grep_group_code": grep_group_code,
+        }, None
+    else:
+        message = f"UDIR http trouble: {udir_response.status_code} for grep_code {grep_code}"
+        logger.warning(message)
+        return None, message
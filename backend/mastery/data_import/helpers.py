@@ -1,9 +1,14 @@
+import hashlib
 import json
 import os
-import requests
 import logging
 import names
 import random
+import threading
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlsplit
+from . import http_client
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
 data_dir = os.path.join(script_dir, "data")
@@ -11,23 +16,59 @@ data_dir = os.path.join(script_dir, "data")
 FEIDE_CLIENT_ID = os.environ.get("FEIDE_CLIENT_ID")
 FEIDE_CLIENT_SECRET = os.environ.get("FEIDE_CLIENT_SECRET")
 TOKEN_URL = os.environ.get("TOKEN_URL")
+# Token lifetime to assume if Feide does not state one
+DEFAULT_TOKEN_EXPIRES_IN = 300
 
 logger = logging.getLogger(__name__)
 
 
-def get_feide_access_token():
+def request_feide_access_token():
+    """Request a client credentials token from Feide. Returns (token, expires_in)"""
     try:
-        response = requests.post(
+        response = http_client.post(
             TOKEN_URL,
             data={"grant_type": "client_credentials"},
             auth=(FEIDE_CLIENT_ID, FEIDE_CLIENT_SECRET),
         )
         response.raise_for_status()
-        return response.json()["access_token"]
+        token_data = response.json()
+        return token_data["access_token"], token_data.get("expires_in", DEFAULT_TOKEN_EXPIRES_IN)
     except Exception as e:
         raise Exception(f"Failed to get Feide access token: {e}")
 
 
+feide_token_cache = http_client.TokenCache(request_feide_access_token)
+
+
+def get_feide_access_token():
+    """Return a Feide client credentials token, reused across jobs until it is about to expire"""
+    return feide_token_cache.get()
+
+
+class HostRateLimiter:
+    """
+    Thread safe limiter spacing out requests to the same host, at most max_per_second requests per host.
+    A max_per_second of 0 (or None) disables limiting.
+    """
+
+    def __init__(self, max_per_second):
+        self.min_interval = 1.0 / max_per_second if max_per_second else 0
+        self._lock = threading.Lock()
+        self._next_slot_by_host = {}
+
+    def wait(self, url):
+        """Block until a request to the host of url may be sent"""
+        if not self.min_interval:
+            return
+        host = urlsplit(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot_by_host.get(host, now))
+            self._next_slot_by_host[host] = slot + self.min_interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
 fake_users_by_feide_id = {}
 
 
@@ -71,73 +112,225 @@ def create_user_item(member, anonymize=False):
     return user_item
 
 
-def does_file_exist(org_number, type):
+# Order of group kinds in groups files
+GROUP_KINDS = ["owners", "schools", "teaching", "basis", "subjects"]
+
+
+def school_data_file(org_number, file_type):
+    """
+    Path of fetched data file for school. Fetched data is stored as NDJSON (one record per line),
+    files fetched before that are JSON. Returns None if neither exists.
+    """
     school_dir = os.path.join(data_dir, org_number)
-    return os.path.exists(os.path.join(school_dir, f"{type}.json"))
+    for extension in ("ndjson", "json"):
+        file_path = os.path.join(school_dir, f"{file_type}.{extension}")
+        if os.path.exists(file_path):
+            return file_path
+    return None
 
 
-def load_school_data(org_number, file_type):
-    """Load and parse JSON data file for school"""
-    file_path = os.path.join(data_dir, org_number, f"{file_type}.json")
+def does_file_exist(org_number, type):
+    return school_data_file(org_number, type) is not None
 
-    if not os.path.exists(file_path):
-        return None
 
-    try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except (json.JSONDecodeError, IOError) as e:
-        logger.error(f"Failed to read {file_type}.json for {org_number}: {e}")
-        return None
+class NdjsonWriter:
+    """
+    Write records to an NDJSON file, one line per record.
+    Records go to a temporary file which replaces file_path only when the with block succeeds,
+    any legacy JSON file next to it is then removed. The checksum of what was written is kept in sha256.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.temp_path = f"{file_path}.tmp"
+        self.count = 0
+        self.sha256 = None
+        self._file = None
+        self._hash = hashlib.sha256()
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(self.file_path), exist_ok=True)
+        self._file = open(self.temp_path, "w", encoding="utf-8")
+        return self
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        self._file.write(line)
+        self._hash.update(line.encode("utf-8"))
+        self.count += 1
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._file.close()
+        if exc_type is not None:
+            os.remove(self.temp_path)
+            return False
+        os.replace(self.temp_path, self.file_path)
+        self.sha256 = self._hash.hexdigest()
+        legacy_path = os.path.splitext(self.file_path)[0] + ".json"
+        if os.path.exists(legacy_path):
+            os.remove(legacy_path)
+        return False
+
+
+def iter_ndjson(file_path):
+    """Yield records from an NDJSON file, one line at a time"""
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_school_groups(org_number):
+    """Yield (kind, item) for fetched groups of school, kind is one of GROUP_KINDS"""
+    file_path = school_data_file(org_number, "groups")
+    if not file_path:
+        return
+    if file_path.endswith(".ndjson"):
+        for record in iter_ndjson(file_path):
+            yield record["kind"], record["item"]
+        return
+    with open(file_path, "r", encoding="utf-8") as f:
+        groups_data = json.load(f)
+    for kind in GROUP_KINDS:
+        for item in groups_data.get(kind, []):
+            yield kind, item
+
+
+def iter_school_memberships(org_number):
+    """Yield (feide_group_id, {"teachers": [...], "students": [...], "other": [...]}) for memberships"""
+    file_path = school_data_file(org_number, "memberships")
+    if not file_path:
+        return
+    if file_path.endswith(".ndjson"):
+        for record in iter_ndjson(file_path):
+            yield record.pop("group_id"), record
+        return
+    with open(file_path, "r", encoding="utf-8") as f:
+        memberships_data = json.load(f)
+    yield from memberships_data.items()
 
 
 def count_fetched_groups(org_number):
     """Count groups from fetched data"""
-    groups_data = load_school_data(org_number, 'groups')
-    if not groups_data:
+    if not does_file_exist(org_number, 'groups'):
+        return None
+    try:
+        return sum(1 for kind, _ in iter_school_groups(org_number) if kind in ("basis", "teaching"))
+    except (json.JSONDecodeError, KeyError, IOError) as e:
+        logger.error(f"Failed to read groups for {org_number}: {e}")
         return None
-
-    basis_count = len(groups_data.get('basis', []))
-    teaching_count = len(groups_data.get('teaching', []))
-    return basis_count + teaching_count
 
 
 def count_fetched_memberships_and_users(org_number):
     """Count unique users and total memberships from fetched data"""
-    memberships_data = load_school_data(org_number, 'memberships')
-    if memberships_data is None:
+    if not does_file_exist(org_number, 'memberships'):
         return None, None
 
-    if not memberships_data:
-        return 0, 0
-
     unique_users = set()
     total_memberships = 0
 
-    for group_data in memberships_data.values():
-        if not isinstance(group_data, dict):
-            continue
+    try:
+        for _, group_data in iter_school_memberships(org_number):
+            if not isinstance(group_data, dict):
+                continue
 
-        # Count all members (teachers + students + other)
-        for member_list in [
-                group_data.get('teachers', []),
-                group_data.get('students', []),
-                group_data.get('other', [])]:
-            for member in member_list:
-                if isinstance(member, dict) and 'feide_id' in member:
-                    unique_users.add(member['feide_id'])
-                    total_memberships += 1
+            # Count all members (teachers + students + other)
+            for member_list in [
+                    group_data.get('teachers', []),
+                    group_data.get('students', []),
+                    group_data.get('other', [])]:
+                for member in member_list:
+                    if isinstance(member, dict) and 'feide_id' in member:
+                        unique_users.add(member['feide_id'])
+                        total_memberships += 1
+    except (json.JSONDecodeError, KeyError, IOError) as e:
+        logger.error(f"Failed to read memberships for {org_number}: {e}")
+        return None, None
 
     return len(unique_users), total_memberships
 
 
-def get_school_fetched_stats(org_number):
-    """Get all fetched statistics for a school"""
-    groups_count = count_fetched_groups(org_number)
+def stats_file_path(data_file_path):
+    """Path of the stats sidecar for a fetched data file, e.g. memberships.stats.json"""
+    return os.path.splitext(data_file_path)[0] + ".stats.json"
+
+
+def file_sha256(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def write_fetch_stats(data_file_path, counts, sha256=None, fetched_at=None):
+    """
+    Write the stats sidecar for a fetched data file: counts, checksum and fetch time.
+    Fetch jobs call this right after writing the data file, the sidecar is tied to the data file by its mtime.
+    """
+    stats = {
+        "file": os.path.basename(data_file_path),
+        "mtime_ns": os.stat(data_file_path).st_mtime_ns,
+        "sha256": sha256 or file_sha256(data_file_path),
+        "fetched_at": fetched_at or datetime.now(timezone.utc).isoformat(),
+        "counts": counts,
+    }
+    sidecar_path = stats_file_path(data_file_path)
+    with open(f"{sidecar_path}.tmp", "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=2)
+    os.replace(f"{sidecar_path}.tmp", sidecar_path)
+    return stats
+
+
+def count_fetched(org_number, file_type):
+    """Count fetched groups or memberships by reading the data file. Returns None if it can not be read"""
+    if file_type == "groups":
+        groups_count = count_fetched_groups(org_number)
+        return None if groups_count is None else {"groups_count": groups_count}
     users_count, memberships_count = count_fetched_memberships_and_users(org_number)
+    if users_count is None:
+        return None
+    return {"users_count": users_count, "memberships_count": memberships_count}
+
+
+def read_fetch_stats(org_number, file_type):
+    """
+    Read counts for fetched groups or memberships from the stats sidecar.
+    If the sidecar is missing or the data file changed since, counts are recomputed and cached in the sidecar.
+    Returns None if there is no readable data file.
+    """
+    data_file_path = school_data_file(org_number, file_type)
+    if not data_file_path:
+        return None
+
+    try:
+        with open(stats_file_path(data_file_path), "r", encoding="utf-8") as f:
+            stats = json.load(f)
+    except (json.JSONDecodeError, IOError):
+        stats = None
+    mtime_ns = os.stat(data_file_path).st_mtime_ns
+    if stats and stats.get("file") == os.path.basename(data_file_path) and stats.get("mtime_ns") == mtime_ns:
+        return stats["counts"]
+
+    logger.debug("Recomputing %s stats for %s", file_type, org_number)
+    counts = count_fetched(org_number, file_type)
+    if counts is None:
+        return None
+    fetched_at = datetime.fromtimestamp(mtime_ns / 1e9, timezone.utc).isoformat()
+    try:
+        write_fetch_stats(data_file_path, counts, fetched_at=fetched_at)
+    except IOError as e:
+        logger.error(f"Failed to write {file_type} stats for {org_number}: {e}")
+    return counts
+
+
+def get_school_fetched_stats(org_number):
+    """Get all fetched statistics for a school, from the stats sidecars written by the fetch jobs"""
+    groups_stats = read_fetch_stats(org_number, "groups") or {}
+    memberships_stats = read_fetch_stats(org_number, "memberships") or {}
 
     return {
-        "groups_count": groups_count,
-        "users_count": users_count,
-        "memberships_count": memberships_count
+        "groups_count": groups_stats.get("groups_count"),
+        "users_count": memberships_stats.get("users_count"),
+        "memberships_count": memberships_stats.get("memberships_count"),
     }
@@ -0,0 +1,102 @@
+import os
+import time
+import threading
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+# Outbound HTTP configuration, shared by all Feide and UDIR calls
+HTTP_CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', '5'))
+HTTP_READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', '30'))
+HTTP_RETRIES = int(os.environ.get('HTTP_RETRIES', '3'))
+HTTP_BACKOFF_FACTOR = float(os.environ.get('HTTP_BACKOFF_FACTOR', '0.5'))
+HTTP_POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', '16'))
+
+# Responses worth retrying, the rest are returned to the caller as is
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def create_session(retries=None, backoff_factor=None, pool_size=None):
+    """Create a session with keep-alive connection pools, retrying idempotent requests with backoff"""
+    retry = Retry(
+        total=HTTP_RETRIES if retries is None else retries,
+        backoff_factor=HTTP_BACKOFF_FACTOR if backoff_factor is None else backoff_factor,
+        status_forcelist=RETRY_STATUS_CODES,
+        # Hand the last response back after retries are exhausted, callers check status_code themselves
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        max_retries=retry,
+        pool_connections=HTTP_POOL_SIZE if pool_size is None else pool_size,
+        pool_maxsize=HTTP_POOL_SIZE if pool_size is None else pool_size,
+    )
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session():
+    """Return the process wide session. Sessions are safe to share between threads for plain requests"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = create_session()
+    return _session
+
+
+def close_session():
+    """Close pooled connections, a new session is created on next use"""
+    global _session
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+
+def get(url, **kwargs):
+    """Like requests.get, over pooled connections and with default timeouts"""
+    kwargs.setdefault("timeout", (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+    return get_session().get(url, **kwargs)
+
+
+def post(url, **kwargs):
+    """Like requests.post, over pooled connections and with default timeouts. POST is not retried"""
+    kwargs.setdefault("timeout", (HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT))
+    return get_session().post(url, **kwargs)
+
+
+class TokenCache:
+    """
+    Thread safe cache for one access token.
+    fetch_token must return (token, expires_in_seconds).
+    The token is reused until leeway seconds before it expires.
+    """
+
+    def __init__(self, fetch_token, leeway=60):
+        self.fetch_token = fetch_token
+        self.leeway = leeway
+        self._token = None
+        self._expires_at = 0
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._token is None or time.monotonic() >= self._expires_at - self.leeway:
+                token, expires_in = self.fetch_token()
+                self._token = token
+                self._expires_at = time.monotonic() + expires_in
+                logger.debug("Fetched new access token, expires in %d seconds", expires_in)
+            return self._token
+
+    def clear(self):
+        with self._lock:
+            self._token = None
+            self._expires_at = 0
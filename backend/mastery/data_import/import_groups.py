@@ -1,22 +1,18 @@
-import os
-import json
+from django.db import transaction
 from django.utils import timezone
-import requests
 from mastery import models
+from . import grep_cache
+from .helpers import does_file_exist, iter_school_groups
 import logging
 
-UDIR_GREP_URL = os.environ.get('UDIR_GREP_URL')
+# Number of groups read from the groups file at a time, and written per round trip in bulk mode
+BULK_BATCH_SIZE = 500
 
 logger = logging.getLogger(__name__)
 
 
-# Get data directory path
-script_dir = os.path.dirname(os.path.abspath(__file__))
-data_dir = os.path.join(script_dir, "data")
-
-
-def import_groups_from_file(org_number):
-    """Import groups for ONE school from data_import/data/schools/<org>/groups.json"""
+def import_groups_from_file(org_number, bulk=True):
+    """Import groups for ONE school from data_import/data/schools/<org>/groups.ndjson (or .json)"""
     logger.debug("Starting group import for organization: %s", org_number)
 
     school = models.School.objects.filter(org_number=org_number).first()
@@ -24,142 +20,285 @@ def import_groups_from_file(org_number):
         logger.error("School with org number %s not found in database.", org_number)
         raise Exception(f"School with org number {org_number} not found in database.")
 
-    groups_file = os.path.join(data_dir, org_number, "groups.json")
-    if not os.path.exists(groups_file):
-        logger.error("Groups file not found for school %s at path: %s", org_number, groups_file)
+    if not does_file_exist(org_number, "groups"):
+        logger.error("Groups file not found for school %s", org_number)
         raise Exception(
             f"Groups file not found for school {org_number}. Fetch groups first."
         )
 
-    with open(groups_file, "r", encoding="utf-8") as file:
-        groups_data = json.load(file)
-
-    yield from import_groups(groups_data)
+    # Groups are read from the file as they are imported
+    groups_data = iter_school_groups(org_number)
 
+    try:
+        if bulk:
+            yield from import_groups_in_bulk(groups_data)
+        else:
+            yield from import_groups(groups_data)
+    finally:
+        # Also when the import fails or is abandoned, batches written before that are committed.
+        # Goals of groups are undeleted with their group
+        models.VersionStamp.bump(["group", "subject", "goal"], [school.id])
 
-def import_groups(groups_data):
 
-    # Progress reporting variables
-    basis_group_created = 0
-    basis_group_maintained = 0
-    teaching_group_created = 0
-    teaching_group_maintained = 0
-    subjects_created = 0
-    subject_maintained = 0
-    subjects_failed = 0
+def import_groups(groups_data, batch_size=BULK_BATCH_SIZE):
+    """
+    Import groups one at a time. groups_data is either the {kind: [group, ...]} layout or (kind, group)
+    pairs as helpers.iter_school_groups yields them, which are read batch_size groups at a time.
+    """
+    counts = {
+        "basis_group_created": 0,
+        "basis_group_maintained": 0,
+        "teaching_group_created": 0,
+        "teaching_group_maintained": 0,
+        "subjects_created": 0,
+        "subject_maintained": 0,
+        "subjects_failed": 0,
+    }
     errors = []
+    subject_fields_by_grep_code = {}
+    seen_grep_codes = set()
+    failed_grep_codes = set()
+    index_by_type = {"basis": 0, "teaching": 0}
 
-    basis_groups = groups_data.get("basis", [])
-    teaching_groups = groups_data.get("teaching", [])
+    for group_type, batch in _iter_group_batches(groups_data, batch_size):
+        # Resolve grep codes of subjects we do not have yet once per batch, so the loop below does not wait
+        # on UDIR
+        grep_codes = {_grep_code_of(group_data) for group_data in batch} - {None} - seen_grep_codes
+        seen_grep_codes |= grep_codes
+        existing_grep_codes = set(
+            models.Subject.objects.filter(grep_code__in=grep_codes).values_list("grep_code", flat=True))
+        resolved, grep_errors = grep_cache.resolve_grep_codes(grep_codes - existing_grep_codes)
+        subject_fields_by_grep_code.update(resolved)
+        # Codes which could not be resolved are reported once here, not again for each of their groups
+        failed_grep_codes |= grep_codes - existing_grep_codes - resolved.keys()
+        counts["subjects_failed"] += len(grep_errors)
+        errors.extend({"error": "ensure-subject-failed", "message": error} for error in grep_errors)
 
-    # Handle basis groups
-    for index, group_data in enumerate(basis_groups):
-        _, created = ensure_group_exists(group_data, "basis", None)
-        if created:
-            basis_group_created += 1
-        else:
-            basis_group_maintained += 1
-
-        if index % 10 == 0:
-            yield {
-                "result": {
-                    "entity": "group",
-                    "action": "import",
-                    "errors": errors,
-                    "changes": {
-                        "basis_group": {
-                            "created": basis_group_created,
-                            "maintained": basis_group_maintained,
-                        },
-                        "teaching_group": {
-                            "created": teaching_group_created,
-                            "maintained": teaching_group_maintained,
-                        },
-                        "subject": {
-                            "created": subjects_created,
-                            "maintained": subject_maintained,
-                            "failed": subjects_failed,
-                        },
-                    },
-                },
-                "is_done": False,
-            }
-
-    # Handle teaching groups
-    for index, group_data in enumerate(teaching_groups):
-        subject = None
-        if "grep" in group_data and "code" in group_data["grep"]:
-            grep_code = group_data["grep"]["code"]
-            if grep_code:
-                subject, subject_was_created, subject_error = ensure_subject_exists(grep_code)
+        for group_data in batch:
+            subject = None
+            grep_code = _grep_code_of(group_data) if group_type == "teaching" else None
+            if grep_code and grep_code not in failed_grep_codes:
+                subject, subject_was_created, subject_error = ensure_subject_exists(
+                    grep_code, subject_fields_by_grep_code.get(grep_code))
                 if subject_error:
-                    subjects_failed += 1
+                    counts["subjects_failed"] += 1
                     errors.append({"error": "ensure-subject-failed", "message": subject_error})
                 elif subject_was_created:
-                    subjects_created += 1
+                    counts["subjects_created"] += 1
                 else:
-                    subject_maintained += 1
+                    counts["subject_maintained"] += 1
 
-        _, created = ensure_group_exists(group_data, "teaching", subject)
-        if created:
-            teaching_group_created += 1
-        else:
-            teaching_group_maintained += 1
-
-        if index % 10 == 0:
-            yield {
-                "result": {
-                    "entity": "group",
-                    "action": "import",
-                    "errors": errors,
-                    "changes": {
-                        "basis_group": {
-                            "created": basis_group_created,
-                            "maintained": basis_group_maintained,
-                        },
-                        "teaching_group": {
-                            "created": teaching_group_created,
-                            "maintained": teaching_group_maintained,
-                        },
-                        "subject": {
-                            "created": subjects_created,
-                            "maintained": subject_maintained,
-                            "failed": subjects_failed,
-                        },
-                    },
-                },
-                "is_done": False,
-            }
+            group, created = ensure_group_exists(group_data, group_type, subject)
+            if not group:
+                errors.append(_missing_school_error(group_data["id"]))
+            elif created:
+                counts[f"{group_type}_group_created"] += 1
+            else:
+                counts[f"{group_type}_group_maintained"] += 1
+
+            if index_by_type[group_type] % 10 == 0:
+                yield _group_import_progress(counts, errors, is_done=False)
+            index_by_type[group_type] += 1
+
+    yield _group_import_progress(counts, errors, is_done=True)
+
+
+def import_groups_in_bulk(groups_data, batch_size=BULK_BATCH_SIZE):
+    """
+    Import groups from provided data structure, like import_groups, but set-based.
+    Groups are read and written in batches of batch_size with bulk_create/bulk_update, each batch in a
+    single transaction. Subjects are resolved once per unique grep code, for the codes a batch adds.
+    Yields the same progress dicts as import_groups, once per batch.
+    """
+    counts = {
+        "basis_group_created": 0,
+        "basis_group_maintained": 0,
+        "teaching_group_created": 0,
+        "teaching_group_maintained": 0,
+        "subjects_created": 0,
+        "subject_maintained": 0,
+        "subjects_failed": 0,
+    }
+    errors = []
+    # Subjects and parent schools seen in earlier batches, None if not found
+    subjects_by_grep_code = {}
+    schools_by_feide_id = {}
+
+    for group_type, batch in _iter_group_batches(groups_data, batch_size):
+        if group_type == "teaching":
+            grep_codes = {_grep_code_of(group_data) for group_data in batch} - {None}
+            grep_codes -= subjects_by_grep_code.keys()
+            if grep_codes:
+                subjects_by_grep_code.update(dict.fromkeys(grep_codes))
+                subjects_by_grep_code.update(ensure_subjects_exist(grep_codes, counts, errors))
+
+        parent_feide_ids = {group_data.get("parent") for group_data in batch} - schools_by_feide_id.keys()
+        if parent_feide_ids:
+            schools_by_feide_id.update(dict.fromkeys(parent_feide_ids))
+            schools_by_feide_id.update(
+                (school.feide_id, school)
+                for school in models.School.objects.filter(feide_id__in=parent_feide_ids))
+
+        _import_group_batch(batch, group_type, subjects_by_grep_code, schools_by_feide_id, counts, errors)
+        yield _group_import_progress(counts, errors, is_done=False)
+
+    yield _group_import_progress(counts, errors, is_done=True)
+
+
+def _iter_group_batches(groups_data, batch_size):
+    """
+    Yield (group_type, [group, ...]) for batches of up to batch_size basis or teaching groups in groups_data.
+    A batch is yielded as soon as it is full, the last batches of each type at the end.
+    """
+    pairs = groups_data
+    if isinstance(groups_data, dict):
+        pairs = ((kind, group_data)
+                 for kind in ("basis", "teaching") for group_data in groups_data.get(kind, []))
+    batches = {"basis": [], "teaching": []}
+    for kind, group_data in pairs:
+        if kind not in batches:
+            continue
+        batches[kind].append(group_data)
+        if len(batches[kind]) == batch_size:
+            yield kind, batches[kind]
+            batches[kind] = []
+    for kind, batch in batches.items():
+        if batch:
+            yield kind, batch
 
-    yield {
+
+def _grep_code_of(group_data):
+    """Return the grep code of a teaching group, or None"""
+    if "grep" in group_data and group_data["grep"] and "code" in group_data["grep"]:
+        return group_data["grep"]["code"] or None
+    return None
+
+
+def _group_import_progress(counts, errors, is_done):
+    return {
         "result": {
             "entity": "group",
             "action": "import",
             "errors": errors,
             "changes": {
                 "basis_group": {
-                    "created": basis_group_created,
-                    "maintained": basis_group_maintained,
+                    "created": counts["basis_group_created"],
+                    "maintained": counts["basis_group_maintained"],
                 },
                 "teaching_group": {
-                    "created": teaching_group_created,
-                    "maintained": teaching_group_maintained,
+                    "created": counts["teaching_group_created"],
+                    "maintained": counts["teaching_group_maintained"],
                 },
                 "subject": {
-                    "created": subjects_created,
-                    "maintained": subject_maintained,
-                    "failed": subjects_failed,
+                    "created": counts["subjects_created"],
+                    "maintained": counts["subject_maintained"],
+                    "failed": counts["subjects_failed"],
                 },
             },
         },
-        "is_done": True,
+        "is_done": is_done,
     }
 
 
+def ensure_subjects_exist(grep_codes, counts, errors):
+    """
+    Ensure a subject exists for each of the (unique) grep codes, resolving unknown ones via the grep cache.
+    Existing subjects are maintained with a single update. Returns {grep_code: subject}.
+    """
+    now = timezone.now()
+    subjects_by_grep_code = {
+        subject.grep_code: subject for subject in models.Subject.objects.filter(grep_code__in=grep_codes)}
+    if subjects_by_grep_code:
+        models.Subject.objects.filter(
+            id__in=[subject.id for subject in subjects_by_grep_code.values()]).update(maintained_at=now)
+        counts["subject_maintained"] += len(subjects_by_grep_code)
+
+    subject_fields_by_grep_code, grep_errors = grep_cache.resolve_grep_codes(
+        grep_codes - subjects_by_grep_code.keys())
+    counts["subjects_failed"] += len(grep_errors)
+    errors.extend({"error": "ensure-subject-failed", "message": error} for error in grep_errors)
+
+    new_subjects = []
+    for grep_code, subject_fields in sorted(subject_fields_by_grep_code.items()):
+        subject = models.Subject(**subject_fields, maintained_at=now)
+        subjects_by_grep_code[grep_code] = subject
+        new_subjects.append(subject)
+
+    models.Subject.objects.bulk_create(new_subjects)
+    counts["subjects_created"] += len(new_subjects)
+    for subject in new_subjects:
+        logger.debug("Created new subject: %s (%s)", subject.grep_code, subject.display_name)
+    return subjects_by_grep_code
+
+
+def _import_group_batch(batch, group_type, subjects_by_grep_code, schools_by_feide_id, counts, errors):
+    """Create or maintain one batch of groups of group_type"""
+    now = timezone.now()
+    existing_groups_by_feide_id = {
+        group.feide_id: group
+        for group in models.Group.objects.filter(feide_id__in=[group_data["id"] for group_data in batch])}
+
+    groups_to_create = {}
+    groups_to_update = {}
+    undeleted_group_ids = []
+    for group_data in batch:
+        feide_id = group_data["id"]
+        subject = subjects_by_grep_code.get(_grep_code_of(group_data)) if group_type == "teaching" else None
+        group = existing_groups_by_feide_id.get(feide_id) or groups_to_create.get(feide_id)
+        if group:
+            # Do not touch the is_enabled field on existing groups
+            # Do not touch the type field on existing groups
+            # Unset deleted_at (in case it was set)
+            group.display_name = group_data["displayName"]
+            group.subject = subject
+            group.valid_from = group_data.get("notBefore")
+            group.valid_to = group_data.get("notAfter")
+            group.maintained_at = now
+            group.updated_at = now
+            if group.deleted_at:
+                group.deleted_at = None
+                undeleted_group_ids.append(group.id)
+            if feide_id not in groups_to_create:
+                groups_to_update[feide_id] = group
+            counts[f"{group_type}_group_maintained"] += 1
+            continue
+
+        school = schools_by_feide_id.get(group_data.get("parent"))
+        if not school:
+            logger.warning("Parent school not found for group: %s", feide_id)
+            errors.append(_missing_school_error(feide_id))
+            continue
+
+        groups_to_create[feide_id] = models.Group(
+            display_name=group_data["displayName"],
+            type=group_type,
+            school=school,
+            subject=subject,
+            feide_id=feide_id,
+            valid_from=group_data.get("notBefore"),
+            valid_to=group_data.get("notAfter"),
+            maintained_at=now,
+        )
+        counts[f"{group_type}_group_created"] += 1
+
+    with transaction.atomic():
+        models.Group.objects.bulk_create(groups_to_create.values())
+        models.Group.objects.bulk_update(
+            groups_to_update.values(),
+            ["display_name", "subject", "valid_from", "valid_to", "maintained_at", "updated_at",
+             "deleted_at"])
+        if undeleted_group_ids:
+            # Cascade unset any soft-delete timestamp on related goals
+            models.Goal.objects.filter(group_id__in=undeleted_group_ids).update(
+                maintained_at=now, deleted_at=None)
+
+    logger.debug("Imported batch of %d %s groups (%d created)", len(batch), group_type, len(groups_to_create))
+
+
 def ensure_group_exists(group_data, group_type, subject=None):
     """
     Ensure a group exists, maintaining it if it already exists or creating it if not.
-    Returns (group, created_bool)
+    Returns (group, created_bool), group is None if a new group's parent school is unknown
     """
     feide_id = group_data["id"]
     now = timezone.now()
@@ -185,7 +324,10 @@ def ensure_group_exists(group_data, group_type, subject=None):
         return existing_group, False
 
     # For a new group, ensure the parent school exists
-    school = models.School.objects.filter(feide_id__exact=group_data["parent"]).first()
+    school = models.School.objects.filter(feide_id__exact=group_data.get("parent")).first()
+    if not school:
+        logger.warning("Parent school not found for group: %s", feide_id)
+        return None, False
 
     new_group = models.Group.objects.create(
         display_name=group_data["displayName"],
@@ -201,10 +343,16 @@ def ensure_group_exists(group_data, group_type, subject=None):
     return new_group, True
 
 
-def ensure_subject_exists(grep_code):
+def _missing_school_error(feide_id):
+    return {"error": "missing-school", "group_id": feide_id,
+            "message": f"Parent school not found for group: {feide_id}"}
+
+
+def ensure_subject_exists(grep_code, subject_fields=None):
     """
-    Ensure a subject exists in the database, fetching from UDIR if necessary.
-    Returns (subject, created_bool)
+    Ensure a subject exists in the database, looking up the grep code in the grep cache if necessary.
+    subject_fields, from grep_cache.resolve_grep_codes, saves the lookup.
+    Returns (subject, created_bool, error_message)
     """
     # Check if subject already exists
     existing_subject = models.Subject.objects.filter(grep_code__exact=grep_code).first()
@@ -213,25 +361,11 @@ def ensure_subject_exists(grep_code):
         existing_subject.save(update_fields=['maintained_at'])
         return existing_subject, False, None
 
-    udir_response = requests.get(f"{UDIR_GREP_URL}/{grep_code}")
-
-    if udir_response.status_code == 200:
-        udir_subject = udir_response.json()
-        display_name = udir_subject.get('tittel', [{}])[0].get('verdi')
-        short_name = udir_subject.get('kortform', [{}])[0].get('verdi')
-        grep_group_code = udir_subject['opplaeringsfag'][0]['kode'] if udir_subject.get(
-            'opplaeringsfag') and len(udir_subject['opplaeringsfag']) > 0 else None
-
-        subject = models.Subject.objects.create(
-            display_name=display_name,
-            short_name=short_name,
-            grep_code=grep_code,
-            grep_group_code=grep_group_code,
-            maintained_at=timezone.now(),
-        )
-        logger.debug("Created new subject: %s (%s)", grep_code, display_name)
-        return subject, True, None
-    else:
-        message = f"UDIR http trouble: {udir_response.status_code} for grep_code {grep_code}"
-        logger.warning(message)
-        return None, False, message
+    if subject_fields is None:
+        subject_fields, error = grep_cache.resolve_grep_code(grep_code)
+        if error:
+            return None, False, error
+
+    subject = models.Subject.objects.create(**subject_fields, maintained_at=timezone.now())
+    logger.debug("Created new subject: %s (%s)", grep_code, subject.display_name)
+    return subject, True, None
@@ -84,6 +84,7 @@ def import_school_from_feide(org_number):
         },
     )
     ensure_default_mastery_schema_exists(school)
+    models.VersionStamp.bump(["school", "masteryschema"], [school.id])
     return {
         "status": "created" if created else "updated",
         "org_number": school.org_number,
@@ -1,19 +1,19 @@
-import os
-import json
+from django.db import transaction
 from django.utils import timezone
-from .helpers import does_file_exist
+from .helpers import does_file_exist, iter_school_memberships
 from mastery import models
+from mastery.access_policies.scope import invalidate_principal_scopes
+from mastery.authentication import invalidate_cached_users
 import logging
 
 logger = logging.getLogger(__name__)
 
-# Get data directory path
-script_dir = os.path.dirname(os.path.abspath(__file__))
-data_dir = os.path.join(script_dir, "data")
+# Number of memberships written per round trip in bulk mode
+BULK_BATCH_SIZE = 1000
 
 
-def import_memberships_from_file(org_number):
-    """Import memberships for ONE school from data_import/data/schools/<org>/memeberships.json"""
+def import_memberships_from_file(org_number, bulk=True):
+    """Import memberships for ONE school from data_import/data/schools/<org>/memberships.ndjson (or .json)"""
     logger.debug("Starting membership import for organization: %s", org_number)
 
     # read memberships file
@@ -21,14 +21,26 @@ def import_memberships_from_file(org_number):
         logger.error("Memberships file not found for school %s", org_number)
         raise Exception(f"Memberships file not found for school {org_number}")
 
-    memberships_file = os.path.join(data_dir, org_number, "memberships.json")
-    with open(memberships_file, "r", encoding="utf-8") as file:
-        memberships_data = json.load(file)
-    yield from import_memberships(memberships_data)
+    # Groups are read one at a time from the file
+    memberships_data = iter_school_memberships(org_number)
+    try:
+        if bulk:
+            yield from import_memberships_in_bulk(memberships_data)
+        else:
+            yield from import_memberships(memberships_data)
+    finally:
+        # Also when the import fails or is abandoned, batches written before that are committed.
+        # Goals and observations of students are undeleted with the student
+        school = models.School.objects.filter(org_number=org_number).first()
+        models.VersionStamp.bump(
+            ["user", "usergroup", "goal", "observation"], [school.id if school else None])
 
 
 def import_memberships(memberships_data):
-    """Import memberships from provided data structure"""
+    """
+    Import memberships from provided data structure,
+    either a {feide_group_id: memberships} dict or an iterable of (feide_group_id, memberships) pairs
+    """
     teacher_role, student_role, _, _, _ = ensure_roles_exist()
 
     # Progress reporting variables
@@ -41,7 +53,7 @@ def import_memberships(memberships_data):
     errors = []
     processed_users = set()
 
-    for feide_group_id, feide_group_memberships in memberships_data.items():
+    for feide_group_id, feide_group_memberships in _membership_pairs(memberships_data):
         group = models.Group.objects.filter(feide_id__exact=feide_group_id).first()
         if not group:
             logger.warning("Expected group not found: %s", feide_group_id)
@@ -114,6 +126,194 @@ def import_memberships(memberships_data):
     }
 
 
+def import_memberships_in_bulk(memberships_data, batch_size=BULK_BATCH_SIZE):
+    """
+    Import memberships from provided data structure, like import_memberships, but set-based.
+    Members are processed in batches of batch_size: each batch looks up its users, groups and memberships
+    with one query each, and writes changes with bulk_create/bulk_update in a single transaction.
+    Yields the same progress dicts as import_memberships, once per batch.
+    """
+    teacher_role, student_role, _, _, _ = ensure_roles_exist()
+
+    counts = {
+        "users_created": 0,
+        "users_maintained": 0,
+        "memberships_created": 0,
+        "memberships_maintained": 0,
+    }
+    errors = []
+    users_by_feide_id = {}
+    groups_by_feide_id = {}
+    processed_users = set()
+
+    batch = []
+    for feide_group_id, feide_group_memberships in _membership_pairs(memberships_data):
+        for role_key, role_obj in [("teachers", teacher_role), ("students", student_role)]:
+            for member_data in feide_group_memberships.get(role_key, []):
+                batch.append((feide_group_id, role_obj, member_data))
+                if len(batch) >= batch_size:
+                    _import_membership_batch(
+                        batch, counts, errors, users_by_feide_id, groups_by_feide_id, processed_users)
+                    batch = []
+                    yield _membership_import_progress(counts, errors, is_done=False)
+
+        if not feide_group_memberships.get("teachers") and not feide_group_memberships.get("students"):
+            # Groups without members are still expected to exist
+            _find_groups([feide_group_id], groups_by_feide_id, errors)
+
+    if batch:
+        _import_membership_batch(
+            batch, counts, errors, users_by_feide_id, groups_by_feide_id, processed_users)
+
+    yield _membership_import_progress(counts, errors, is_done=True)
+
+
+def _membership_pairs(memberships_data):
+    """Accept memberships as dict or as (feide_group_id, memberships) pairs, such as read from file"""
+    if isinstance(memberships_data, dict):
+        return memberships_data.items()
+    return memberships_data
+
+
+def _membership_import_progress(counts, errors, is_done):
+    return {
+        "result": {
+            "entity": "user",
+            "action": "import",
+            "changes": {
+                "user": {
+                    "created": counts["users_created"],
+                    "maintained": counts["users_maintained"],
+                },
+                "membership": {
+                    "created": counts["memberships_created"],
+                    "maintained": counts["memberships_maintained"],
+                },
+            },
+            "errors": errors,
+        },
+        "is_done": is_done,
+    }
+
+
+def _find_groups(feide_group_ids, groups_by_feide_id, errors):
+    """Look up groups not seen before with a single query, registering missing ones as errors"""
+    unseen_ids = {feide_id for feide_id in feide_group_ids if feide_id not in groups_by_feide_id}
+    if not unseen_ids:
+        return
+    for group in models.Group.objects.filter(feide_id__in=unseen_ids):
+        groups_by_feide_id[group.feide_id] = group
+    # Remember missing groups as None, so they are reported once
+    for feide_id in sorted(unseen_ids - groups_by_feide_id.keys()):
+        groups_by_feide_id[feide_id] = None
+        logger.warning("Expected group not found: %s", feide_id)
+        errors.append({"error": "missing-group", "group_id": feide_id,
+                       "message": f"Expected group not found: {feide_id}"})
+
+
+def _import_membership_batch(batch, counts, errors, users_by_feide_id, groups_by_feide_id, processed_users):
+    """Upsert users and memberships for one batch of (feide_group_id, role, member_data) tuples"""
+    now = timezone.now()
+    _find_groups([feide_group_id for feide_group_id, _, _ in batch], groups_by_feide_id, errors)
+    batch = [(groups_by_feide_id[feide_group_id], role, member_data)
+             for feide_group_id, role, member_data in batch if groups_by_feide_id[feide_group_id]]
+    if not batch:
+        return
+
+    # Users: users_by_feide_id remembers users from earlier batches, look up the rest in one query
+    unseen_feide_ids = {member_data["feide_id"] for _, _, member_data in batch} - users_by_feide_id.keys()
+    if unseen_feide_ids:
+        for user in models.User.objects.filter(feide_id__in=unseen_feide_ids):
+            users_by_feide_id[user.feide_id] = user
+
+    users_to_create = {}
+    users_to_update = {}
+    undeleted_user_ids = set()
+    for _, _, member_data in batch:
+        feide_id = member_data["feide_id"]
+        # Users can have multiple memberships, but only count user creation/maintain once per unique user
+        if feide_id in processed_users:
+            continue
+        processed_users.add(feide_id)
+        user = users_by_feide_id.get(feide_id)
+        if user:
+            user.name = member_data.get("name", user.name)
+            user.email = member_data.get("email", user.email)
+            user.maintained_at = now
+            user.updated_at = now
+            if user.deleted_at:
+                user.deleted_at = None
+                undeleted_user_ids.add(user.id)
+            users_to_update[user.id] = user
+            counts["users_maintained"] += 1
+        else:
+            user = models.User(
+                feide_id=feide_id,
+                name=member_data.get("name", None),
+                email=member_data.get("email", None),
+                maintained_at=now,
+            )
+            users_by_feide_id[feide_id] = user
+            users_to_create[feide_id] = user
+            counts["users_created"] += 1
+
+    # Memberships: look up existing memberships for the users and groups in this batch in one query
+    group_ids = {group.id for group, _, _ in batch}
+    user_ids = {users_by_feide_id[member_data["feide_id"]].id for _, _, member_data in batch}
+    memberships_by_key = {
+        (membership.user_id, membership.group_id, membership.role_id): membership
+        for membership in models.UserGroup.objects.filter(group_id__in=group_ids, user_id__in=user_ids)
+    }
+
+    memberships_to_create = []
+    memberships_to_update = {}
+    # Users who gained or got back a membership, their cached access scopes are stale
+    changed_user_ids = set()
+    for group, role, member_data in batch:
+        user = users_by_feide_id[member_data["feide_id"]]
+        key = (user.id, group.id, role.id)
+        membership = memberships_by_key.get(key)
+        if membership:
+            if membership.deleted_at:
+                changed_user_ids.add(user.id)
+            membership.maintained_at = now
+            membership.deleted_at = None  # Unset, in case it was set
+            memberships_to_update[membership.id] = membership
+            counts["memberships_maintained"] += 1
+        else:
+            membership = models.UserGroup(user=user, group=group, role=role, maintained_at=now)
+            memberships_by_key[key] = membership
+            memberships_to_create.append(membership)
+            changed_user_ids.add(user.id)
+            counts["memberships_created"] += 1
+
+    with transaction.atomic():
+        models.User.objects.bulk_create(users_to_create.values())
+        models.User.objects.bulk_update(
+            users_to_update.values(), ["name", "email", "maintained_at", "updated_at", "deleted_at"])
+        if undeleted_user_ids:
+            # Cascade un-delete related objects
+            undelete_observations(models.Observation.objects.filter(student_id__in=undeleted_user_ids), now)
+            models.Goal.objects.filter(student_id__in=undeleted_user_ids).update(
+                deleted_at=None, maintained_at=now)
+        models.UserGroup.objects.bulk_create(memberships_to_create)
+        models.UserGroup.objects.bulk_update(memberships_to_update.values(), ["maintained_at", "deleted_at"])
+    invalidate_principal_scopes(user_ids=changed_user_ids)
+    # bulk_update() sends no model signals
+    invalidate_cached_users(users_to_update.keys())
+
+    logger.debug("Imported batch of %d memberships (%d users created, %d memberships created)",
+                 len(batch), len(users_to_create), len(memberships_to_create))
+
+
+def undelete_observations(observations, now):
+    """Un-delete observations, and refresh the summaries of the restored ones. Call this in a transaction"""
+    summary_keys = set(observations.filter(deleted_at__isnull=False).values_list("student_id", "goal_id"))
+    observations.update(deleted_at=None, maintained_at=now)
+    # update() sends no model signals
+    models.ObservationSummary.refresh(summary_keys)
+
+
 def ensure_roles_exist():
     """Ensure necessary roles exist"""
     role_names = ["teacher", "student", "admin", "staff", "inspector"]
@@ -140,14 +340,14 @@ def ensure_user_exists(user_data):
         user.name = user_data.get("name", user.name)
         user.email = user_data.get("email", user.email)
         user.maintained_at = now
-        if user.deleted_at:
-            user.deleted_at = None
-            # Cascade un-delete related objects
-            models.Observation.objects.filter(student=user).update(
-                deleted_at=None, maintained_at=now)
-            models.Goal.objects.filter(student=user).update(deleted_at=None, maintained_at=now)
-        logger.debug("User maintained: %s", user.email)
-        user.save()
+        with transaction.atomic():
+            if user.deleted_at:
+                user.deleted_at = None
+                # Cascade un-delete related objects
+                undelete_observations(models.Observation.objects.filter(student=user), now)
+                models.Goal.objects.filter(student=user).update(deleted_at=None, maintained_at=now)
+            logger.debug("User maintained: %s", user.email)
+            user.save()
         return user, False
 
     user = models.User.objects.create(
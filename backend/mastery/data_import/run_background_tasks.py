@@ -14,6 +14,7 @@ from .import_school import school_update
 from .import_groups import import_groups_from_file
 from .import_users import import_memberships_from_file
 from .cleaner_bot import update_data_integrity
+from mastery.status_suggestions import suggest_statuses_for_school
 
 logger = logging.getLogger(__name__)
 
@@ -109,6 +110,8 @@ def do_work(task):
     job_params = task.job_params or {}
     org_number = job_params.get("org_number")
     anonymize = job_params.get("anonymize", False)
+    bulk = job_params.get("bulk", True)
+    workers = job_params.get("workers")
     if not org_number:
         raise ValueError(f"Missing org_number for job_name '{task.job_name}'")
 
@@ -117,11 +120,11 @@ def do_work(task):
     elif task.job_name == "fetch_groups_from_feide":
         yield from fetch_groups_from_feide(org_number)
     elif task.job_name == "fetch_memberships_from_feide":
-        yield from fetch_memberships_from_feide(org_number, anonymize=anonymize)
+        yield from fetch_memberships_from_feide(org_number, anonymize=anonymize, workers=workers)
     elif task.job_name == "import_groups":
-        yield from import_groups_from_file(org_number)
+        yield from import_groups_from_file(org_number, bulk=bulk)
     elif task.job_name == "import_memberships":
-        yield from import_memberships_from_file(org_number)
+        yield from import_memberships_from_file(org_number, bulk=bulk)
     elif task.job_name == "update_data_integrity":
         groups_earlier_than = parse_datetime(job_params.get("groups_earlier_than"))
         memberships_earlier_than = parse_datetime(job_params.get("memberships_earlier_than"))
@@ -132,6 +135,8 @@ def do_work(task):
             "memberships_earlier_than": memberships_earlier_than,
         }
         yield from update_data_integrity(org_number, options)
+    elif task.job_name == "suggest_statuses":
+        yield from suggest_statuses_for_school(org_number, job_params)
     else:
         raise ValueError(f"Unknown job_name '{task.job_name}'")
 
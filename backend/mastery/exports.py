@@ -0,0 +1,73 @@
+import csv
+import io
+import tempfile
+from datetime import datetime
+from django.utils import timezone
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+CSV_CONTENT_TYPE = "text/csv; charset=utf-8"
+XLSX_CONTENT_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+# Bytes collected before a chunk of the response is sent
+CHUNK_SIZE = 64 * 1024
+# Spreadsheet programs run text starting with one of these as a formula
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def stream_csv(header, rows):
+    """
+    Yield header and rows as CSV, in chunks of about CHUNK_SIZE. rows can be any iterable, e.g. the
+    iterator of a queryset, and is read as the chunks are sent, so memory use does not grow with the rows.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # With a BOM, Excel reads the file as UTF-8
+    buffer.write("\ufeff")
+    writer.writerow(header)
+    for row in rows:
+        writer.writerow([csv_value(value) for value in row])
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+
+def stream_xlsx(title, header, rows):
+    """
+    Yield a workbook with one sheet of header and rows, in chunks of CHUNK_SIZE. The workbook is written
+    with a write-only openpyxl workbook, which keeps rows in a temporary file instead of in memory, so the
+    file is sent once all rows are written.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title)
+    sheet.append(header)
+    for row in rows:
+        sheet.append([xlsx_cell(sheet, value) for value in row])
+    with tempfile.TemporaryFile() as file:
+        workbook.save(file)
+        file.seek(0)
+        while chunk := file.read(CHUNK_SIZE):
+            yield chunk
+
+
+def csv_value(value):
+    if isinstance(value, datetime):
+        return timezone.localtime(value).isoformat()
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def xlsx_cell(sheet, value):
+    if isinstance(value, datetime):
+        # Excel has no time zones
+        return timezone.localtime(value).replace(tzinfo=None)
+    if isinstance(value, str):
+        # Control characters are not allowed in the file
+        cell = WriteOnlyCell(sheet, value=ILLEGAL_CHARACTERS_RE.sub("", value))
+        # Text, even if it looks like a formula
+        cell.data_type = "s"
+        return cell
+    return value
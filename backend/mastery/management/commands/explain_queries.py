@@ -0,0 +1,137 @@
+import statistics
+import time
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory, force_authenticate
+from mastery import models
+from mastery.api import views
+
+
+# Main list endpoints: (label, viewset, query params). Params in braces are filled in from sample data
+LIST_QUERIES = [
+    ("schools", views.SchoolViewSet, {}),
+    ("users at school", views.UserViewSet, {"school": "{school}"}),
+    ("students in group", views.UserViewSet, {"school": "{school}", "groups": "{group}", "roles": "student"}),
+    ("user-groups in group", views.UserGroupViewSet, {"school": "{school}", "group": "{group}"}),
+    ("teaching groups at school", views.GroupViewSet, {"school": "{school}", "type": "teaching"}),
+    ("groups of user", views.GroupViewSet, {"school": "{school}", "user": "{student}", "roles": "student"}),
+    ("subjects at school", views.SubjectViewSet, {"school": "{school}"}),
+    ("goals of student", views.GoalViewSet, {"school": "{school}", "student": "{student}"}),
+    ("goals of group", views.GoalViewSet, {"school": "{school}", "group": "{group}"}),
+    ("observations of student", views.ObservationViewSet, {"student": "{student}"}),
+    ("observations in group", views.ObservationViewSet, {"group": "{group}"}),
+    ("statuses at school", views.StatusViewSet, {"school": "{school}"}),
+    ("mastery schemas at school", views.MasterySchemaViewSet, {"school": "{school}"}),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Print EXPLAIN plans for the main list endpoints, as seen by a given user. "
+        "With --compare, plans are also shown without the indexes declared in Meta.indexes. "
+        "The indexes are dropped inside a transaction which is rolled back, "
+        "but the tables are locked meanwhile: do not use --compare against a busy database. "
+        "With --time, each query is also run and timed, to compare query times before and after a change."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user", help="Id or Feide id of user to run queries as (default: a superadmin)")
+        parser.add_argument("--school", help="Id of school to query (default: the school with most groups)")
+        parser.add_argument("--analyze", action="store_true", help="Run the queries (EXPLAIN ANALYZE)")
+        parser.add_argument("--compare", action="store_true",
+                            help="Also show plans with the indexes from Meta.indexes removed")
+        parser.add_argument("--time", type=int, default=0, metavar="RUNS",
+                            help="Run each query RUNS times and show the median and fastest time")
+
+    def handle(self, *args, **options):
+        user = self.get_user(options.get("user"))
+        sample = self.get_sample(options.get("school"))
+        self.stdout.write(f"Running as {user.name} ({user.id}), sample: {sample}")
+
+        if options["compare"]:
+            with transaction.atomic():
+                dropped = self.drop_declared_indexes()
+                self.stdout.write(self.style.MIGRATE_HEADING(f"\n=== Without {dropped} declared indexes ==="))
+                self.explain_all(user, sample, options["analyze"], options["time"])
+                transaction.set_rollback(True)
+            self.stdout.write(self.style.MIGRATE_HEADING("\n=== With declared indexes ==="))
+
+        self.explain_all(user, sample, options["analyze"], options["time"])
+
+    def get_user(self, user_param):
+        if user_param:
+            user = models.User.objects.filter(Q(id=user_param) | Q(feide_id=user_param)).first()
+        else:
+            user = models.User.objects.filter(is_superadmin=True, deleted_at__isnull=True).first()
+        if not user:
+            raise CommandError("No user to run queries as, use --user")
+        return user
+
+    def get_sample(self, school_param):
+        """Pick a school, one of its teaching groups and a student in that group, to fill in query params"""
+        schools = models.School.objects.filter(deleted_at__isnull=True)
+        if school_param:
+            school = schools.filter(id=school_param).first()
+        else:
+            school = schools.annotate(group_count=Count("groups")).order_by("-group_count").first()
+        if not school:
+            raise CommandError("No school found")
+        group = (models.Group.objects.filter(school=school, type="teaching", deleted_at__isnull=True)
+                 .annotate(member_count=Count("user_groups")).order_by("-member_count").first())
+        student_group = models.UserGroup.objects.filter(
+            group=group, role__name="student", deleted_at__isnull=True).first() if group else None
+        return {
+            "school": school.id,
+            "group": group.id if group else "",
+            "student": student_group.user_id if student_group else "",
+        }
+
+    def explain_all(self, user, sample, analyze, runs=0):
+        for label, viewset_class, params in LIST_QUERIES:
+            query_params = {key: value.format(**sample) for key, value in params.items()}
+            qs = self.get_list_queryset(viewset_class, user, query_params)
+            self.explain(f"{label} {query_params}", qs, analyze)
+            if runs:
+                self.time_query(qs, runs)
+
+        now = timezone.now()
+        pending_tasks = (models.DataMaintenanceTask.objects
+                         .filter(status="pending", handler_name=None, earliest_run_at__lte=now)
+                         .order_by("created_at"))
+        self.explain("background task runner, next pending task", pending_tasks, analyze)
+
+    def get_list_queryset(self, viewset_class, user, query_params):
+        """Return the queryset the list action of viewset would use for a GET with query_params"""
+        request = APIRequestFactory().get("/", query_params)
+        force_authenticate(request, user=user)
+        view = viewset_class()
+        view.action_map = {"get": "list"}
+        view.args, view.kwargs, view.format_kwarg = (), {}, None
+        view.request = view.initialize_request(request)
+        return view.get_queryset()
+
+    def explain(self, label, qs, analyze):
+        self.stdout.write(self.style.SUCCESS(f"\n--- {label}"))
+        explain_options = {"analyze": True} if analyze else {}
+        self.stdout.write(qs.explain(**explain_options))
+
+    def time_query(self, qs, runs):
+        durations = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            row_count = len(qs.all())  # all() gives a fresh queryset, so the query runs every time
+            durations.append((time.perf_counter() - start) * 1000)
+        self.stdout.write(f"{row_count} rows, median {statistics.median(durations):.1f} ms, "
+                          f"fastest {min(durations):.1f} ms ({runs} runs)")
+
+    def drop_declared_indexes(self):
+        """Drop all indexes declared in Meta.indexes of mastery models. Only use inside a transaction"""
+        dropped = 0
+        with connection.cursor() as cursor:
+            for model in models.BaseModel.__subclasses__():
+                for index in model._meta.indexes:
+                    cursor.execute(f"DROP INDEX {connection.ops.quote_name(index.name)}")
+                    dropped += 1
+        return dropped
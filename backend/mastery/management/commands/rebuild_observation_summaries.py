@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from mastery import models
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute all observation summaries (latest value and count for each student and goal) "
+        "from the observations. Summaries are kept up to date as observations change, so this is only "
+        "needed after changes made outside the application, e.g. directly in the database."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Summaries to insert at a time")
+
+    def handle(self, *args, **options):
+        count = models.ObservationSummary.rebuild(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} observation summaries"))
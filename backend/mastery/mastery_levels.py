@@ -0,0 +1,106 @@
+import threading
+from bisect import bisect_right
+from types import MappingProxyType
+
+# Value ranges up to this size get a lookup table with the level of every value
+MAX_DENSE_SPAN = 10000
+# Compiled schemas kept per process. When full, the cache starts over
+MAX_CACHED_SCHEMAS = 1000
+
+_compiled_schemas = {}
+_compiled_schemas_lock = threading.Lock()
+
+
+class CompiledMasterySchema:
+    """
+    The levels of a mastery schema config, read once: the range of values, the levels sorted by min_value,
+    their boundaries, and a table from value to level for lookups in constant time.
+    Immutable, so that one instance can be shared by all threads of the process.
+    """
+    __slots__ = ('min_value', 'max_value', 'levels', 'boundaries', '_level_by_value')
+
+    def __init__(self, config):
+        levels = (config or {}).get('levels') or []
+        # The range is from all levels which have a bound, like it always was
+        min_values = [level.get('min_value') for level in levels if level.get('min_value') is not None]
+        max_values = [level.get('max_value') for level in levels if level.get('max_value') is not None]
+        min_value, max_value = None, None
+        if min_values and max_values:
+            min_value, max_value = min(min_values), max(max_values)
+
+        # Levels to look values up in need both bounds
+        bounded = sorted(
+            (level for level in levels
+             if level.get('min_value') is not None and level.get('max_value') is not None),
+            key=lambda level: (level['min_value'], level['max_value']))
+        boundaries = tuple((level['min_value'], level['max_value']) for level in bounded)
+
+        level_by_value = None
+        bounds = [min_value, max_value, *(bound for level_bounds in boundaries for bound in level_bounds)]
+        if (boundaries and all(isinstance(bound, int) for bound in bounds)
+                and max_value - min_value <= MAX_DENSE_SPAN):
+            table = [None] * (max_value - min_value + 1)
+            # Where levels overlap, the later level wins, as with the bisect lookup
+            for index, (low, high) in enumerate(boundaries):
+                for value in range(low, high + 1):
+                    table[value - min_value] = index
+            level_by_value = tuple(table)
+
+        set_attribute = super().__setattr__
+        set_attribute('min_value', min_value)
+        set_attribute('max_value', max_value)
+        set_attribute('levels', tuple(MappingProxyType(dict(level)) for level in bounded))
+        set_attribute('boundaries', boundaries)
+        set_attribute('_level_by_value', level_by_value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("CompiledMasterySchema is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("CompiledMasterySchema is immutable")
+
+    def is_in_range(self, value):
+        """False if value is outside the range of the schema. Any value is in range if the schema has none"""
+        if self.min_value is None or self.max_value is None:
+            return True
+        return self.min_value <= value <= self.max_value
+
+    def get_level_index(self, value):
+        """Index in levels of the level value belongs to, or None if it belongs to no level"""
+        if value is None or not self.boundaries:
+            return None
+        if self._level_by_value is not None and isinstance(value, int):
+            offset = value - self.min_value
+            return self._level_by_value[offset] if 0 <= offset < len(self._level_by_value) else None
+        index = bisect_right(self.boundaries, (value, float('inf'))) - 1
+        # Levels before index may reach further, if levels overlap
+        while index >= 0:
+            low, high = self.boundaries[index]
+            if low <= value <= high:
+                return index
+            index -= 1
+        return None
+
+    def get_level(self, value):
+        """The level (from the config) value belongs to, or None"""
+        index = self.get_level_index(value)
+        return None if index is None else self.levels[index]
+
+
+def get_compiled_schema(mastery_schema):
+    """
+    The CompiledMasterySchema of mastery_schema, compiled once per process for each (id, updated_at).
+    Changes to config must be saved with save(), which sets updated_at, to be seen.
+    """
+    if mastery_schema.updated_at is None:
+        # Not saved yet, config may still change
+        return CompiledMasterySchema(mastery_schema.config)
+    key = (mastery_schema.id, mastery_schema.updated_at)
+    compiled = _compiled_schemas.get(key)
+    if compiled is None:
+        compiled = CompiledMasterySchema(mastery_schema.config)
+        with _compiled_schemas_lock:
+            if len(_compiled_schemas) >= MAX_CACHED_SCHEMAS:
+                _compiled_schemas.clear()
+            _compiled_schemas[key] = compiled
+    return compiled
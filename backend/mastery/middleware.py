@@ -1,8 +1,13 @@
 import re
+from django.conf import settings
+from django.core.cache import cache
 from django.utils.deprecation import MiddlewareMixin
 from django.utils import timezone
 from mastery.models import User
 
+USER_ACTIVITY_CACHE_KEY = "user-activity:{user_id}"
+
+
 class CamelCaseQueryParamMiddleware(MiddlewareMixin):
     def process_request(self, request):
         # Convert camelCase query params to snake_case
@@ -17,12 +22,23 @@ class CamelCaseQueryParamMiddleware(MiddlewareMixin):
 
 
 class UpdateUserActivityMiddleware(MiddlewareMixin):
+    """
+    Keep User.last_activity_at up to date, with at most one write per user for every
+    USER_ACTIVITY_INTERVAL_SECONDS, so last_activity_at is at most that much behind.
+    With a shared cache the interval holds across processes, with the default in-memory cache per process.
+    """
+
     def process_request(self, request):
         # Update user's last activity timestamp if user is authenticated
         if hasattr(request, 'session') and "user_id" in request.session:
             user_id = request.session["user_id"]
+            interval = settings.USER_ACTIVITY_INTERVAL_SECONDS
+            cache_key = USER_ACTIVITY_CACHE_KEY.format(user_id=user_id)
+            # add() only succeeds for the first request of the interval
+            if interval and not cache.add(cache_key, True, interval):
+                return None
             try:
                 User.objects.filter(id=user_id).update(last_activity_at=timezone.now())
             except Exception:
-                pass
+                cache.delete(cache_key)
         return None
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:00
+
+import django.db.models.deletion
+import django.utils.timezone
+import mastery.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mastery', '0020_remove_observation_situation_observation_subject_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GrepCode',
+            fields=[
+                ('id', models.CharField(default=mastery.models.generate_nanoid, editable=False, max_length=50, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('maintained_at', models.DateTimeField(null=True)),
+                ('deleted_at', models.DateTimeField(null=True)),
+                ('grep_code', models.CharField(max_length=200, unique=True)),
+                ('display_name', models.CharField(max_length=200, null=True)),
+                ('short_name', models.CharField(max_length=200, null=True)),
+                ('grep_group_code', models.CharField(max_length=200, null=True)),
+                ('fetched_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='created_%(class)s_set', to='mastery.user')),
+                ('updated_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='updated_%(class)s_set', to='mastery.user')),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mastery', '0021_grepcode'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='datamaintenancetask',
+            index=models.Index(fields=['status', 'earliest_run_at', 'created_at'], name='task_status_run_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='goal',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['school', 'sort_order'], name='goal_school_sort_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['school', 'type', 'is_enabled'], name='group_school_type_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='group',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['valid_to', 'valid_from'], name='group_validity_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='observation',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['student', 'observed_at'], name='obs_student_observed_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='status',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['school', 'student'], name='status_school_student_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['name'], name='user_name_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='usergroup',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['group', 'role'], name='usergroup_group_role_live_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='userschool',
+            index=models.Index(condition=models.Q(('deleted_at__isnull', True)), fields=['school', 'role'], name='userschool_school_role_idx'),
+        ),
+    ]
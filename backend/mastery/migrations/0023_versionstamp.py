@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:20
+
+import django.db.models.deletion
+import mastery.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mastery', '0022_add_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionStamp',
+            fields=[
+                ('id', models.CharField(default=mastery.models.generate_nanoid, editable=False, max_length=50, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('maintained_at', models.DateTimeField(null=True)),
+                ('deleted_at', models.DateTimeField(null=True)),
+                ('model_name', models.CharField(max_length=50)),
+                ('school_key', models.CharField(max_length=50)),
+                ('version', models.CharField(default=mastery.models.generate_nanoid, max_length=50)),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='created_%(class)s_set', to='mastery.user')),
+                ('updated_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='updated_%(class)s_set', to='mastery.user')),
+            ],
+            options={
+                'unique_together': {('model_name', 'school_key')},
+            },
+        ),
+    ]
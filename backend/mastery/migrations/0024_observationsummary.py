@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:41
+
+import django.db.models.deletion
+import mastery.models
+from django.db import migrations, models
+from django.db.models import F, Count, Window
+from django.db.models.functions import RowNumber
+
+
+def fill_observation_summaries(apps, schema_editor):
+    # Same as ObservationSummary.rebuild, which can not be used with historical models
+    Observation = apps.get_model('mastery', 'Observation')
+    ObservationSummary = apps.get_model('mastery', 'ObservationSummary')
+    partition_by = [F('student_id'), F('goal_id')]
+    latest = Observation.objects.filter(deleted_at__isnull=True).annotate(
+        row_number=Window(RowNumber(), partition_by=partition_by, order_by=[
+            F('observed_at').desc(nulls_last=True), F('created_at').desc(), F('id').desc()]),
+        observation_count=Window(Count('id'), partition_by=partition_by),
+    ).filter(row_number=1).values_list(
+        'student_id', 'goal_id', 'id', 'mastery_value', 'observed_at', 'observation_count')
+    summaries = [
+        ObservationSummary(student_id=student_id, goal_id=goal_id, last_observation_id=observation_id,
+                           last_mastery_value=mastery_value, last_observed_at=observed_at,
+                           observation_count=observation_count)
+        for student_id, goal_id, observation_id, mastery_value, observed_at, observation_count
+        in latest.iterator()
+    ]
+    ObservationSummary.objects.bulk_create(summaries, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('mastery', '0023_versionstamp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ObservationSummary',
+            fields=[
+                ('id', models.CharField(default=mastery.models.generate_nanoid, editable=False, max_length=50, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('maintained_at', models.DateTimeField(null=True)),
+                ('deleted_at', models.DateTimeField(null=True)),
+                ('last_mastery_value', models.IntegerField(null=True)),
+                ('last_observed_at', models.DateTimeField(null=True)),
+                ('observation_count', models.IntegerField(default=0)),
+                ('created_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='created_%(class)s_set', to='mastery.user')),
+                ('goal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='observation_summaries', to='mastery.goal')),
+                ('last_observation', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='mastery.observation')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='observation_summaries', to='mastery.user')),
+                ('updated_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='updated_%(class)s_set', to='mastery.user')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['goal', 'student'], name='obs_summary_goal_student_idx')],
+                'unique_together': {('student', 'goal')},
+            },
+        ),
+        migrations.RunPython(fill_observation_summaries, migrations.RunPython.noop),
+    ]
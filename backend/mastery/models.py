@@ -1,11 +1,16 @@
 from django.utils import timezone
-from django.db import models
-from django.db.models import Q
+from django.db import models, transaction
+from django.db.models import Q, F, Count, Window
+from django.db.models.functions import RowNumber
 from nanoid import generate
 from .querysets import GroupQuerySet
+from .mastery_levels import get_compiled_schema
 
 ALPHABET = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
 
+# Nearly all queries only look at rows which are not soft deleted, so most indexes leave deleted rows out
+NOT_DELETED = Q(deleted_at__isnull=True)
+
 
 def generate_nanoid(size=12):
     return generate(ALPHABET, size)
@@ -88,11 +93,15 @@ class School(BaseModel):
             school=self,
             role=role
         ).first()
-        return user_school or UserSchool.objects.create(
+        if user_school:
+            return user_school
+        user_school = UserSchool.objects.create(
             user=user,
             school=self,
             role=role
         )
+        VersionStamp.bump(['userschool'], [self.id])
+        return user_school
 
     def get_employed_user(self, role_name):
         """Get all employed users, by optional role_name"""
@@ -122,6 +131,18 @@ class Subject(BaseModel):
         return self.owned_by_school_id is None
 
 
+class GrepCode(BaseModel):
+    """
+    Local cache of UDIR grep codes (fagkoder), used when creating Feide synchronized subjects.
+    Rows older than the cache TTL are refreshed from UDIR on use, but kept if UDIR can not be reached.
+    """
+    grep_code = models.CharField(max_length=200, unique=True)
+    display_name = models.CharField(max_length=200, null=True)  # tittel
+    short_name = models.CharField(max_length=200, null=True)  # kortform
+    grep_group_code = models.CharField(max_length=200, null=True)  # opplaeringsfag
+    fetched_at = models.DateTimeField(default=timezone.now)  # last successful fetch from UDIR
+
+
 class User(BaseModel):
     """
     A User represents a user in the system. Students, teachers and faculty are all modeled as users.
@@ -140,6 +161,11 @@ class User(BaseModel):
         related_name='employees')
     is_superadmin = models.BooleanField(default=False)  # caution, site-wide admin
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['name'], condition=NOT_DELETED, name='user_name_live_idx'),
+        ]
+
     def _get_groups_with_role(self, role_name):
         """Get all groups where user has a specific role"""
         return self.groups.filter(user_groups__role__name=role_name)
@@ -216,6 +242,16 @@ class Group(BaseModel):
     valid_to = models.DateTimeField(null=True)
     is_enabled = models.BooleanField(default=False)  # whether the group is active in the system
 
+    class Meta:
+        indexes = [
+            # groups at school, by type and enabled
+            models.Index(fields=['school', 'type', 'is_enabled'], condition=NOT_DELETED,
+                         name='group_school_type_live_idx'),
+            # validity period filters, e.g. the cleaner bot looking for expired groups
+            models.Index(fields=['valid_to', 'valid_from'], condition=NOT_DELETED,
+                         name='group_validity_live_idx'),
+        ]
+
     def is_currently_valid(self):
         """Return True if in valid_from <--> valid_to range, or if no range is set"""
         return Group.objects.filter(id=self.id).within_validity_period().exists()
@@ -273,6 +309,11 @@ class UserGroup(BaseModel):
 
     class Meta:
         unique_together = ('user', 'group', 'role')
+        indexes = [
+            # members of a group, by role (the unique constraint covers lookups by user)
+            models.Index(fields=['group', 'role'], condition=NOT_DELETED,
+                         name='usergroup_group_role_live_idx'),
+        ]
 
 
 class UserSchool(BaseModel):
@@ -285,6 +326,33 @@ class UserSchool(BaseModel):
 
     class Meta:
         unique_together = ('user', 'school', 'role')
+        indexes = [
+            models.Index(fields=['school', 'role'], condition=NOT_DELETED, name='userschool_school_role_idx'),
+        ]
+
+    @classmethod
+    def ensure_user_schools(cls, user, schools, role_name):
+        """
+        Add user to all of schools with the role named role_name, like School.set_employed_user, in one
+        batch: one query when the user has the role at all schools already. Returns the ids of the schools
+        the user was added to.
+        """
+        school_ids = {school.id for school in schools}
+        if not school_ids:
+            return set()
+        existing = set(cls.objects.filter(
+            user=user, school_id__in=school_ids, role__name=role_name
+        ).values_list('school_id', flat=True))
+        missing = school_ids - existing
+        if not missing:
+            return missing
+        role = Role.objects.filter(name=role_name).first() or Role.objects.create(name=role_name)
+        # A concurrent login may have added some of them already
+        cls.objects.bulk_create(
+            [cls(user=user, school_id=school_id, role=role) for school_id in sorted(missing)],
+            ignore_conflicts=True)
+        VersionStamp.bump(['userschool'], missing)
+        return missing
 
 
 class MasterySchema(BaseModel):
@@ -298,25 +366,17 @@ class MasterySchema(BaseModel):
     is_default = models.BooleanField(default=False)  # is this the default schema for the school
     is_enabled = models.BooleanField(default=False)  # is the schema available for use for the school
 
+    def get_compiled(self):
+        """The schema's levels compiled for lookups, cached per process (see mastery_levels)"""
+        return get_compiled_schema(self)
+
     def get_value_range(self):
         """
         Returns (min_value, max_value) tuple from the schema's config levels.
         Returns (None, None) if config or levels are not defined.
         """
-        if not self.config:
-            return None, None
-
-        levels = self.config.get('levels', [])
-        if not levels:
-            return None, None
-
-        all_min_values = [level.get('min_value') for level in levels if level.get('min_value') is not None]
-        all_max_values = [level.get('max_value') for level in levels if level.get('max_value') is not None]
-
-        if not all_min_values or not all_max_values:
-            return None, None
-
-        return min(all_min_values), max(all_max_values)
+        compiled = self.get_compiled()
+        return compiled.min_value, compiled.max_value
 
 
 class Goal(BaseModel):
@@ -343,6 +403,10 @@ class Goal(BaseModel):
             models.CheckConstraint(
                 condition=models.Q(group__isnull=False) | models.Q(student__isnull=False),
                 name='goal_group_or_student'),]
+        indexes = [
+            models.Index(fields=['school', 'sort_order'], condition=NOT_DELETED,
+                         name='goal_school_sort_live_idx'),
+        ]
 
     @property
     def is_individual(self):
@@ -365,15 +429,145 @@ class Observation(BaseModel):
     observed_at = models.DateTimeField(null=True)
     is_visible_to_student = models.BooleanField(default=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remembered so that the summary of the old (student, goal) is refreshed if they are changed
+        instance._loaded_summary_key = (instance.__dict__.get('student_id'), instance.__dict__.get('goal_id'))
+        return instance
+
     def save(self, **kwargs):
-        # Auto-derive subject from goal if not explicitly set
+        self.derive_subject()
+        super().save(**kwargs)
+        self._loaded_summary_key = (self.student_id, self.goal_id)
+
+    def get_summary_keys(self):
+        """The (student_id, goal_id) of the ObservationSummary rows a change of this observation affects"""
+        keys = {(self.student_id, self.goal_id)}
+        keys.add(getattr(self, '_loaded_summary_key', (self.student_id, self.goal_id)))
+        return keys
+
+    def derive_subject(self):
+        """Auto-derive subject from goal if not explicitly set. Also used before bulk_create"""
         if self.goal_id and not self.subject_id:
             self.subject_id = self.goal.subject_id or (
                 self.goal.group.subject_id if self.goal.group_id else None)
-        super().save(**kwargs)
 
     class Meta:
         ordering = ["observed_at"]
+        indexes = [
+            models.Index(fields=['student', 'observed_at'], condition=NOT_DELETED,
+                         name='obs_student_observed_live_idx'),
+        ]
+
+
+class ObservationSummary(BaseModel):
+    """
+    The current standing of a student on a goal: the latest observation which is not deleted, its value
+    and time, and how many observations there are. A row exists only if there is at least one observation.
+    Kept up to date on every change of observations (see refresh), and rebuilt from scratch with the
+    rebuild_observation_summaries command.
+    """
+    student = models.ForeignKey(User, on_delete=models.CASCADE, null=False,
+                                related_name='observation_summaries')
+    goal = models.ForeignKey(Goal, on_delete=models.CASCADE, null=False, related_name='observation_summaries')
+    last_observation = models.ForeignKey(Observation, on_delete=models.SET_NULL, null=True, related_name='+')
+    last_mastery_value = models.IntegerField(null=True)
+    last_observed_at = models.DateTimeField(null=True)
+    observation_count = models.IntegerField(default=0)
+
+    # Fields copied from the latest observation, by the name they have on it
+    LAST_OBSERVATION_FIELDS = {
+        'last_observation_id': 'id',
+        'last_mastery_value': 'mastery_value',
+        'last_observed_at': 'observed_at',
+    }
+    UPDATE_FIELDS = ['last_observation', 'last_mastery_value', 'last_observed_at', 'observation_count',
+                     'updated_at']
+
+    class Meta:
+        unique_together = ('student', 'goal')
+        indexes = [
+            models.Index(fields=['goal', 'student'], name='obs_summary_goal_student_idx'),
+        ]
+
+    @staticmethod
+    def latest_observations(observations):
+        """
+        values() of the latest observation for each (student, goal) among observations, with the number of
+        observations for that (student, goal) as observation_count. Latest is by observed_at, then created_at.
+        """
+        partition_by = [F('student_id'), F('goal_id')]
+        return observations.filter(deleted_at__isnull=True).annotate(
+            row_number=Window(RowNumber(), partition_by=partition_by, order_by=[
+                F('observed_at').desc(nulls_last=True), F('created_at').desc(), F('id').desc()]),
+            observation_count=Window(Count('id'), partition_by=partition_by),
+        ).filter(row_number=1).values('student_id', 'goal_id', 'observation_count',
+                                      *ObservationSummary.LAST_OBSERVATION_FIELDS.values())
+
+    @classmethod
+    def refresh(cls, keys):
+        """
+        Recompute the summaries of keys, (student_id, goal_id) pairs, from their observations.
+        Call this in the transaction which changes the observations. Model signals do it for save() and
+        delete(), but not for bulk_create, bulk_update or update().
+        The summary rows are locked first, so concurrent refreshes of a summary can not overwrite each other.
+        """
+        keys = {(student_id, goal_id) for student_id, goal_id in keys if student_id and goal_id}
+        if not keys:
+            return
+        student_ids = {student_id for student_id, _ in keys}
+        goal_ids = {goal_id for _, goal_id in keys}
+        now = timezone.now()
+        with transaction.atomic():
+            cls.objects.bulk_create(
+                [cls(student_id=student_id, goal_id=goal_id) for student_id, goal_id in sorted(keys)],
+                ignore_conflicts=True)
+            summaries = {
+                (summary.student_id, summary.goal_id): summary
+                for summary in cls.objects.select_for_update().filter(
+                    student_id__in=student_ids, goal_id__in=goal_ids).order_by('id')
+                if (summary.student_id, summary.goal_id) in keys
+            }
+            latest = {
+                (row['student_id'], row['goal_id']): row
+                for row in cls.latest_observations(Observation.objects.filter(
+                    student_id__in=student_ids, goal_id__in=goal_ids))
+            }
+            to_update = []
+            to_delete = []
+            for key, summary in summaries.items():
+                row = latest.get(key)
+                if row is None:
+                    to_delete.append(summary.id)
+                    continue
+                for field_name, observation_field_name in cls.LAST_OBSERVATION_FIELDS.items():
+                    setattr(summary, field_name, row[observation_field_name])
+                summary.observation_count = row['observation_count']
+                summary.updated_at = now
+                to_update.append(summary)
+            cls.objects.bulk_update(to_update, cls.UPDATE_FIELDS)
+            if to_delete:
+                cls.objects.filter(id__in=to_delete).delete()
+
+    @classmethod
+    def rebuild(cls, batch_size=1000):
+        """Replace all summaries with ones computed from the observations. Returns the number of summaries"""
+        count = 0
+        with transaction.atomic():
+            cls.objects.all().delete()
+            batch = []
+            for row in cls.latest_observations(Observation.objects.all()).iterator(chunk_size=batch_size):
+                batch.append(cls(
+                    student_id=row['student_id'], goal_id=row['goal_id'],
+                    observation_count=row['observation_count'],
+                    **{field_name: row[name] for field_name, name in cls.LAST_OBSERVATION_FIELDS.items()}))
+                if len(batch) == batch_size:
+                    cls.objects.bulk_create(batch)
+                    count += len(batch)
+                    batch = []
+            cls.objects.bulk_create(batch)
+        return count + len(batch)
 
 
 class Status(BaseModel):
@@ -393,6 +587,12 @@ class Status(BaseModel):
     mastery_description = models.TextField(null=True)
     feedforward = models.TextField(null=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['school', 'student'], condition=NOT_DELETED,
+                         name='status_school_student_live_idx'),
+        ]
+
 
 class DataMaintenanceTask(BaseModel):
     """
@@ -418,3 +618,51 @@ class DataMaintenanceTask(BaseModel):
     earliest_run_at = models.DateTimeField(null=True, default=timezone.now)  # earliest execution time
     result = models.JSONField(null=True, blank=False)  # JSON field to store updated result of task execution
     attempts = models.IntegerField(default=0)  # number of attempts made (initial + retries)
+
+    class Meta:
+        indexes = [
+            # the background task runner picks the oldest pending task which is due
+            models.Index(fields=['status', 'earliest_run_at', 'created_at'], name='task_status_run_at_idx'),
+        ]
+
+
+class VersionStamp(BaseModel):
+    """
+    A VersionStamp changes whenever data of a model (e.g. 'goal') at a school changes through the API,
+    the importers or the cleaner bot. The SHARED stamp of a model changes on changes of rows which belong
+    to no school (e.g. subjects from UDIR). There is no stamp across all schools, which every write would
+    have to lock: data of several schools depends on the stamps of each of them.
+    Used to answer conditional requests without querying data.
+    """
+    SHARED = "shared"
+
+    model_name = models.CharField(max_length=50)  # lower case model name, e.g. 'goal' or 'usergroup'
+    school_key = models.CharField(max_length=50)  # school id or SHARED
+    version = models.CharField(max_length=50, default=generate_nanoid)
+
+    class Meta:
+        unique_together = ('model_name', 'school_key')
+
+    @classmethod
+    def bump(cls, model_names, school_ids=()):
+        """Give models new versions at school_ids, or as shared data if no school is given"""
+        now = timezone.now()
+        school_keys = {school_id for school_id in school_ids if school_id} or {cls.SHARED}
+        stamps = [
+            cls(model_name=model_name, school_key=school_key, version=generate_nanoid(), updated_at=now)
+            for model_name in sorted(set(model_names)) for school_key in sorted(school_keys)
+        ]
+        cls.objects.bulk_create(stamps, update_conflicts=True, unique_fields=['model_name', 'school_key'],
+                                update_fields=['version', 'updated_at'])
+
+    @classmethod
+    def get_versions(cls, model_names, school_ids=None):
+        """
+        Return [(model_name, school_key, version, updated_at)] of the stamps data of model_names depends on:
+        data at school_ids and shared data, or data at all schools if school_ids is None
+        """
+        stamps = cls.objects.filter(model_name__in=model_names)
+        if school_ids is not None:
+            stamps = stamps.filter(school_key__in=[*school_ids, cls.SHARED])
+        return list(stamps.order_by('model_name', 'school_key').values_list(
+            'model_name', 'school_key', 'version', 'updated_at'))
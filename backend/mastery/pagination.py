@@ -0,0 +1,175 @@
+import base64
+import binascii
+import json
+from operator import attrgetter
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import F, Q
+from django.db.models.expressions import OrderBy
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opt-in keyset (cursor) pagination, keyed on the ordering of the view's queryset plus id as tie breaker.
+    Lists are only paginated when the request has a "limit" or "cursor" parameter, other requests get
+    the plain list as before. A page is fetched with one query for limit + 1 rows: no OFFSET and no COUNT(*).
+    Pages can only be walked forwards, by following "next" (or passing "next_cursor" as "cursor").
+    """
+    limit_query_param = "limit"
+    cursor_query_param = "cursor"
+    default_limit = 100
+    max_limit = 1000
+
+    def is_requested(self, request):
+        """True if the request asks for a page"""
+        return self.limit_query_param in request.query_params or \
+            self.cursor_query_param in request.query_params
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not self.is_requested(request):
+            return None
+        self.request = request
+        self.limit = self.get_limit(request)
+        self.ordering = self.get_ordering(queryset)
+        self.nullable_fields = {
+            field for field, _ in self.ordering if self.is_nullable(queryset.model, field)}
+
+        queryset = queryset.order_by(*[
+            F(field).desc(nulls_first=True) if descending else F(field).asc(nulls_last=True)
+            for field, descending in self.ordering
+        ])
+        cursor = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+        if cursor is not None:
+            try:
+                queryset = queryset.filter(self.get_after_filter(cursor))
+            except (ValueError, TypeError, DjangoValidationError):
+                raise ValidationError({'error': 'invalid-parameter',
+                                       'message': 'Invalid "cursor" parameter.'})
+
+        rows = list(queryset[:self.limit + 1])
+        self.has_next = len(rows) > self.limit
+        self.page = rows[:self.limit]
+        return self.page
+
+    def get_paginated_response(self, data):
+        next_cursor = self.encode_cursor(self.page[-1]) if self.has_next else None
+        next_url = None
+        if next_cursor:
+            next_url = replace_query_param(
+                self.request.build_absolute_uri(), self.cursor_query_param, next_cursor)
+        return Response({
+            "next": next_url,
+            "next_cursor": next_cursor,
+            "results": data,
+        })
+
+    def get_limit(self, request):
+        limit = request.query_params.get(self.limit_query_param)
+        if not limit:
+            return self.default_limit
+        try:
+            limit = int(limit)
+        except ValueError:
+            limit = 0
+        if limit < 1:
+            raise ValidationError({'error': 'invalid-parameter',
+                                   'message': 'The "limit" parameter must be a positive integer.'})
+        return min(limit, self.max_limit)
+
+    def get_ordering(self, queryset):
+        """Return the ordering of queryset as a list of (field, descending), ending with ("id", False)"""
+        order_by = queryset.query.order_by
+        if not order_by and queryset.query.default_ordering:
+            order_by = queryset.model._meta.ordering
+        ordering = []
+        for item in order_by:
+            if isinstance(item, str):
+                field, descending = item.lstrip("-"), item.startswith("-")
+            elif isinstance(item, OrderBy) and isinstance(item.expression, F):
+                field, descending = item.expression.name, item.descending
+            else:
+                raise ValueError(f"Unsupported ordering for keyset pagination: {item}")
+            field = "id" if field == "pk" else field
+            if field == "id":
+                break
+            ordering.append((field, descending))
+        ordering.append(("id", False))
+        return ordering
+
+    def is_nullable(self, model, field_path):
+        """True if field_path, possibly across relations, can be null"""
+        for field_name in field_path.split("__"):
+            field = model._meta.get_field(field_name)
+            if field.null:
+                return True
+            model = field.related_model
+        return False
+
+    def get_after_filter(self, cursor):
+        """Filter for rows after the cursor, in lexicographic order of the ordering fields"""
+        after = Q(pk__in=[])
+        ties = Q()
+        for (field, descending), value in zip(self.ordering, cursor):
+            # Nulls sort last when ascending and first when descending, as in Postgres' default
+            if field not in self.nullable_fields:
+                field_after = Q(**{f"{field}__{'lt' if descending else 'gt'}": value})
+                field_tie = Q(**{field: value})
+            elif value is None:
+                field_after = Q(**{f"{field}__isnull": False}) if descending else Q(pk__in=[])
+                field_tie = Q(**{f"{field}__isnull": True})
+            else:
+                field_after = Q(**{f"{field}__{'lt' if descending else 'gt'}": value})
+                if not descending:
+                    field_after |= Q(**{f"{field}__isnull": True})
+                field_tie = Q(**{field: value})
+            after |= ties & field_after
+            ties &= field_tie
+        return after
+
+    def encode_cursor(self, row):
+        values = [attrgetter(field.replace("__", "."))(row) for field, _ in self.ordering]
+        # isoformat keeps microseconds, which DjangoJSONEncoder would cut off
+        values = [value.isoformat() if hasattr(value, "isoformat") else value for value in values]
+        payload = json.dumps({"o": self.ordering_signature(), "v": values})
+        return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+            values = payload["v"]
+            signature = payload["o"]
+        except (binascii.Error, UnicodeError, ValueError, TypeError, KeyError):
+            raise ValidationError({'error': 'invalid-parameter', 'message': 'Invalid "cursor" parameter.'})
+        if signature != self.ordering_signature() or len(values) != len(self.ordering):
+            raise ValidationError(
+                {'error': 'invalid-parameter',
+                 'message': 'The "cursor" parameter does not match the ordering of the list.'})
+        return values
+
+    def ordering_signature(self):
+        return [f"-{field}" if descending else field for field, descending in self.ordering]
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.limit_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Paginate the list, with at most this many results per page "
+                               f"(max {self.max_limit}). Without limit or cursor the full list is returned",
+                "schema": {"type": "integer"},
+            },
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Cursor of the page to return, from next_cursor of the previous page",
+                "schema": {"type": "string"},
+            },
+        ]
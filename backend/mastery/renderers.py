@@ -0,0 +1,19 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, the json module gives the same output
+    orjson = None
+
+
+def render_json(data):
+    """
+    Encode data, made of plain JSON types only, to the same bytes as DRF's JSONRenderer with the
+    default settings (unicode, compact, strict). Used for lists which bypass the renderers.
+    """
+    if orjson:
+        content = orjson.dumps(data)
+    else:
+        content = json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8')
+    # As JSONRenderer: these are valid JSON but not valid JavaScript
+    return content.replace('\u2028'.encode('utf-8'), b'\\u2028').replace('\u2029'.encode('utf-8'), b'\\u2029')
@@ -1,9 +1,58 @@
+import copy
 from rest_framework import serializers
+from djangorestframework_camel_case.settings import api_settings as camel_case_settings
+from djangorestframework_camel_case.util import camelize
 from mastery import models
+from django.core.exceptions import FieldDoesNotExist
 from django.db.models import ForeignKey, ManyToManyField
 from mastery.access_policies.observation import ObservationAccessPolicy
 
 
+class ScopedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField whose queryset is limited by the access policy of the related model, if it has one.
+    The policy is applied when the queryset is used (when a write is validated), not when the field is built.
+    Related rows can be looked up in advance for many items with preload_related_instances.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        request = self.context.get('request')
+        policy_class = getattr(queryset.model, 'access_policy', None)
+        if request and policy_class:
+            queryset = policy_class().scope_queryset(request, queryset)
+        return queryset
+
+    def to_internal_value(self, data):
+        instances = self.context.get('related_instances', {}).get(self.field_name)
+        if instances is None or self.pk_field is not None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return instances[str(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+
+
+def preload_related_instances(serializer_class, items, context, select_related=None):
+    """
+    Look up the rows referred to by ScopedPrimaryKeyRelatedFields of serializer_class in items (a list of
+    input data), with one query per field. Give the result as context['related_instances'] to serializers
+    of the items. select_related: {field name: [lookups]} for the related querysets
+    """
+    select_related = select_related or {}
+    related_instances = {}
+    for field_name, field in serializer_class(context=context).fields.items():
+        if not isinstance(field, ScopedPrimaryKeyRelatedField) or field.read_only:
+            continue
+        ids = {str(item[field_name]) for item in items
+               if isinstance(item, dict) and item.get(field_name) not in (None, '')}
+        queryset = field.get_queryset().filter(pk__in=ids).select_related(*select_related.get(field_name, []))
+        related_instances[field_name] = {str(instance.pk): instance for instance in queryset}
+    return related_instances
+
+
 class BaseModelSerializer(serializers.ModelSerializer):
     READ_ONLY_BASE_FIELDS = (
         'id',
@@ -17,8 +66,32 @@ class BaseModelSerializer(serializers.ModelSerializer):
         'updated_by',
     )
 
+    # Fields built by _build_fields, by serializer class. Each serializer instance gets a copy
+    _fields_by_class = {}
+
     # Fields override, used for renaming foreign key fields
     def get_fields(self):
+        prototype = BaseModelSerializer._fields_by_class.get(type(self))
+        if prototype is None:
+            prototype = self._build_fields()
+            BaseModelSerializer._fields_by_class[type(self)] = prototype
+        # Fields are copied like DRF copies declared fields, since they are bound to the serializer instance
+        fields = copy.deepcopy(prototype)
+
+        # Ensure base model metadata fields are read-only when present
+        # Set after copying, since copies are made from the field's init arguments
+        for field_name in self.READ_ONLY_BASE_FIELDS:
+            if field_name in fields:
+                fields[field_name].read_only = True
+
+        for field_name in self.READ_ONLY_FK_FIELDS:
+            lookup_name = f"{field_name}_id"
+            if lookup_name in fields:
+                fields[lookup_name].read_only = True
+        return fields
+
+    def _build_fields(self):
+        """The fields of the serializer class, which do not depend on the request"""
         fields = super().get_fields()
 
         # Get explicitly declared fields from the serializer class
@@ -53,16 +126,10 @@ class BaseModelSerializer(serializers.ModelSerializer):
                         read_only=True
                     )
                 else:
-                    request = self.context.get('request')
-                    # Ensure access policy is applied to the related field queryset
-                    qs = field.remote_field.model.objects.all()
-                    policy_class = getattr(field.remote_field.model, 'access_policy', None)
-                    if request and policy_class:
-                        policy = policy_class()
-                        qs = policy.scope_queryset(request, qs)
-                    fields[new_field_name] = serializers.PrimaryKeyRelatedField(
+                    # The access policy of the related model is applied to the queryset when validating
+                    fields[new_field_name] = ScopedPrimaryKeyRelatedField(
                         source=original_field_name,
-                        queryset=qs,
+                        queryset=field.remote_field.model.objects.all(),
                         required=not field.null,
                         allow_null=field.null
                     )
@@ -84,17 +151,138 @@ class BaseModelSerializer(serializers.ModelSerializer):
                     many=True,
                     read_only=True,
                 )
+        return fields
 
-        # Ensure base model metadata fields are read-only when present
-        for field_name in self.READ_ONLY_BASE_FIELDS:
-            if field_name in fields:
-                fields[field_name].read_only = True
 
-        for field_name in self.READ_ONLY_FK_FIELDS:
-            lookup_name = f"{field_name}_id"
-            if lookup_name in fields:
-                fields[lookup_name].read_only = True
-        return fields
+class ValuesTransform:
+    """
+    Turns rows of a queryset into the list serializer_class(queryset, many=True).data would give, with keys
+    camelized like CamelCaseJSONRenderer does, without model instances or serializer fields per row.
+    Columns are read with values_list(), and many-to-many ids with one query on the through model.
+    Only serializers of model fields, FK ids and many-to-many ids are supported, see get_values_transform.
+    """
+    # Fields whose values from the database are already what to_representation gives
+    PLAIN_FIELDS = (serializers.CharField, serializers.IntegerField, serializers.BooleanField)
+    # Fields whose values are converted with the field's to_representation
+    CONVERTED_FIELDS = (serializers.DateTimeField, serializers.DateField, serializers.TimeField,
+                        serializers.DecimalField, serializers.FloatField, serializers.UUIDField)
+    RELATED_IDS_CHUNK_SIZE = 1000
+
+    def __init__(self, serializer_class):
+        model = serializer_class.Meta.model
+        self.keys = []
+        self.columns = []
+        self.converters = []  # (key, serializer field)
+        self.many_related = []  # (key, many-to-many model field)
+        for field_name, field in serializer_class().fields.items():
+            if field.write_only:
+                continue
+            key = next(iter(camelize({field_name: None}, **camel_case_settings.JSON_UNDERSCOREIZE)))
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                raise ValueError(f"{serializer_class.__name__}.{field_name} is not a model field")
+
+            if isinstance(field, serializers.ManyRelatedField) and \
+                    isinstance(field.child_relation, serializers.PrimaryKeyRelatedField):
+                # The column holds the row's pk, and is replaced by the ids of the related rows
+                self.many_related.append((key, model_field))
+                column = 'pk'
+            elif not model_field.concrete or model_field.many_to_many:
+                raise ValueError(f"{serializer_class.__name__}.{field_name} is not supported")
+            elif isinstance(field, serializers.PrimaryKeyRelatedField) and field.pk_field is None:
+                column = model_field.attname
+            elif isinstance(field, self.PLAIN_FIELDS):
+                column = model_field.attname
+            elif isinstance(field, self.CONVERTED_FIELDS):
+                column = model_field.attname
+                self.converters.append((key, field))
+            else:
+                raise ValueError(f"{serializer_class.__name__}.{field_name} is not supported")
+            self.keys.append(key)
+            self.columns.append(column)
+
+    def to_representation(self, queryset):
+        # Prefetching is for model instances, many-to-many ids are fetched below
+        rows = queryset.prefetch_related(None).values_list(*self.columns)
+        items = [dict(zip(self.keys, row)) for row in rows]
+        for key, field in self.converters:
+            if isinstance(field, serializers.DateTimeField) and not hasattr(field, 'timezone'):
+                # Look up the current timezone once, instead of for every value
+                field = copy.copy(field)
+                field.timezone = field.default_timezone()
+            to_representation = field.to_representation
+            for item in items:
+                if item[key] is not None:
+                    item[key] = to_representation(item[key])
+        for key, model_field in self.many_related:
+            related_ids = self.get_related_ids(model_field, [item[key] for item in items])
+            for item in items:
+                item[key] = related_ids.get(item[key], [])
+        return items
+
+    def get_related_ids(self, model_field, pks):
+        """Return {pk: [ids of rows related to pk through model_field]}"""
+        through = model_field.remote_field.through
+        source = through._meta.get_field(model_field.m2m_field_name()).attname
+        target = through._meta.get_field(model_field.m2m_reverse_field_name()).attname
+        related_ids = {}
+        for start in range(0, len(pks), self.RELATED_IDS_CHUNK_SIZE):
+            chunk = pks[start:start + self.RELATED_IDS_CHUNK_SIZE]
+            pairs = through.objects.filter(**{f"{source}__in": chunk}).values_list(source, target)
+            for pk, related_id in pairs:
+                related_ids.setdefault(pk, []).append(related_id)
+        return related_ids
+
+
+_values_transforms = {}
+_related_lookups = {}
+
+
+def get_values_transform(serializer_class):
+    """Return the ValuesTransform of serializer_class, or None if it has fields the transform can not do"""
+    if serializer_class not in _values_transforms:
+        try:
+            _values_transforms[serializer_class] = ValuesTransform(serializer_class)
+        except ValueError:
+            _values_transforms[serializer_class] = None
+    return _values_transforms[serializer_class]
+
+
+def get_related_lookups(serializer_class):
+    """
+    Return (select_related, prefetch_related) lookups for the relations serializer_class reads:
+    foreign keys of nested serializers are selected, many-to-many ids and nested lists are prefetched
+    """
+    if serializer_class not in _related_lookups:
+        select_related, prefetch_related = [], []
+        _add_related_lookups(serializer_class(), '', select_related, prefetch_related, False)
+        _related_lookups[serializer_class] = (select_related, prefetch_related)
+    return _related_lookups[serializer_class]
+
+
+def _add_related_lookups(serializer, prefix, select_related, prefetch_related, in_prefetch):
+    model = serializer.Meta.model
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        try:
+            model_field = model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            continue  # e.g. properties and method fields
+        if not model_field.is_relation:
+            continue
+        lookup = prefix + field.source
+
+        if isinstance(field, serializers.ListSerializer):
+            prefetch_related.append(lookup)
+            _add_related_lookups(field.child, f"{lookup}__", select_related, prefetch_related, True)
+        elif isinstance(field, serializers.ModelSerializer):
+            # Relations below a prefetched relation can only be prefetched
+            (prefetch_related if in_prefetch else select_related).append(lookup)
+            _add_related_lookups(field, f"{lookup}__", select_related, prefetch_related, in_prefetch)
+        elif isinstance(field, serializers.ManyRelatedField):
+            prefetch_related.append(lookup)
 
 
 class SubjectSerializer(BaseModelSerializer):
@@ -149,13 +337,10 @@ class ObservationSerializer(BaseModelSerializer):
             if not goal.mastery_schema:
                 return attrs
 
-            schema_min, schema_max = goal.mastery_schema.get_value_range()
-            if schema_min is None or schema_max is None:
-                return attrs
-
-            if mastery_value < schema_min or mastery_value > schema_max:
+            compiled = goal.mastery_schema.get_compiled()
+            if not compiled.is_in_range(mastery_value):
                 raise serializers.ValidationError(
-                    {'mastery_value': f'Must be between {schema_min} and {schema_max}'}
+                    {'mastery_value': f'Must be between {compiled.min_value} and {compiled.max_value}'}
                 )
 
         return attrs
@@ -206,13 +391,10 @@ class StatusSerializer(BaseModelSerializer):
 
         if mastery_schema and mastery_value is not None:
 
-            schema_min, schema_max = mastery_schema.get_value_range()
-            if schema_min is None or schema_max is None:
-                return attrs
-
-            if mastery_value < schema_min or mastery_value > schema_max:
+            compiled = mastery_schema.get_compiled()
+            if not compiled.is_in_range(mastery_value):
                 raise serializers.ValidationError(
-                    {'mastery_value': f'Must be between {schema_min} and {schema_max}'}
+                    {'mastery_value': f'Must be between {compiled.min_value} and {compiled.max_value}'}
                 )
         return attrs
 
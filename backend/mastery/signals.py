@@ -0,0 +1,38 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from mastery.access_policies.scope import invalidate_principal_scopes
+from mastery.authentication import invalidate_cached_schools, invalidate_cached_user
+from mastery.models import Observation, ObservationSummary, School, User, UserGroup, UserSchool
+
+
+@receiver(post_save, sender=UserGroup)
+@receiver(post_delete, sender=UserGroup)
+@receiver(post_save, sender=UserSchool)
+@receiver(post_delete, sender=UserSchool)
+def membership_changed(sender, instance, **kwargs):
+    """Memberships decide what a user can access, make the user's cached access scope stale"""
+    invalidate_principal_scopes(user_ids=[instance.user_id])
+
+
+@receiver(post_save, sender=Observation)
+@receiver(post_delete, sender=Observation)
+def observation_changed(sender, instance, signal, **kwargs):
+    """Keep the summary of the observation's student and goal up to date"""
+    if signal is post_delete and instance.deleted_at:
+        # Summaries leave out soft-deleted observations already, e.g. those the cleaner bot hard deletes
+        return
+    ObservationSummary.refresh(instance.get_summary_keys())
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    """The cached user of sessions is stale"""
+    invalidate_cached_user(instance.id)
+
+
+@receiver(post_save, sender=School)
+@receiver(post_delete, sender=School)
+def school_changed(sender, instance, **kwargs):
+    """The cached schools of logins are stale"""
+    invalidate_cached_schools([instance.org_number])
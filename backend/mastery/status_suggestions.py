@@ -0,0 +1,178 @@
+from datetime import datetime, time
+from itertools import groupby
+import statistics
+from django.utils import timezone
+from mastery import models
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Defaults of the options the strategies take
+HALF_LIFE_DAYS = 30
+LAST_N = 3
+
+
+def recency_weighted_mean(points, end_at, half_life_days=HALF_LIFE_DAYS, **options):
+    """Mean where an observation counts half as much for every half_life_days it is older than end_at"""
+    weights = [0.5 ** (max((end_at - observed_at).total_seconds(), 0) / 86400 / half_life_days)
+               for observed_at, _ in points]
+    return sum(weight * value for weight, (_, value) in zip(weights, points)) / sum(weights)
+
+
+def last_n_median(points, end_at, last_n=LAST_N, **options):
+    """Median of the last_n latest observations"""
+    return statistics.median(value for _, value in points[-last_n:])
+
+
+def trend(points, end_at, **options):
+    """The value at end_at of the least squares line through the observations, the mean if it has no slope"""
+    days = [(observed_at - end_at).total_seconds() / 86400 for observed_at, _ in points]
+    values = [value for _, value in points]
+    mean_day = statistics.fmean(days)
+    mean_value = statistics.fmean(values)
+    spread = sum((day - mean_day) ** 2 for day in days)
+    if not spread:
+        return mean_value
+    slope = sum((day - mean_day) * (value - mean_value) for day, value in zip(days, values)) / spread
+    # end_at is day 0
+    return mean_value - slope * mean_day
+
+
+STRATEGIES = {
+    "recency_weighted_mean": recency_weighted_mean,
+    "last_n_median": last_n_median,
+    "trend": trend,
+}
+DEFAULT_STRATEGY = "recency_weighted_mean"
+
+
+def parse_period_limit(value, is_end=False):
+    """
+    Parse begin_at or end_at in ISO format, a date or a date and time. A date as end_at means the end of
+    that day. Raises ValueError if value is not valid.
+    """
+    parsed = datetime.fromisoformat(value)
+    if is_end and len(value) == 10:
+        parsed = datetime.combine(parsed.date(), time.max)
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+def rescale(value, value_range, target_range):
+    """Move value from value_range onto target_range, e.g. from a 1-4 schema to a 1-100 schema"""
+    if None in value_range or None in target_range or value_range == target_range:
+        return value
+    (low, high), (target_low, target_high) = value_range, target_range
+    if high == low:
+        return value
+    return target_low + (value - low) * (target_high - target_low) / (high - low)
+
+
+def suggest_statuses(observations, student_ids, begin_at, end_at, strategy=DEFAULT_STRATEGY,
+                     mastery_schema=None, options=None, ranges=None):
+    """
+    Suggest a mastery_value for each of student_ids, from their observations between begin_at and end_at.
+    observations is a queryset, e.g. the observations on goals in a subject which the requester can see.
+    All students are handled with two queries. Values of observations on goals with another mastery schema
+    than mastery_schema are rescaled to its range, and suggestions are rounded and kept within it.
+    ranges, {schema_id: (low, high)} of the schemas, saves reading them for each call.
+
+    Returns {student_id: {"mastery_value": ..., "observation_count": ...}}, mastery_value is None for
+    students without observations.
+    """
+    aggregate = STRATEGIES[strategy]
+    options = options or {}
+    rows = observations.filter(
+        student_id__in=student_ids,
+        observed_at__gte=begin_at,
+        observed_at__lte=end_at,
+        deleted_at__isnull=True,
+        mastery_value__isnull=False,
+    ).order_by('student_id', 'observed_at').values_list(
+        'student_id', 'observed_at', 'mastery_value', 'goal__mastery_schema_id')
+    rows = list(rows)
+
+    if ranges is None:
+        schema_ids = {schema_id for *_, schema_id in rows if schema_id}
+        ranges = get_value_ranges(models.MasterySchema.objects.filter(id__in=schema_ids))
+    target_range = mastery_schema.get_value_range() if mastery_schema else (None, None)
+
+    suggestions = {student_id: {"mastery_value": None, "observation_count": 0} for student_id in student_ids}
+    for student_id, student_rows in groupby(rows, key=lambda row: row[0]):
+        points = [
+            (observed_at, rescale(value, ranges.get(schema_id, (None, None)), target_range))
+            for _, observed_at, value, schema_id in student_rows
+        ]
+        value = round(aggregate(points, end_at, **options))
+        low, high = target_range
+        if low is not None and high is not None:
+            value = min(max(value, low), high)
+        suggestions[student_id] = {"mastery_value": value, "observation_count": len(points)}
+    return suggestions
+
+
+def get_value_ranges(mastery_schemas):
+    """Return {schema_id: (low, high)} of mastery_schemas"""
+    return {schema.id: schema.get_value_range() for schema in mastery_schemas}
+
+
+def suggest_statuses_for_school(org_number, options):
+    """
+    Background job: suggest statuses for the students of all teaching groups with a subject at the school,
+    for the period and strategy in options. The suggestions are the result of the task, by group and student.
+    """
+    school = models.School.objects.filter(org_number=org_number).first()
+    if not school:
+        raise Exception(f"School with org number {org_number} not found in database.")
+    strategy = options.get("strategy") or DEFAULT_STRATEGY
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown strategy '{strategy}'")
+    begin_at = parse_period_limit(options["begin_at"])
+    end_at = parse_period_limit(options["end_at"], is_end=True)
+    mastery_schema = models.MasterySchema.objects.filter(school=school, is_default=True).first()
+    strategy_options = {name: options[name] for name in ("half_life_days", "last_n") if options.get(name)}
+
+    groups = models.Group.objects.filter(
+        school=school, type="teaching", subject__isnull=False, deleted_at__isnull=True, is_enabled=True
+    ).within_validity_period()
+    subject_id_by_group_id = dict(groups.values_list("id", "subject_id"))
+    # Students of all groups in one query, then one observation query for each subject over its students
+    student_ids_by_group_id = {group_id: [] for group_id in subject_id_by_group_id}
+    for group_id, user_id in models.UserGroup.objects.filter(
+            group_id__in=subject_id_by_group_id, role__name="student", deleted_at__isnull=True
+    ).values_list("group_id", "user_id"):
+        student_ids_by_group_id[group_id].append(user_id)
+    student_ids_by_subject_id = {}
+    for group_id, student_ids in student_ids_by_group_id.items():
+        student_ids_by_subject_id.setdefault(subject_id_by_group_id[group_id], set()).update(student_ids)
+
+    ranges = get_value_ranges(models.MasterySchema.objects.all())
+    suggestions_by_subject_id = {
+        subject_id: suggest_statuses(
+            models.Observation.objects.filter(subject_id=subject_id), student_ids, begin_at, end_at,
+            strategy, mastery_schema, strategy_options, ranges)
+        for subject_id, student_ids in student_ids_by_subject_id.items()
+    }
+    suggestions = {
+        group_id: {
+            "subject_id": subject_id_by_group_id[group_id],
+            "students": {student_id: suggestions_by_subject_id[subject_id_by_group_id[group_id]][student_id]
+                         for student_id in student_ids},
+        }
+        for group_id, student_ids in student_ids_by_group_id.items()
+    }
+    logger.debug("Suggested statuses for %s groups at %s", len(suggestions), org_number)
+
+    yield {
+        "result": {
+            "entity": "status",
+            "action": "suggest_statuses",
+            "errors": [],
+            "strategy": strategy,
+            "begin_at": begin_at.isoformat(),
+            "end_at": end_at.isoformat(),
+            "suggestions": suggestions,
+        },
+        "is_done": True,
+    }
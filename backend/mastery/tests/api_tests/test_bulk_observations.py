@@ -0,0 +1,118 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from mastery.models import Observation, User
+
+
+def add_students(group, student_role, count):
+    first = User.objects.count()
+    students = [User.objects.create(name=f"Elev {index}", feide_id=f"elev-{index}@example.com")
+                for index in range(first, first + count)]
+    for student in students:
+        group.add_member(student, student_role)
+    return students
+
+
+def scores_for(goal, students, mastery_value=50):
+    return [{"goal_id": goal.id, "student_id": student.id, "mastery_value": mastery_value}
+            for student in students]
+
+
+@pytest.mark.django_db
+def test_teacher_scores_class(teacher, goal_with_group, student_role, mastery_schema):
+    goal_with_group.mastery_schema = mastery_schema
+    goal_with_group.save()
+    client = APIClient()
+    client.force_authenticate(user=teacher)
+    students = add_students(goal_with_group.group, student_role, 12)
+
+    resp = client.post('/api/observations/bulk/', scores_for(goal_with_group, students[:2]), format='json')
+    assert resp.status_code == 201
+    with CaptureQueriesContext(connection) as few:
+        resp = client.post('/api/observations/bulk/', scores_for(goal_with_group, students[:3]),
+                           format='json')
+    assert resp.status_code == 201
+    with CaptureQueriesContext(connection) as many:
+        resp = client.post('/api/observations/bulk/', scores_for(goal_with_group, students), format='json')
+    assert resp.status_code == 201
+    # Same number of queries for any number of students
+    assert len(many) == len(few)
+
+    data = resp.json()
+    assert [observation['studentId'] for observation in data] == [student.id for student in students]
+    assert all(observation['createdById'] == teacher.id for observation in data)
+    assert Observation.objects.filter(goal=goal_with_group).count() == 2 + 3 + 12
+    subject_id = goal_with_group.group.subject_id
+    assert Observation.objects.filter(goal=goal_with_group, subject_id=subject_id).count() == 17
+
+
+@pytest.mark.django_db
+def test_invalid_observation_saves_nothing(teacher, student, goal_with_group, mastery_schema):
+    goal_with_group.mastery_schema = mastery_schema
+    goal_with_group.save()
+    client = APIClient()
+    client.force_authenticate(user=teacher)
+    items = scores_for(goal_with_group, [student]) + scores_for(goal_with_group, [student], 101) + [
+        {"goal_id": goal_with_group.id, "student_id": "no-such-user"}]
+    resp = client.post('/api/observations/bulk/', items, format='json')
+    assert resp.status_code == 400
+    errors = resp.json()
+    assert errors[0] == {}
+    assert 'masteryValue' in errors[1]
+    assert 'studentId' in errors[2]
+    assert not Observation.objects.exists()
+
+    resp = client.post('/api/observations/bulk/', {"goal_id": goal_with_group.id}, format='json')
+    assert resp.status_code == 400
+
+
+@pytest.mark.django_db
+def test_observations_are_authorized(teacher, other_teacher, student, goal_with_group, goal_individual):
+    client = APIClient()
+    client.force_authenticate(user=other_teacher)
+    resp = client.post('/api/observations/bulk/', scores_for(goal_with_group, [student]), format='json')
+    assert resp.status_code == 403
+
+    # The teacher teaches the group, but not the subject of the individual goal
+    client.force_authenticate(user=teacher)
+    items = scores_for(goal_with_group, [student]) + scores_for(goal_individual, [student])
+    resp = client.post('/api/observations/bulk/', items, format='json')
+    assert resp.status_code == 403
+    assert resp.json()[0] == {}
+    assert 'nonFieldErrors' in resp.json()[1]
+    assert not Observation.objects.exists()
+
+
+@pytest.mark.django_db
+def test_update_and_create(teacher, student, other_student, goal_with_group, student_role):
+    goal_with_group.group.add_member(other_student, student_role)
+    own = Observation.objects.create(
+        student=student, goal=goal_with_group, mastery_value=10, created_by=teacher)
+    others = Observation.objects.create(student=student, goal=goal_with_group, mastery_value=10)
+    client = APIClient()
+    client.force_authenticate(user=teacher)
+
+    items = [{"id": own.id, "mastery_value": 20}] + scores_for(goal_with_group, [other_student])
+    resp = client.post('/api/observations/bulk/', items, format='json')
+    assert resp.status_code == 201
+    own.refresh_from_db()
+    assert own.mastery_value == 20
+    assert own.updated_by == teacher
+    assert resp.json()[0]['id'] == own.id
+
+    # Teachers can only change observations they created
+    resp = client.post('/api/observations/bulk/', [{"id": others.id, "mastery_value": 20}], format='json')
+    assert resp.status_code == 403
+    resp = client.post('/api/observations/bulk/', [{"id": "no-such-observation"}], format='json')
+    assert resp.status_code == 400
+
+
+@pytest.mark.django_db
+def test_student_observations_are_visible(student, goal_with_group):
+    client = APIClient()
+    client.force_authenticate(user=student)
+    items = [{"goal_id": goal_with_group.id, "student_id": student.id, "is_visible_to_student": False}]
+    resp = client.post('/api/observations/bulk/', items, format='json')
+    assert resp.status_code == 201
+    assert Observation.objects.get().is_visible_to_student
@@ -0,0 +1,87 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from mastery.models import Goal, VersionStamp
+
+
+@pytest.mark.django_db
+def test_unchanged_list_is_not_modified(teacher, school, goal_with_group):
+    client = APIClient()
+    client.force_authenticate(user=teacher)
+    params = {'school': school.id, 'group': goal_with_group.group.id}
+    resp = client.get('/api/goals/', params)
+    assert resp.status_code == 200
+    etag = resp['ETag']
+    assert etag.startswith('W/"')
+
+    with CaptureQueriesContext(connection) as queries:
+        resp = client.get('/api/goals/', params, HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 304
+    assert resp['ETag'] == etag
+    assert not resp.content
+    # Answered from the version stamps, without the list query
+    assert not [query for query in queries if 'FROM "mastery_goal"' in query['sql']]
+
+    # Other parameters and other users get other ETags
+    assert client.get('/api/goals/', {'school': school.id}, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+
+@pytest.mark.django_db
+def test_changes_give_new_etag(superadmin, school, goal_with_group, other_school):
+    client = APIClient()
+    client.force_authenticate(user=superadmin)
+    params = {'school': school.id}
+    etag = client.get('/api/goals/', params)['ETag']
+    other_etag = client.get('/api/goals/', {'school': other_school.id})['ETag']
+
+    resp = client.patch(f'/api/goals/{goal_with_group.id}/', {'title': 'Nytt navn'}, format='json')
+    assert resp.status_code == 200
+    resp = client.get('/api/goals/', params, HTTP_IF_NONE_MATCH=etag)
+    assert resp.status_code == 200
+    assert resp.json()[0]['title'] == 'Nytt navn'
+    # Goals at other schools are unchanged
+    assert client.get('/api/goals/', {'school': other_school.id},
+                      HTTP_IF_NONE_MATCH=other_etag).status_code == 304
+
+    etag = resp['ETag']
+    resp = client.delete(f'/api/goals/{goal_with_group.id}/')
+    assert resp.status_code == 204
+    assert client.get('/api/goals/', params, HTTP_IF_NONE_MATCH=etag).status_code == 200
+
+
+@pytest.mark.django_db
+def test_version_stamps(school, other_school):
+    VersionStamp.bump(['goal'], [school.id])
+    VersionStamp.bump(['goal'])
+    versions = VersionStamp.get_versions(['goal'], {school.id})
+    assert sorted(school_key for _, school_key, _, _ in versions) == sorted([school.id, VersionStamp.SHARED])
+
+    # A change at another school only bumps the stamp of that school
+    all_schools = VersionStamp.get_versions(['goal'])
+    VersionStamp.bump(['goal'], [other_school.id])
+    assert VersionStamp.get_versions(['goal'], {school.id}) == versions
+    assert VersionStamp.get_versions(['goal']) != all_schools
+    assert VersionStamp.objects.count() == 3
+
+
+@pytest.mark.django_db
+def test_detail_and_list_without_school_use_their_schools(
+        superadmin, school, other_school, other_student, observation_on_group_goal):
+    client = APIClient()
+    client.force_authenticate(user=superadmin)
+    goal = observation_on_group_goal.goal
+    other_goal = Goal.objects.create(title="Skrive", student=other_student, school=other_school)
+    detail_url = f'/api/goals/{goal.id}/'
+    list_params = {'student': observation_on_group_goal.student_id}
+    detail_etag = client.get(detail_url)['ETag']
+    list_etag = client.get('/api/observations/', list_params)['ETag']
+
+    # Writes at other schools do not change the ETags
+    assert client.patch(f'/api/goals/{other_goal.id}/', {'title': 'Lese'}, format='json').status_code == 200
+    assert client.get(detail_url, HTTP_IF_NONE_MATCH=detail_etag).status_code == 304
+    assert client.get('/api/observations/', list_params, HTTP_IF_NONE_MATCH=list_etag).status_code == 304
+
+    assert client.patch(detail_url, {'title': 'Nytt navn'}, format='json').status_code == 200
+    assert client.get(detail_url, HTTP_IF_NONE_MATCH=detail_etag).status_code == 200
+    assert client.get('/api/observations/', list_params, HTTP_IF_NONE_MATCH=list_etag).status_code == 200
@@ -0,0 +1,86 @@
+import csv
+import io
+import pytest
+from django.utils import timezone
+from openpyxl import load_workbook
+from rest_framework.test import APIClient
+from mastery import exports
+from mastery.models import Goal, Observation, Status
+
+
+def get_export(user, resource, params):
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client.get(f'/api/{resource}/export/', params)
+
+
+def read_csv(resp):
+    assert resp.status_code == 200
+    assert resp.streaming
+    content = b''.join(resp.streaming_content).decode('utf-8-sig')
+    return list(csv.DictReader(io.StringIO(content)))
+
+
+@pytest.mark.django_db
+def test_export_observations(
+        school_admin, school, student, goal_with_group, goal_individual, monkeypatch):
+    # Several chunks
+    monkeypatch.setattr(exports, 'CHUNK_SIZE', 100)
+    now = timezone.now()
+    for index in range(5):
+        Observation.objects.create(student=student, goal=goal_with_group, mastery_value=index,
+                                   observed_at=now, feedforward='=HYPERLINK("http://example.com")')
+    Observation.objects.create(student=student, goal=goal_individual, mastery_value=9,
+                               observed_at=now - timezone.timedelta(days=40))
+
+    resp = get_export(school_admin, 'observations', {'school': school.id})
+    assert resp['Content-Disposition'].startswith('attachment; filename="observation-')
+    rows = read_csv(resp)
+    assert len(rows) == 6
+    assert rows[0]['student'] == student.name
+    # Text is never a formula
+    assert rows[-1]['feedforward'] == '\'=HYPERLINK("http://example.com")'
+
+    since = (now - timezone.timedelta(days=1)).date().isoformat()
+    rows = read_csv(get_export(school_admin, 'observations', {'school': school.id, 'from': since}))
+    assert sorted(int(row['mastery_value']) for row in rows) == [0, 1, 2, 3, 4]
+    # The group has no subject: all observations of its students
+    rows = read_csv(get_export(school_admin, 'observations', {
+        'school': school.id, 'group': goal_with_group.group_id}))
+    assert len(rows) == 6
+
+
+@pytest.mark.django_db
+def test_export_xlsx(school_inspector, school, student, goal_with_group, subject_owned_by_school):
+    Goal.objects.create(school=school, student=student, subject=subject_owned_by_school, title='=1+1')
+    resp = get_export(school_inspector, 'goals', {'school': school.id, 'file_format': 'xlsx'})
+    assert resp.status_code == 200
+    assert resp['Content-Type'] == exports.XLSX_CONTENT_TYPE
+    workbook = load_workbook(io.BytesIO(b''.join(resp.streaming_content)), read_only=True)
+    rows = list(workbook.active.values)
+    assert rows[0][:2] == ('id', 'title')
+    assert sorted(row[1] for row in rows[1:]) == ['=1+1', goal_with_group.title]
+    resp = get_export(school_inspector, 'goals', {'school': school.id, 'subject': subject_owned_by_school.id})
+    assert [row['title'] for row in read_csv(resp)] == ["'=1+1"]
+
+
+@pytest.mark.django_db
+def test_export_statuses_in_period(school_admin, school, student, subject_owned_by_school):
+    now = timezone.now()
+    for days in (0, 200):
+        Status.objects.create(student=student, subject=subject_owned_by_school, school=school,
+                              mastery_value=days, begin_at=now - timezone.timedelta(days=days + 30),
+                              end_at=now - timezone.timedelta(days=days))
+    since = (now - timezone.timedelta(days=100)).date().isoformat()
+    rows = read_csv(get_export(school_admin, 'status', {'school': school.id, 'from': since}))
+    assert [row['mastery_value'] for row in rows] == ['0']
+
+
+@pytest.mark.django_db
+def test_export_access(teacher, school_admin, other_school, school, observation_on_group_goal):
+    assert get_export(teacher, 'observations', {'school': school.id}).status_code == 403
+    assert get_export(school_admin, 'observations', {}).status_code == 400
+    params = {'school': school.id, 'file_format': 'pdf'}
+    assert get_export(school_admin, 'observations', params).status_code == 400
+    # Only what the access policy gives
+    assert read_csv(get_export(school_admin, 'observations', {'school': other_school.id})) == []
@@ -0,0 +1,81 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from mastery.models import Goal, Observation
+
+
+def get_matrix(user, group, params=None):
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client.get(f'/api/groups/{group.id}/mastery-matrix/', params or {})
+
+
+@pytest.fixture
+def matrix_group(teaching_group_with_members, subject_owned_by_school, other_student, student_role):
+    teaching_group_with_members.subject = subject_owned_by_school
+    teaching_group_with_members.save()
+    teaching_group_with_members.add_member(other_student, student_role)
+    return teaching_group_with_members
+
+
+@pytest.mark.django_db
+def test_latest_observation_for_each_student_and_goal(
+        teacher, student, other_student, matrix_group, goal_with_group, goal_individual):
+    now = timezone.now()
+    for days_ago, value in [(3, 10), (1, 40), (2, 20)]:
+        Observation.objects.create(student=student, goal=goal_with_group, mastery_value=value,
+                                   observed_at=now - timezone.timedelta(days=days_ago))
+    # Without observed_at, an observation is older than all with one
+    Observation.objects.create(student=student, goal=goal_with_group, mastery_value=99)
+    Observation.objects.create(student=other_student, goal=goal_with_group, mastery_value=99,
+                               observed_at=now, deleted_at=now)
+    Observation.objects.create(student=student, goal=goal_individual, mastery_value=70, observed_at=now)
+
+    resp = get_matrix(teacher, matrix_group)
+    assert resp.status_code == 200
+    data = resp.json()
+    assert [s['id'] for s in data['students']] == [student.id, other_student.id]
+    assert [goal['id'] for goal in data['goals']] == [goal_with_group.id, goal_individual.id]
+    assert data['goals'][1]['studentId'] == student.id
+    assert data['values'] == [[40, 70], [None, None]]
+
+
+@pytest.mark.django_db
+def test_query_count_does_not_grow_with_group(
+        teacher, school, student, matrix_group, goal_with_group, subject_owned_by_school):
+    # The first request also looks up the teacher's access scope
+    get_matrix(teacher, matrix_group)
+    with CaptureQueriesContext(connection) as queries:
+        assert get_matrix(teacher, matrix_group).status_code == 200
+    query_count = len(queries)
+
+    for index in range(5):
+        goal = Goal.objects.create(school=school, student=student, subject=subject_owned_by_school,
+                                   title=f"Mål {index}", sort_order=index)
+        for _ in range(3):
+            Observation.objects.create(student=student, goal=goal, mastery_value=index)
+    with CaptureQueriesContext(connection) as queries:
+        resp = get_matrix(teacher, matrix_group)
+    assert len(queries) == query_count
+    assert resp.json()['values'][0][1:] == [0, 1, 2, 3, 4]
+
+
+@pytest.mark.django_db
+def test_subject_parameter_selects_individual_goals(
+        superadmin, school, student, matrix_group, goal_with_group, goal_individual,
+        subject_owned_by_other_school):
+    other_goal = Goal.objects.create(school=school, student=student, subject=subject_owned_by_other_school)
+    resp = get_matrix(superadmin, matrix_group, {'subject': subject_owned_by_other_school.id})
+    assert [goal['id'] for goal in resp.json()['goals']] == [goal_with_group.id, other_goal.id]
+
+
+@pytest.mark.django_db
+def test_matrix_access(student, other_teacher, teacher_role, other_teaching_group, matrix_group,
+                       observation_on_group_goal):
+    # Students may not see the values of classmates
+    assert get_matrix(student, matrix_group).status_code == 403
+    # Teachers only see groups they can reach
+    other_teaching_group.add_member(other_teacher, teacher_role)
+    assert get_matrix(other_teacher, matrix_group).status_code == 404
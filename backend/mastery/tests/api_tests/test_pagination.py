@@ -0,0 +1,86 @@
+import pytest
+from django.utils import timezone
+from rest_framework.test import APIClient
+from mastery.models import Goal, Observation
+
+
+def walk_pages(client, url, params):
+    """Follow next links from the first page, return the ids of all results and the number of pages"""
+    ids = []
+    pages = 0
+    resp = client.get(url, params)
+    while True:
+        assert resp.status_code == 200
+        data = resp.json()
+        ids.extend(item['id'] for item in data['results'])
+        pages += 1
+        if not data['next']:
+            return ids, pages
+        resp = client.get(data['next'])
+
+
+@pytest.fixture
+def many_observations(db, student, goal_with_group):
+    now = timezone.now()
+    observations = []
+    # Some share observed_at and some have none, to exercise the tie breaker and null handling
+    for index in range(7):
+        observed_at = None if index % 3 == 0 else now - timezone.timedelta(days=index % 2)
+        observations.append(Observation.objects.create(
+            student=student, goal=goal_with_group, observed_at=observed_at))
+    return observations
+
+
+@pytest.mark.django_db
+def test_lists_are_unpaginated_by_default(superadmin, many_observations, student):
+    client = APIClient()
+    client.force_authenticate(user=superadmin)
+    resp = client.get('/api/observations/', {'student': student.id})
+    assert resp.status_code == 200
+    assert len(resp.json()) == len(many_observations)
+
+
+@pytest.mark.django_db
+def test_observation_pages(superadmin, many_observations, student):
+    client = APIClient()
+    client.force_authenticate(user=superadmin)
+    unpaginated = client.get('/api/observations/', {'student': student.id}).json()
+
+    ids, pages = walk_pages(client, '/api/observations/', {'student': student.id, 'limit': 3})
+    assert pages == 3
+    assert sorted(ids) == sorted(observation['id'] for observation in unpaginated)
+    # Ordered by observed_at with nulls last, then by id
+    expected = sorted(many_observations, key=lambda o: (o.observed_at is None, o.observed_at or 0, o.id))
+    assert ids == [observation.id for observation in expected]
+
+
+@pytest.mark.django_db
+def test_goal_pages_follow_requested_ordering(superadmin, school, subject_owned_by_school, student):
+    for index in range(5):
+        Goal.objects.create(school=school, student=student, subject=subject_owned_by_school,
+                            title=f"Mål {index % 2}", sort_order=index)
+    client = APIClient()
+    client.force_authenticate(user=superadmin)
+    params = {'school': school.id, 'ordering': '-title', 'limit': 2}
+    ids, pages = walk_pages(client, '/api/goals/', params)
+    assert pages == 3
+    goals = sorted(Goal.objects.filter(school=school), key=lambda goal: goal.id)
+    expected = sorted(goals, key=lambda goal: goal.title, reverse=True)
+    assert ids == [goal.id for goal in expected]
+
+
+@pytest.mark.django_db
+def test_invalid_cursor(superadmin, school, many_observations, student):
+    client = APIClient()
+    client.force_authenticate(user=superadmin)
+    resp = client.get('/api/observations/', {'student': student.id, 'cursor': 'not-a-cursor'})
+    assert resp.status_code == 400
+
+    # A cursor only fits the ordering it was made for
+    first_page = client.get('/api/observations/', {'student': student.id, 'limit': 1}).json()
+    assert first_page['nextCursor']
+    resp = client.get('/api/goals/', {'school': school.id, 'cursor': first_page['nextCursor']})
+    assert resp.status_code == 400
+
+    resp = client.get('/api/observations/', {'student': student.id, 'limit': 0})
+    assert resp.status_code == 400
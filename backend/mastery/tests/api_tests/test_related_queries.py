@@ -0,0 +1,45 @@
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from mastery import serializers
+from mastery.models import User
+
+
+def add_students(group, school, student_role, count):
+    first = User.objects.count()
+    for index in range(first, first + count):
+        user = User.objects.create(name=f"Elev {index}", feide_id=f"elev-{index}@example.com")
+        group.add_member(user, student_role)
+        school.set_employed_user(user, student_role)
+
+
+def count_list_queries(client, url, params):
+    cache.clear()
+    with CaptureQueriesContext(connection) as queries:
+        resp = client.get(url, params)
+    assert resp.status_code == 200
+    return len(resp.json()), len(queries)
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('url', ['/api/user-groups/', '/api/user-schools/'])
+def test_nested_lists_use_constant_number_of_queries(url, superadmin, school, teaching_group_with_members,
+                                                     student_role):
+    client = APIClient()
+    client.force_authenticate(user=superadmin)
+    params = {'school': school.id}
+    add_students(teaching_group_with_members, school, student_role, 2)
+    few_rows, few_queries = count_list_queries(client, url, params)
+    add_students(teaching_group_with_members, school, student_role, 10)
+    many_rows, many_queries = count_list_queries(client, url, params)
+    assert many_rows > few_rows
+    assert many_queries == few_queries
+
+
+def test_related_lookups():
+    assert serializers.get_related_lookups(serializers.NestedUserGroupSerializer) == (
+        ['user', 'group', 'role'], ['user__groups', 'user__schools'])
+    assert serializers.get_related_lookups(serializers.UserSerializer) == ([], ['groups', 'schools'])
+    assert serializers.get_related_lookups(serializers.ObservationSerializer) == ([], [])
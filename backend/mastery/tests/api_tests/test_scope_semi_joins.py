@@ -0,0 +1,43 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from mastery.models import Group, Observation
+
+
+@pytest.fixture
+def student_in_many_groups(school, basis_group, teaching_group_with_members, student, teacher,
+                           student_role, teacher_role, subject_owned_by_school):
+    """Student and teacher share a basis group and several teaching groups, which repeat rows in joins"""
+    basis_group.add_member(student, student_role)
+    basis_group.add_member(teacher, teacher_role)
+    for index in range(3):
+        group = Group.objects.create(
+            feide_id=f"fc:group:extra-{index}", display_name=f"Ekstra {index}", type="teaching",
+            school=school, subject=subject_owned_by_school)
+        group.add_member(student, student_role)
+        group.add_member(teacher, teacher_role)
+    return student
+
+
+@pytest.mark.django_db
+def test_lists_have_no_repeated_rows_and_no_distinct(teacher, school, student_in_many_groups,
+                                                     goal_with_group, observation_on_group_goal):
+    Observation.objects.create(student=student_in_many_groups, goal=goal_with_group)
+    client = APIClient()
+    client.force_authenticate(user=teacher)
+    requests = [
+        ('/api/observations/', {'student': student_in_many_groups.id}),
+        ('/api/goals/', {'school': school.id, 'student': student_in_many_groups.id}),
+        ('/api/users/', {'school': school.id}),
+        ('/api/groups/', {'school': school.id, 'user': student_in_many_groups.id}),
+        ('/api/subjects/', {'school': school.id}),
+    ]
+    for url, params in requests:
+        with CaptureQueriesContext(connection) as queries:
+            resp = client.get(url, params)
+        assert resp.status_code == 200, url
+        ids = [item['id'] for item in resp.json()]
+        assert ids, url
+        assert len(ids) == len(set(ids)), url
+        assert not [query for query in queries if 'DISTINCT' in query['sql']], url
@@ -0,0 +1,50 @@
+import pytest
+from django.utils import timezone
+from rest_framework.test import APIClient
+from mastery.models import Observation
+
+
+def get_suggestions(user, group, params):
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client.get(f'/api/groups/{group.id}/status-suggestions/', params)
+
+
+@pytest.fixture
+def subject_group(teaching_group_with_members, subject_owned_by_school):
+    teaching_group_with_members.subject = subject_owned_by_school
+    teaching_group_with_members.save()
+    return teaching_group_with_members
+
+
+@pytest.mark.django_db
+def test_suggestions_for_group(
+        teacher, student, subject_group, goal_with_group, goal_individual, mastery_schema):
+    now = timezone.now()
+    # On a group goal and an individual goal in the subject
+    Observation.objects.create(student=student, goal=goal_with_group, mastery_value=20,
+                               observed_at=now - timezone.timedelta(days=2))
+    Observation.objects.create(student=student, goal=goal_individual, mastery_value=60,
+                               observed_at=now - timezone.timedelta(days=1))
+    begin_at = now - timezone.timedelta(days=30)
+    params = {'begin_at': begin_at.date().isoformat(), 'end_at': now.date().isoformat(),
+              'strategy': 'last_n_median', 'mastery_schema': mastery_schema.id}
+    resp = get_suggestions(teacher, subject_group, params)
+    assert resp.status_code == 200
+    [suggestion] = resp.json()
+    assert suggestion['studentId'] == student.id
+    assert suggestion['subjectId'] == subject_group.subject_id
+    assert suggestion['masteryValue'] == 40
+    assert suggestion['observationCount'] == 2
+
+
+@pytest.mark.django_db
+def test_suggestion_parameters(teacher, student, subject_group):
+    resp = get_suggestions(teacher, subject_group, {'end_at': '2026-06-30'})
+    assert resp.status_code == 400
+    assert resp.json()['error'] == 'missing-parameter'
+    params = {'begin_at': '2026-01-01', 'end_at': '2026-06-30'}
+    assert get_suggestions(teacher, subject_group, {**params, 'strategy': 'mode'}).status_code == 400
+    assert get_suggestions(teacher, subject_group, {**params, 'last_n': '0'}).status_code == 400
+    assert get_suggestions(teacher, subject_group, {**params, 'begin_at': '1. januar'}).status_code == 400
+    assert get_suggestions(student, subject_group, params).status_code == 403
@@ -0,0 +1,57 @@
+import pytest
+from django.utils import timezone
+from djangorestframework_camel_case.render import CamelCaseJSONRenderer
+from rest_framework.test import APIClient
+from mastery import models, serializers, renderers
+
+
+def render_with_serializer(serializer_class, queryset):
+    """What the list responses were before the fast path"""
+    return CamelCaseJSONRenderer().render(serializer_class(queryset, many=True).data)
+
+
+@pytest.fixture
+def observations(student, teacher, goal_with_group):
+    now = timezone.now()
+    return [
+        models.Observation.objects.create(
+            student=student, goal=goal_with_group, observer=teacher, mastery_value=index * 10,
+            feedforward="Øv mer på brøk\u2028\"neste\" gang\n\t/\x01",
+            observed_at=now.replace(microsecond=index))
+        for index in range(3)
+    ] + [models.Observation.objects.create(student=student, goal=goal_with_group)]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('use_orjson', [True, False])
+def test_observation_list_is_same_as_serializer(monkeypatch, use_orjson, superadmin, student, observations):
+    if not use_orjson:
+        monkeypatch.setattr(renderers, 'orjson', None)
+    client = APIClient()
+    client.force_authenticate(user=superadmin)
+    resp = client.get('/api/observations/', {'student': student.id})
+    assert resp.status_code == 200
+    assert resp['Content-Type'] == 'application/json'
+    queryset = models.Observation.objects.filter(student=student).order_by('observed_at')
+    assert resp.content == render_with_serializer(serializers.ObservationSerializer, queryset)
+
+
+@pytest.mark.django_db
+def test_user_list_is_same_as_serializer(superadmin, school, teacher, teaching_group_with_members):
+    client = APIClient()
+    client.force_authenticate(user=superadmin)
+    resp = client.get('/api/users/', {'school': school.id})
+    assert resp.status_code == 200
+    users = resp.json()
+    assert {user['id'] for user in users} >= {teacher.id}
+    assert any(user['groupIds'] for user in users)
+    queryset = models.User.objects.filter(id__in=[user['id'] for user in users]).order_by('name')
+    assert resp.content == render_with_serializer(serializers.UserSerializer, queryset)
+
+
+def test_transforms():
+    assert serializers.get_values_transform(serializers.ObservationSerializer).keys[:2] == ['id', 'createdAt']
+    assert serializers.get_values_transform(serializers.StatusSerializer)
+    # Not supported: a property (isIndividual) and JSON with keys to camelize (config)
+    assert serializers.get_values_transform(serializers.GoalSerializer) is None
+    assert serializers.get_values_transform(serializers.MasterySchemaSerializer) is None
@@ -11,3 +11,8 @@ DATABASES = {
 PASSWORD_HASHERS = [
     'django.contrib.auth.hashers.MD5PasswordHasher',
 ]
+
+# Tests run in one process, so the in-memory cache sees all invalidations
+PRINCIPAL_SCOPE_CACHE_SECONDS = 300
+USER_CACHE_SECONDS = 60
+SCHOOL_CACHE_SECONDS = 300
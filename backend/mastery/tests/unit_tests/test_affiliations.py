@@ -0,0 +1,88 @@
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from mastery.api import auth
+from mastery.models import UserSchool, VersionStamp
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def test_parse_affiliations():
+    assert auth.parse_affiliations([
+        "student@987654321.feide.osloskolen.no",
+        "staff@123456789.feide.osloskolen.no",
+        "member@987654321.feide.osloskolen.no",
+        "faculty@987654321.feide.example.no",
+        "faculty@feide.osloskolen.no",
+    ]) == {("student", "987654321"), ("staff", "123456789")}
+    assert auth.parse_affiliations(None) == set()
+
+
+@pytest.mark.django_db
+def test_check_affiliations(school, other_school):
+    school.is_service_enabled = True
+    school.save()
+    affiliations = [
+        "faculty@987654321.feide.osloskolen.no",
+        "student@987654321.feide.osloskolen.no",
+        "staff@123456789.feide.osloskolen.no",
+        "staff@555555555.feide.osloskolen.no",
+    ]
+    with CaptureQueriesContext(connection) as queries:
+        result = auth.check_affiliations("elev@feide.osloskolen.no", affiliations)
+    assert len(queries) == 1
+    assert result["teacher_schools"] == [school]
+    assert result["student_schools"] == [] and result["staff_schools"] == []
+    assert result["messages"] == [
+        "Du er ansatt ved Kakrafoon barneskole, men skolen har ikke aktivert tjenesten.",
+        "Du er elev ved Kakrafoon vgs, men skolen har ikke aktivert tjenesten.",
+    ]
+
+    # Cached, also the org number without a school
+    with CaptureQueriesContext(connection) as queries:
+        assert auth.check_affiliations("elev@feide.osloskolen.no", affiliations) == result
+    assert len(queries) == 0
+
+    # Saving a school removes it from the cache
+    school.is_service_enabled_for_students = True
+    school.save()
+    result = auth.check_affiliations("elev@feide.osloskolen.no", affiliations)
+    assert result["student_schools"] == [school]
+    assert auth.check_affiliations("", affiliations)["messages"] == []
+
+
+@pytest.mark.django_db
+def test_ensure_user_schools(school, other_school, teacher):
+    assert UserSchool.ensure_user_schools(teacher, [school, other_school], "staff") == {
+        school.id, other_school.id}
+    assert UserSchool.objects.filter(user=teacher, role__name="staff").count() == 2
+    assert VersionStamp.objects.filter(model_name="userschool", school_key=school.id).exists()
+    with CaptureQueriesContext(connection) as queries:
+        assert UserSchool.ensure_user_schools(teacher, [school, other_school], "staff") == set()
+    assert len(queries) == 1
+    assert UserSchool.ensure_user_schools(teacher, [], "staff") == set()
+
+
+@pytest.mark.django_db
+def test_callback_adds_staff_role(client, monkeypatch, school):
+    school.is_service_enabled = True
+    school.save()
+    monkeypatch.setattr(auth, "FRONTEND", "http://frontend")
+    monkeypatch.setattr(auth, "request_tokens_from_feide", lambda code: {"id_token": "token"})
+    monkeypatch.setattr(auth, "get_user_info", lambda: {
+        "eduPersonPrincipalName": "ansatt@feide.osloskolen.no",
+        "displayName": "Ansatt",
+        "eduPersonScopedAffiliation": ["staff@987654321.feide.osloskolen.no"],
+    })
+    for _ in range(2):
+        resp = client.get("/auth/feidecallback", {"code": "code"})
+        assert resp.status_code == 302 and resp.url == "http://frontend"
+    user_school = UserSchool.objects.get(user__feide_id="ansatt@feide.osloskolen.no")
+    assert (user_school.school, user_school.role.name) == (school, "staff")
+    assert client.session["user_id"] == user_school.user_id
@@ -0,0 +1,40 @@
+from io import StringIO
+import pytest
+from django.core.management import call_command
+from django.db import connection
+
+
+def index_names():
+    with connection.cursor() as cursor:
+        return {
+            index_name
+            for table in connection.introspection.table_names(cursor) if table.startswith("mastery_")
+            for index_name in connection.introspection.get_constraints(cursor, table)
+        }
+
+
+@pytest.mark.django_db
+def test_explain_queries(superadmin, school, teaching_group_with_members, observation_on_group_goal):
+    out = StringIO()
+    call_command("explain_queries", "--school", school.id, stdout=out)
+    output = out.getvalue()
+    assert "--- observations of student" in output
+    assert "--- background task runner, next pending task" in output
+    assert "obs_student_observed_live_idx" in index_names()
+
+
+@pytest.mark.django_db
+def test_explain_queries_with_timing(superadmin, school, teaching_group_with_members):
+    out = StringIO()
+    call_command("explain_queries", "--school", school.id, "--time", "2", stdout=out)
+    assert "(2 runs)" in out.getvalue()
+
+
+@pytest.mark.django_db
+def test_explain_queries_compare_restores_indexes(superadmin, school, teaching_group_with_members):
+    out = StringIO()
+    call_command("explain_queries", "--compare", stdout=out)
+    output = out.getvalue()
+    assert "=== Without" in output
+    assert "=== With declared indexes ===" in output
+    assert {"group_school_type_live_idx", "usergroup_group_role_live_idx"} <= index_names()
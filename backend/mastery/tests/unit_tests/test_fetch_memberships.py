@@ -0,0 +1,148 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+import pytest
+from mastery.data_import import fetch_memberships, helpers, http_client
+from mastery.data_import.helpers import HostRateLimiter
+
+ORG_NUMBER = "NO987654321"
+
+
+def feide_member(name, feide_id, affiliation):
+    return {
+        "name": name,
+        "userid_sec": [f"feide:{feide_id}"],
+        "membership": {"affiliation": affiliation},
+    }
+
+
+@pytest.fixture
+def feide_members_api(monkeypatch):
+    """Local stand-in for the Feide members API, response time varies per group to shuffle completion"""
+    requests_seen = []
+
+    class MembersHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            group_id = unquote(self.path.split("/")[-2])
+            group_number = int(group_id.split("-")[-1])
+            requests_seen.append((group_id, self.headers.get("Authorization")))
+            time.sleep(0.02 * (group_number % 3))
+            members = [
+                feide_member(f"Lærer {group_number}", f"teacher{group_number}@feide.osloskolen.no",
+                             "faculty"),
+                feide_member("Elev Felles", "student@feide.osloskolen.no", ["student"]),
+            ]
+            body = json.dumps(members).encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MembersHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(fetch_memberships, "MEMEBERS_URL", f"http://127.0.0.1:{server.server_port}/groups")
+    monkeypatch.setattr(fetch_memberships, "FEIDE_REQUESTS_PER_SECOND", 0)
+    monkeypatch.setattr(fetch_memberships, "get_feide_access_token", lambda: "test-token")
+    yield requests_seen
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def school_groups_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(fetch_memberships, "data_dir", str(tmp_path))
+    monkeypatch.setattr(helpers, "data_dir", str(tmp_path))
+    school_dir = tmp_path / ORG_NUMBER
+    school_dir.mkdir()
+    groups = {
+        "basis": [{"id": f"fc:org:osloskolen.no:b:group-{i}", "displayName": f"Basis {i}"}
+                  for i in range(12)],
+        "teaching": [{"id": f"fc:org:osloskolen.no:u:group-{i}", "displayName": f"Fag {i}"}
+                     for i in range(12, 25)],
+    }
+    (school_dir / "groups.json").write_text(json.dumps(groups), encoding="utf-8")
+    return groups
+
+
+def read_memberships_file(tmp_path):
+    return (tmp_path / ORG_NUMBER / "memberships.ndjson").read_text(encoding="utf-8")
+
+
+def test_concurrent_fetch_matches_sequential(feide_members_api, school_groups_file, tmp_path):
+    """Memberships file and counts do not depend on the number of workers"""
+    sequential = list(fetch_memberships.fetch_memberships_from_feide(ORG_NUMBER, workers=1))
+    sequential_file = read_memberships_file(tmp_path)
+    concurrent = list(fetch_memberships.fetch_memberships_from_feide(ORG_NUMBER, workers=8))
+    concurrent_file = read_memberships_file(tmp_path)
+
+    assert concurrent_file == sequential_file
+    memberships = dict(helpers.iter_school_memberships(ORG_NUMBER))
+    group_ids = [group["id"] for group in school_groups_file["basis"] + school_groups_file["teaching"]]
+    assert list(memberships.keys()) == group_ids
+    assert memberships[group_ids[0]]["teachers"][0]["feide_id"] == "teacher0@feide.osloskolen.no"
+    assert helpers.count_fetched_memberships_and_users(ORG_NUMBER) == (26, 50)
+    sidecar = json.loads((tmp_path / ORG_NUMBER / "memberships.stats.json").read_text(encoding="utf-8"))
+    assert sidecar["counts"] == {"users_count": 26, "memberships_count": 50}
+    assert sidecar["sha256"] == helpers.file_sha256(str(tmp_path / ORG_NUMBER / "memberships.ndjson"))
+    assert concurrent[-1] == sequential[-1]
+    counts = concurrent[-1]["result"]["counts"]
+    assert counts["total_memberships"]["fetched"] == 50
+    assert counts["unique_users"]["fetched"] == 26
+    assert all(auth == "Bearer test-token" for _, auth in feide_members_api)
+
+
+def test_concurrent_fetch_yields_progress(feide_members_api, school_groups_file):
+    """Progress is reported every 10 completed groups"""
+    result = list(fetch_memberships.fetch_memberships_from_feide(ORG_NUMBER, workers=4))
+    assert [chunk["is_done"] for chunk in result] == [False, False, True]
+    assert result[0]["result"]["counts"]["teacher_membership"]["fetched"] == 10
+    assert result[1]["result"]["counts"]["teacher_membership"]["fetched"] == 20
+
+
+def test_failed_fetch_keeps_previous_file(feide_members_api, school_groups_file, tmp_path, monkeypatch):
+    """A fetch that fails halfway leaves the previously fetched memberships in place"""
+    list(fetch_memberships.fetch_memberships_from_feide(ORG_NUMBER, workers=4))
+    previous_file = read_memberships_file(tmp_path)
+    monkeypatch.setattr(fetch_memberships, "MEMEBERS_URL", "http://127.0.0.1:9/groups")
+    monkeypatch.setattr(http_client, "HTTP_RETRIES", 0)
+    http_client.close_session()
+    with pytest.raises(Exception):
+        list(fetch_memberships.fetch_memberships_from_feide(ORG_NUMBER, workers=4))
+    assert read_memberships_file(tmp_path) == previous_file
+    school_files = sorted(path.name for path in (tmp_path / ORG_NUMBER).iterdir())
+    assert school_files == ["groups.json", "memberships.ndjson", "memberships.stats.json"]
+
+
+def test_fetch_ahead_takes_items_as_results_are_used():
+    taken = []
+
+    def items():
+        for i in range(10):
+            taken.append(i)
+            yield i
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        fetched = fetch_memberships.fetch_ahead(executor, lambda i: i * i, items(), ahead=3)
+        assert next(fetched) == (0, 0)
+        assert taken == [0, 1, 2]
+        assert list(fetched) == [(i, i * i) for i in range(1, 10)]
+
+
+def test_host_rate_limiter_spaces_requests_per_host():
+    rate_limiter = HostRateLimiter(max_per_second=50)
+    start = time.monotonic()
+    for _ in range(6):
+        rate_limiter.wait("https://groups-api.dataporten.no/groups/a")
+    # Another host is not held back by the first one
+    other_host_start = time.monotonic()
+    rate_limiter.wait("https://api.dataporten.no/userinfo")
+    assert time.monotonic() - other_host_start < 0.02
+    assert other_host_start - start >= 5 * 0.02 - 0.005
@@ -0,0 +1,99 @@
+import json
+import pytest
+from mastery.data_import import helpers
+from mastery.data_import.estimate_import import estimate_groups_import
+
+
+@pytest.fixture
+def school_dir(tmp_path, monkeypatch, school):
+    monkeypatch.setattr(helpers, "data_dir", str(tmp_path))
+    path = tmp_path / school.org_number
+    path.mkdir()
+    return path
+
+
+def write_ndjson(file_path, records):
+    with helpers.NdjsonWriter(str(file_path)) as writer:
+        for record in records:
+            writer.write(record)
+
+
+def test_ndjson_writer_replaces_legacy_file(tmp_path):
+    (tmp_path / "memberships.json").write_text("{}", encoding="utf-8")
+    write_ndjson(tmp_path / "memberships.ndjson", [{"group_id": "a"}, {"group_id": "ø"}])
+    written = (tmp_path / "memberships.ndjson").read_text(encoding="utf-8")
+    assert written == '{"group_id": "a"}\n{"group_id": "ø"}\n'
+    assert not (tmp_path / "memberships.json").exists()
+
+
+def test_ndjson_writer_keeps_existing_file_on_failure(tmp_path):
+    write_ndjson(tmp_path / "groups.ndjson", [{"kind": "basis", "item": {"id": "a"}}])
+    with pytest.raises(RuntimeError):
+        with helpers.NdjsonWriter(str(tmp_path / "groups.ndjson")) as writer:
+            writer.write({"kind": "basis", "item": {"id": "b"}})
+            raise RuntimeError("fetch failed")
+    assert list(helpers.iter_ndjson(tmp_path / "groups.ndjson")) == [{"kind": "basis", "item": {"id": "a"}}]
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["groups.ndjson"]
+
+
+@pytest.mark.django_db
+def test_groups_are_read_from_ndjson_and_legacy_json(school_dir, school, groups_data):
+    (school_dir / "groups.json").write_text(json.dumps(groups_data), encoding="utf-8")
+    legacy = sorted(helpers.iter_school_groups(school.org_number), key=lambda pair: pair[1]["id"])
+    assert legacy == sorted(((kind, item) for kind in ("basis", "teaching") for item in groups_data[kind]),
+                            key=lambda pair: pair[1]["id"])
+    assert helpers.count_fetched_groups(school.org_number) == 2
+
+    write_ndjson(school_dir / "groups.ndjson",
+                 [{"kind": kind, "item": item}
+                  for kind in ("teaching", "basis") for item in groups_data[kind]])
+    assert sorted(helpers.iter_school_groups(school.org_number), key=lambda pair: pair[1]["id"]) == legacy
+    assert helpers.count_fetched_groups(school.org_number) == 2
+    assert set(estimate_groups_import(school.org_number).keys()) == {
+        groups_data["basis"][0]["id"], groups_data["teaching"][0]["id"]}
+
+
+@pytest.mark.django_db
+def test_stats_for_missing_files(school_dir, school):
+    assert helpers.count_fetched_groups(school.org_number) is None
+    assert helpers.count_fetched_memberships_and_users(school.org_number) == (None, None)
+
+
+@pytest.mark.django_db
+def test_stats_are_read_from_sidecar(school_dir, school, groups_data):
+    groups_file = school_dir / "groups.ndjson"
+    write_ndjson(groups_file, [{"kind": "basis", "item": group} for group in groups_data["basis"]])
+    stats = helpers.write_fetch_stats(str(groups_file), {"groups_count": 1})
+    assert stats["sha256"] == helpers.file_sha256(str(groups_file))
+
+    # Sidecar is trusted as long as the data file is unchanged
+    sidecar = json.loads((school_dir / "groups.stats.json").read_text(encoding="utf-8"))
+    sidecar["counts"]["groups_count"] = 1000
+    (school_dir / "groups.stats.json").write_text(json.dumps(sidecar), encoding="utf-8")
+    assert helpers.get_school_fetched_stats(school.org_number)["groups_count"] == 1000
+
+    # Rewriting the data file invalidates the sidecar
+    write_ndjson(groups_file, [{"kind": kind, "item": group}
+                               for kind in ("basis", "teaching") for group in groups_data[kind]])
+    assert helpers.get_school_fetched_stats(school.org_number)["groups_count"] == 2
+    sidecar = json.loads((school_dir / "groups.stats.json").read_text(encoding="utf-8"))
+    assert sidecar["counts"] == {"groups_count": 2}
+    assert sidecar["sha256"] == helpers.file_sha256(str(groups_file))
+
+
+@pytest.mark.django_db
+def test_stats_sidecar_is_created_for_legacy_files(school_dir, school):
+    memberships = {"fc:org:kakrafoon.kommune.no:u:group-1": {
+        "teachers": [{"feide_id": "janne@feide.osloskolen.no", "name": "Janne Lerke"}],
+        "students": [{"feide_id": "frank@feide.osloskolen.no", "name": "Frank Larsen"}],
+        "other": [{"feide_id": "janne@feide.osloskolen.no", "name": "Janne Lerke"}],
+    }}
+    (school_dir / "memberships.json").write_text(json.dumps(memberships), encoding="utf-8")
+    assert helpers.get_school_fetched_stats(school.org_number) == {
+        "groups_count": None,
+        "users_count": 2,
+        "memberships_count": 3,
+    }
+    sidecar = json.loads((school_dir / "memberships.stats.json").read_text(encoding="utf-8"))
+    assert sidecar["file"] == "memberships.json"
+    assert sidecar["counts"] == {"users_count": 2, "memberships_count": 3}
@@ -0,0 +1,147 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from django.utils import timezone
+from mastery import models
+from mastery.data_import import grep_cache, http_client
+from mastery.data_import.import_groups import import_groups, import_groups_in_bulk
+
+
+def udir_fagkode(grep_code, title):
+    return {
+        "kode": grep_code,
+        "tittel": [{"spraak": "default", "verdi": title}],
+        "kortform": [{"spraak": "default", "verdi": title[:3]}],
+        "opplaeringsfag": [{"kode": f"{grep_code[:3]}0001"}],
+    }
+
+
+@pytest.fixture
+def udir_api(monkeypatch):
+    """Local stand-in for the UDIR grep API. Known codes are kept in the returned dict, requests recorded"""
+    state = {"fagkoder": {}, "requested": [], "status": 200}
+
+    class GrepHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            grep_code = self.path.split("/")[-1]
+            state["requested"].append(grep_code)
+            fagkode = state["fagkoder"].get(grep_code)
+            status = state["status"] if fagkode else 404
+            body = json.dumps(fagkode or {}).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), GrepHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(grep_cache, "UDIR_GREP_URL", f"http://127.0.0.1:{server.server_port}/fagkoder")
+    # Do not spend time retrying the scripted failures
+    monkeypatch.setattr(http_client, "HTTP_RETRIES", 0)
+    http_client.close_session()
+    yield state
+    http_client.close_session()
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.django_db
+def test_resolve_fetches_missing_codes_once(udir_api):
+    udir_api["fagkoder"]["KRO0012"] = udir_fagkode("KRO0012", "Kroppsøving 2. årstrinn")
+    udir_api["fagkoder"]["NOR0214"] = udir_fagkode("NOR0214", "Norsk 4. årstrinn")
+
+    subjects, errors = grep_cache.resolve_grep_codes(["KRO0012", "NOR0214", "KRO0012"])
+    assert errors == []
+    assert sorted(udir_api["requested"]) == ["KRO0012", "NOR0214"]
+    assert subjects["KRO0012"] == {
+        "display_name": "Kroppsøving 2. årstrinn",
+        "short_name": "Kro",
+        "grep_code": "KRO0012",
+        "grep_group_code": "KRO0001",
+    }
+    assert models.GrepCode.objects.count() == 2
+
+    # Second lookup is served from the cache
+    subjects, errors = grep_cache.resolve_grep_codes(["KRO0012", "NOR0214"])
+    assert len(udir_api["requested"]) == 2
+    assert subjects["NOR0214"]["display_name"] == "Norsk 4. årstrinn"
+
+
+@pytest.mark.django_db
+def test_resolve_reports_unknown_codes(udir_api):
+    subjects, errors = grep_cache.resolve_grep_codes(["NOPE0001"])
+    assert subjects == {}
+    assert errors == ["UDIR http trouble: 404 for grep_code NOPE0001"]
+    assert not models.GrepCode.objects.exists()
+
+
+@pytest.mark.django_db
+def test_resolve_refreshes_expired_codes(udir_api):
+    expired = timezone.now() - timezone.timedelta(days=grep_cache.GREP_CACHE_TTL_DAYS + 1)
+    models.GrepCode.objects.create(grep_code="KRO0012", display_name="Gammelt navn", fetched_at=expired)
+    udir_api["fagkoder"]["KRO0012"] = udir_fagkode("KRO0012", "Kroppsøving 2. årstrinn")
+
+    subjects, errors = grep_cache.resolve_grep_codes(["KRO0012"])
+    assert errors == []
+    assert udir_api["requested"] == ["KRO0012"]
+    assert subjects["KRO0012"]["display_name"] == "Kroppsøving 2. årstrinn"
+    assert models.GrepCode.objects.get(grep_code="KRO0012").fetched_at > expired
+
+
+@pytest.mark.django_db
+def test_resolve_falls_back_to_expired_codes(udir_api):
+    expired = timezone.now() - timezone.timedelta(days=grep_cache.GREP_CACHE_TTL_DAYS + 1)
+    models.GrepCode.objects.create(grep_code="KRO0012", display_name="Kroppsøving", fetched_at=expired)
+    udir_api["fagkoder"]["KRO0012"] = udir_fagkode("KRO0012", "Kroppsøving 2. årstrinn")
+    udir_api["status"] = 503
+
+    subjects, errors = grep_cache.resolve_grep_codes(["KRO0012"])
+    assert errors == []
+    assert subjects["KRO0012"]["display_name"] == "Kroppsøving"
+    assert models.GrepCode.objects.get(grep_code="KRO0012").fetched_at == expired
+
+
+@pytest.mark.django_db
+def test_resolve_survives_unreachable_udir(monkeypatch):
+    monkeypatch.setattr(grep_cache, "UDIR_GREP_URL", "http://127.0.0.1:9/fagkoder")
+    monkeypatch.setattr(http_client, "HTTP_RETRIES", 0)
+    http_client.close_session()
+    subjects, errors = grep_cache.resolve_grep_codes(["KRO0012"])
+    assert subjects == {}
+    assert len(errors) == 1
+    assert errors[0].startswith("UDIR http trouble")
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("import_function", [import_groups, import_groups_in_bulk])
+def test_reimport_makes_no_udir_calls(udir_api, groups_data, school, import_function):
+    udir_api["fagkoder"]["KRO0012"] = udir_fagkode("KRO0012", "Kroppsøving 2. årstrinn")
+    result = list(import_function(groups_data))
+    assert result[-1]["result"]["changes"]["subject"]["created"] == 1
+    assert udir_api["requested"] == ["KRO0012"]
+
+    # Even if the subject is gone, the grep code comes from the cache
+    models.Group.objects.all().delete()
+    models.Subject.objects.all().delete()
+    result = list(import_function(groups_data))
+    assert result[-1]["result"]["changes"]["subject"]["created"] == 1
+    assert udir_api["requested"] == ["KRO0012"]
+    assert models.Subject.objects.get(grep_code="KRO0012").display_name == "Kroppsøving 2. årstrinn"
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("import_function", [import_groups, import_groups_in_bulk])
+def test_failing_code_is_fetched_once(udir_api, groups_data, school, import_function):
+    template = groups_data["teaching"][0]
+    groups_data["teaching"] = [{**template, "id": f"{template['id']}-{i}"} for i in range(3)]
+    result = list(import_function(groups_data))
+    assert udir_api["requested"] == ["KRO0012"]
+    assert result[-1]["result"]["changes"]["subject"]["failed"] == 1
+    assert [error["error"] for error in result[-1]["result"]["errors"]] == ["ensure-subject-failed"]
+    assert result[-1]["result"]["changes"]["teaching_group"]["created"] == 3
@@ -0,0 +1,133 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from mastery.data_import import helpers, http_client
+
+
+@pytest.fixture
+def stub_server():
+    """
+    Local HTTP/1.1 server. Responses are scripted per path as a list of (status, body), the last one repeats.
+    Records the client port of every request, to tell whether connections are reused.
+    """
+    state = {"responses": {}, "seen": []}
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def respond(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            request_body = self.rfile.read(length).decode("utf-8") if length else ""
+            state["seen"].append({"path": self.path, "port": self.client_address[1], "body": request_body})
+            scripted = state["responses"].get(self.path, [(404, {})])
+            status, body = scripted.pop(0) if len(scripted) > 1 else scripted[0]
+            if status == "slow":
+                time.sleep(0.5)
+                status = 200
+            payload = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        do_GET = respond
+        do_POST = respond
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    state["url"] = f"http://127.0.0.1:{server.server_port}"
+    http_client.close_session()
+    yield state
+    http_client.close_session()
+    server.shutdown()
+    server.server_close()
+
+
+def test_connections_are_reused(stub_server):
+    stub_server["responses"]["/groups"] = [(200, [])]
+    for _ in range(5):
+        assert http_client.get(f"{stub_server['url']}/groups").status_code == 200
+    assert len(stub_server["seen"]) == 5
+    assert len({request["port"] for request in stub_server["seen"]}) == 1
+
+
+def test_get_retries_server_errors(stub_server, monkeypatch):
+    monkeypatch.setattr(http_client, "HTTP_BACKOFF_FACTOR", 0)
+    http_client.close_session()
+    stub_server["responses"]["/fagkoder/KRO0012"] = [(503, {}), (502, {}), (200, {"kode": "KRO0012"})]
+    response = http_client.get(f"{stub_server['url']}/fagkoder/KRO0012")
+    assert response.status_code == 200
+    assert response.json() == {"kode": "KRO0012"}
+    assert len(stub_server["seen"]) == 3
+
+
+def test_get_returns_last_response_when_retries_are_exhausted(stub_server, monkeypatch):
+    monkeypatch.setattr(http_client, "HTTP_BACKOFF_FACTOR", 0)
+    monkeypatch.setattr(http_client, "HTTP_RETRIES", 1)
+    http_client.close_session()
+    stub_server["responses"]["/fagkoder/NOPE"] = [(503, {})]
+    response = http_client.get(f"{stub_server['url']}/fagkoder/NOPE")
+    assert response.status_code == 503
+    assert len(stub_server["seen"]) == 2
+
+
+def test_post_is_not_retried(stub_server, monkeypatch):
+    monkeypatch.setattr(http_client, "HTTP_BACKOFF_FACTOR", 0)
+    http_client.close_session()
+    stub_server["responses"]["/oauth/token"] = [(503, {})]
+    assert http_client.post(f"{stub_server['url']}/oauth/token").status_code == 503
+    assert len(stub_server["seen"]) == 1
+
+
+def test_default_read_timeout(stub_server, monkeypatch):
+    monkeypatch.setattr(http_client, "HTTP_READ_TIMEOUT", 0.1)
+    monkeypatch.setattr(http_client, "HTTP_RETRIES", 0)
+    http_client.close_session()
+    stub_server["responses"]["/slow"] = [("slow", {})]
+    with pytest.raises(requests.exceptions.RequestException):
+        http_client.get(f"{stub_server['url']}/slow")
+
+
+def test_feide_token_is_reused_until_expiry(stub_server, monkeypatch):
+    monkeypatch.setattr(helpers, "TOKEN_URL", f"{stub_server['url']}/oauth/token")
+    monkeypatch.setattr(helpers, "FEIDE_CLIENT_ID", "client-id")
+    monkeypatch.setattr(helpers, "FEIDE_CLIENT_SECRET", "client-secret")
+    stub_server["responses"]["/oauth/token"] = [
+        (200, {"access_token": "first", "expires_in": 3600}),
+        (200, {"access_token": "second", "expires_in": 3600}),
+    ]
+    helpers.feide_token_cache.clear()
+    try:
+        assert helpers.get_feide_access_token() == "first"
+        assert helpers.get_feide_access_token() == "first"
+        assert len(stub_server["seen"]) == 1
+        assert stub_server["seen"][0]["body"] == "grant_type=client_credentials"
+
+        # Within leeway of expiry a new token is fetched
+        monkeypatch.setattr(helpers.feide_token_cache, "_expires_at", time.monotonic() + 10)
+        assert helpers.get_feide_access_token() == "second"
+        assert len(stub_server["seen"]) == 2
+    finally:
+        helpers.feide_token_cache.clear()
+
+
+def test_failing_token_request_is_not_cached(stub_server, monkeypatch):
+    monkeypatch.setattr(helpers, "TOKEN_URL", f"{stub_server['url']}/oauth/token")
+    monkeypatch.setattr(helpers, "FEIDE_CLIENT_ID", "client-id")
+    monkeypatch.setattr(helpers, "FEIDE_CLIENT_SECRET", "client-secret")
+    stub_server["responses"]["/oauth/token"] = [(401, {}), (200, {"access_token": "ok", "expires_in": 3600})]
+    helpers.feide_token_cache.clear()
+    try:
+        with pytest.raises(Exception, match="Failed to get Feide access token"):
+            helpers.get_feide_access_token()
+        assert helpers.get_feide_access_token() == "ok"
+    finally:
+        helpers.feide_token_cache.clear()
@@ -1,5 +1,5 @@
 import pytest
-from mastery.data_import.import_groups import import_groups
+from mastery.data_import.import_groups import import_groups, import_groups_in_bulk
 from mastery import models
 from django.utils import timezone
 
@@ -71,3 +71,102 @@ def test_import_groups_undelete(groups_data, school):
     goal.refresh_from_db()
     assert teaching_group.deleted_at is None
     assert goal.deleted_at is None
+
+
+@pytest.fixture
+def udir_subject(db):
+    # Pre-existing subject, so the bulk import does not need to reach UDIR
+    return models.Subject.objects.create(display_name="Kroppsøving", short_name="Kroppsøving",
+                                         grep_code="KRO0012", grep_group_code="KRO0001")
+
+
+@pytest.mark.django_db
+def test_bulk_import_groups_create(groups_data, school, udir_subject):
+    """Test group creation on bulk import"""
+    result = list(import_groups_in_bulk(groups_data))
+    final_chunk = result[-1]
+    assert final_chunk["is_done"] is True
+    assert final_chunk["result"]["errors"] == []
+    changes = final_chunk["result"]["changes"]
+    assert changes["basis_group"]["created"] == 1
+    assert changes["teaching_group"]["created"] == 1
+    assert changes["subject"]["created"] == 0
+    assert changes["subject"]["maintained"] == 1
+    teaching_group = models.Group.objects.get(feide_id=groups_data["teaching"][0]["id"])
+    basis_group = models.Group.objects.get(feide_id=groups_data["basis"][0]["id"])
+    assert teaching_group.type == "teaching"
+    assert teaching_group.subject == udir_subject
+    assert teaching_group.school == school
+    assert basis_group.type == "basis"
+    assert basis_group.subject is None
+
+
+@pytest.mark.django_db
+def test_bulk_import_groups_maintain_and_undelete(groups_data, school, udir_subject):
+    """Test group maintenance and undelete on bulk import"""
+    list(import_groups_in_bulk(groups_data))
+    teaching_group = models.Group.objects.get(feide_id=groups_data["teaching"][0]["id"])
+    deleted_ts = timezone.now() - timezone.timedelta(days=1)
+    goal = models.Goal.objects.create(title="Lese bøk. Les bøk!",
+                                      group=teaching_group, deleted_at=deleted_ts, school=school)
+    teaching_group.deleted_at = deleted_ts
+    teaching_group.save()
+    result = list(import_groups_in_bulk(groups_data))
+    changes = result[-1]["result"]["changes"]
+    assert changes["basis_group"]["created"] == 0
+    assert changes["basis_group"]["maintained"] == 1
+    assert changes["teaching_group"]["created"] == 0
+    assert changes["teaching_group"]["maintained"] == 1
+    teaching_group.refresh_from_db()
+    goal.refresh_from_db()
+    assert teaching_group.deleted_at is None
+    assert teaching_group.created_at < teaching_group.maintained_at
+    assert goal.deleted_at is None
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("import_function", [import_groups, import_groups_in_bulk])
+def test_import_groups_reports_missing_school(groups_data, school, udir_subject, import_function):
+    """Groups whose parent school is unknown are skipped and reported"""
+    groups_data["basis"][0]["parent"] = "fc:org:kunnskap.no:unit:NO000000000"
+    result = list(import_function(groups_data))
+    final_chunk = result[-1]
+    assert final_chunk["result"]["changes"]["basis_group"]["created"] == 0
+    assert final_chunk["result"]["changes"]["teaching_group"]["created"] == 1
+    assert [error["error"] for error in final_chunk["result"]["errors"]] == ["missing-school"]
+    assert not models.Group.objects.filter(feide_id=groups_data["basis"][0]["id"]).exists()
+
+
+@pytest.mark.django_db
+def test_bulk_import_groups_queries_scale_with_batches(groups_data, school, udir_subject,
+                                                       django_assert_max_num_queries):
+    """Number of queries depends on number of batches, not on number of groups"""
+    template = groups_data["teaching"][0]
+    groups_data["teaching"] = [{**template, "id": f"{template['id']}-{i}"} for i in range(200)]
+    with django_assert_max_num_queries(20):
+        result = list(import_groups_in_bulk(groups_data, batch_size=100))
+    assert len(result) == 4
+    assert result[-1]["result"]["changes"]["teaching_group"]["created"] == 200
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("import_function", [import_groups, import_groups_in_bulk])
+def test_import_groups_reads_pairs_as_it_goes(groups_data, school, udir_subject, import_function):
+    """(kind, group) pairs, as read from the groups file, are taken one batch at a time"""
+    template = groups_data["teaching"][0]
+    taken = []
+
+    def pairs():
+        yield "basis", groups_data["basis"][0]
+        yield "owners", {"id": "fc:org:owner"}
+        for i in range(5):
+            taken.append(i)
+            yield "teaching", {**template, "id": f"{template['id']}-{i}"}
+
+    result = import_function(pairs(), batch_size=2)
+    next(result)
+    assert len(taken) < 5
+    final_chunk = list(result)[-1]
+    assert final_chunk["result"]["changes"]["basis_group"]["created"] == 1
+    assert final_chunk["result"]["changes"]["teaching_group"]["created"] == 5
+    assert not models.Group.objects.filter(feide_id="fc:org:owner").exists()
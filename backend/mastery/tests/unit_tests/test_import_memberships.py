@@ -1,5 +1,8 @@
 import pytest
-from mastery.data_import.import_users import import_memberships
+from mastery.data_import import helpers
+from mastery.data_import.estimate_import import estimate_memberships_import, estimate_users_import
+from mastery.data_import.import_users import (
+    import_memberships, import_memberships_from_file, import_memberships_in_bulk)
 from mastery import models
 from django.utils import timezone
 
@@ -130,10 +133,15 @@ def test_import_users_undelete(memberships_data, school, a_teaching_group, a_bas
     user = models.User.objects.filter(feide_id=user_feide_id).first()
     user.deleted_at = timezone.now()
     user.save()
+    goal = models.Goal.objects.create(student=user, school=school)
+    models.Observation.objects.create(student=user, goal=goal, mastery_value=5, deleted_at=user.deleted_at)
+    assert not models.ObservationSummary.objects.exists()
     # Re-importing with same data should undelete the user and membership
     list(import_memberships(memberships_data))
     user.refresh_from_db()
     assert user.deleted_at is None
+    # The restored observation is in the summaries
+    assert models.ObservationSummary.objects.get(student=user, goal=goal).observation_count == 1
 
 
 @pytest.mark.django_db
@@ -152,3 +160,121 @@ def test_import_memberships_undelete(memberships_data, school, a_teaching_group,
     user_group.refresh_from_db()
     assert user_group.created_at < user_group.maintained_at
     assert user_group.deleted_at is None
+
+
+@pytest.mark.django_db
+def test_bulk_import_users_create(memberships_data, school, a_teaching_group, a_basis_group):
+    """Test bulk import gives the same counts as the row-by-row import"""
+    result = list(import_memberships_in_bulk(memberships_data, batch_size=4))
+    final_chunk = result[-1]
+    assert final_chunk["is_done"] is True
+    assert [chunk["is_done"] for chunk in result] == [False, True]
+    changes = final_chunk["result"]["changes"]
+    assert changes["user"]["created"] == 5
+    assert changes["user"]["maintained"] == 0
+    assert changes["membership"]["created"] == 6
+    assert changes["membership"]["maintained"] == 0
+    assert models.User.objects.all().count() == 5
+    assert models.UserGroup.objects.filter(group=a_basis_group).count() == 3
+    assert models.UserGroup.objects.filter(group=a_teaching_group).count() == 3
+    frank = models.User.objects.get(feide_id="frank@feide.osloskolen.no")
+    assert set(frank.groups.values_list("id", flat=True)) == {a_teaching_group.id, a_basis_group.id}
+
+
+@pytest.mark.django_db
+def test_bulk_import_users_maintain(memberships_data, school, a_teaching_group, a_basis_group):
+    """Test bulk re-import maintains and undeletes existing users and memberships"""
+    list(import_memberships(memberships_data))
+    user = models.User.objects.get(feide_id="mia@feide.osloskolen.no")
+    deleted_at = timezone.now()
+    user.deleted_at = deleted_at
+    user.save()
+    goal = models.Goal.objects.create(student=user, school=school, deleted_at=deleted_at)
+    models.Observation.objects.create(student=user, goal=goal, mastery_value=5, deleted_at=deleted_at)
+    models.UserGroup.objects.filter(user=user).update(deleted_at=deleted_at)
+
+    result = list(import_memberships_in_bulk(memberships_data, batch_size=2))
+    changes = result[-1]["result"]["changes"]
+    assert changes["user"]["created"] == 0
+    assert changes["user"]["maintained"] == 5
+    assert changes["membership"]["created"] == 0
+    assert changes["membership"]["maintained"] == 6
+    assert models.User.objects.all().count() == 5
+    user.refresh_from_db()
+    goal.refresh_from_db()
+    assert user.deleted_at is None
+    assert user.created_at < user.maintained_at
+    assert goal.deleted_at is None
+    assert models.ObservationSummary.objects.get(student=user, goal=goal).last_mastery_value == 5
+    assert not models.UserGroup.objects.filter(deleted_at__isnull=False).exists()
+
+
+@pytest.mark.django_db
+def test_bulk_import_reports_missing_group(memberships_data, school, a_teaching_group):
+    """Test bulk import skips members of unknown groups, and reports the group once"""
+    result = list(import_memberships_in_bulk(memberships_data))
+    final_chunk = result[-1]
+    changes = final_chunk["result"]["changes"]
+    assert changes["user"]["created"] == 3
+    assert changes["membership"]["created"] == 3
+    assert [error["error"] for error in final_chunk["result"]["errors"]] == ["missing-group"]
+
+
+@pytest.mark.django_db
+def test_bulk_import_queries_scale_with_batches(
+        school, a_teaching_group, django_assert_max_num_queries):
+    """Test the number of queries depends on the number of batches, not the number of members"""
+    memberships_data = {
+        a_teaching_group.feide_id: {
+            "teachers": [],
+            "students": [
+                {"feide_id": f"student{index}@feide.osloskolen.no", "name": f"Student {index}",
+                 "email": f"student{index}@osloskolen.no"}
+                for index in range(200)
+            ],
+        }
+    }
+    list(import_memberships_in_bulk(memberships_data, batch_size=100))
+    with django_assert_max_num_queries(20):
+        result = list(import_memberships_in_bulk(memberships_data, batch_size=100))
+    changes = result[-1]["result"]["changes"]
+    assert changes["user"]["maintained"] == 200
+    assert changes["membership"]["maintained"] == 200
+
+
+@pytest.mark.django_db
+def test_import_memberships_from_ndjson_file(tmp_path, monkeypatch, memberships_data, school,
+                                             a_teaching_group, a_basis_group):
+    """Memberships are streamed from memberships.ndjson, one group per line"""
+    monkeypatch.setattr(helpers, "data_dir", str(tmp_path))
+    with helpers.NdjsonWriter(str(tmp_path / school.org_number / "memberships.ndjson")) as writer:
+        for group_id, roles in memberships_data.items():
+            writer.write({"group_id": group_id, **roles})
+    member_count = sum(len(roles.get(role, [])) for roles in memberships_data.values()
+                       for role in ("teachers", "students"))
+    assert dict(helpers.iter_school_memberships(school.org_number)) == memberships_data
+    assert helpers.count_fetched_memberships_and_users(school.org_number)[1] == member_count
+    assert len(estimate_memberships_import(school.org_number)) == member_count
+
+    result = list(import_memberships_from_file(school.org_number))
+    assert result[-1]["result"]["changes"]["membership"]["created"] == member_count
+    assert models.UserGroup.objects.count() == member_count
+    # Nothing left to import
+    assert estimate_users_import(school.org_number) == {}
+    assert estimate_memberships_import(school.org_number) == {}
+
+
+@pytest.mark.django_db
+def test_abandoned_import_bumps_version_stamps(tmp_path, monkeypatch, memberships_data, school,
+                                               a_teaching_group, a_basis_group):
+    """Batches written before an import is stopped are committed, lists of them must not answer 304"""
+    monkeypatch.setattr(helpers, "data_dir", str(tmp_path))
+    with helpers.NdjsonWriter(str(tmp_path / school.org_number / "memberships.ndjson")) as writer:
+        for group_id, roles in memberships_data.items():
+            writer.write({"group_id": group_id, **roles})
+    progress = import_memberships_from_file(school.org_number)
+    next(progress)
+    assert not models.VersionStamp.objects.filter(school_key=school.id).exists()
+    progress.close()
+    assert set(models.VersionStamp.objects.filter(school_key=school.id).values_list(
+        "model_name", flat=True)) == {"user", "usergroup", "goal", "observation"}
@@ -0,0 +1,50 @@
+import pytest
+from mastery import mastery_levels
+from mastery.mastery_levels import CompiledMasterySchema
+
+
+def test_level_lookup(mastery_schema):
+    compiled = mastery_schema.get_compiled()
+    assert (compiled.min_value, compiled.max_value) == (1, 100)
+    assert compiled.boundaries == ((1, 33), (34, 66), (67, 100))
+    assert [compiled.get_level_index(value) for value in (0, 1, 33, 34, 66, 67, 100, 101)] == [
+        None, 0, 0, 1, 1, 2, 2, None]
+    assert compiled.get_level(50)["text"] == "Forklare"
+    assert compiled.is_in_range(100) and not compiled.is_in_range(101)
+    with pytest.raises(AttributeError):
+        compiled.min_value = 0
+    with pytest.raises(TypeError):
+        compiled.levels[0]["text"] = "Huske"
+
+
+def test_level_lookup_without_table():
+    # Gaps, unsorted levels and values which are not whole numbers
+    config = {"levels": [{"text": "B", "min_value": 2.5, "max_value": 4},
+                         {"text": "A", "min_value": 0, "max_value": 1}]}
+    compiled = CompiledMasterySchema(config)
+    assert [compiled.get_level_index(value) for value in (-1, 0, 0.5, 1.5, 2.5, 3, 4.5)] == [
+        None, 0, 0, None, 1, 1, None]
+    # Same answers from the table
+    config = {"levels": [{"min_value": 5, "max_value": 6}, {"min_value": 1, "max_value": 2}]}
+    compiled = CompiledMasterySchema(config)
+    assert [compiled.get_level_index(value) for value in range(0, 8)] == [None, 0, 0, None, None, 1, 1, None]
+    assert compiled.get_level_index(5.5) == 1
+
+
+def test_schema_without_levels(mastery_schema_other_school):
+    # Only snake case bounds count, as before
+    assert mastery_schema_other_school.get_value_range() == (None, None)
+    compiled = CompiledMasterySchema(None)
+    assert compiled.get_level_index(3) is None
+    assert compiled.is_in_range(1000)
+
+
+@pytest.mark.django_db
+def test_compiled_once_per_version(mastery_schema):
+    assert mastery_schema.get_compiled() is mastery_schema.get_compiled()
+    compiled = mastery_schema.get_compiled()
+    mastery_schema.config["levels"][-1]["max_value"] = 200
+    mastery_schema.save()
+    assert mastery_schema.get_compiled() is not compiled
+    assert mastery_schema.get_value_range() == (1, 200)
+    assert (mastery_schema.id, mastery_schema.updated_at) in mastery_levels._compiled_schemas
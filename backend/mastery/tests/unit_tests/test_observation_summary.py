@@ -0,0 +1,86 @@
+import pytest
+from io import StringIO
+from django.core.management import call_command
+from django.utils import timezone
+from rest_framework.test import APIClient
+from mastery import models
+from mastery.data_import.cleaner_bot import update_data_integrity
+
+
+def get_summaries():
+    """(student_id, goal_id) -> (last_observation_id, last_mastery_value, observation_count)"""
+    rows = models.ObservationSummary.objects.values_list(
+        'student_id', 'goal_id', 'last_observation_id', 'last_mastery_value', 'observation_count')
+    return {(student_id, goal_id): rest for student_id, goal_id, *rest in rows}
+
+
+@pytest.mark.django_db
+def test_summary_follows_observation_changes(student, goal_with_group, goal_individual):
+    now = timezone.now()
+    first = models.Observation.objects.create(
+        student=student, goal=goal_with_group, mastery_value=10, observed_at=now - timezone.timedelta(days=1))
+    second = models.Observation.objects.create(
+        student=student, goal=goal_with_group, mastery_value=20, observed_at=now)
+    # Without observed_at, an observation is older than those with one
+    models.Observation.objects.create(student=student, goal=goal_with_group, mastery_value=30)
+    assert get_summaries() == {(student.id, goal_with_group.id): [second.id, 20, 3]}
+
+    second.mastery_value = 25
+    second.save()
+    assert get_summaries()[(student.id, goal_with_group.id)] == [second.id, 25, 3]
+
+    second.deleted_at = now
+    second.save()
+    assert get_summaries()[(student.id, goal_with_group.id)] == [first.id, 10, 2]
+
+    # Moving an observation to another goal refreshes both summaries
+    first = models.Observation.objects.get(id=first.id)
+    first.goal = goal_individual
+    first.save()
+    assert get_summaries()[(student.id, goal_individual.id)] == [first.id, 10, 1]
+    assert get_summaries()[(student.id, goal_with_group.id)][2] == 1
+
+    models.Observation.objects.filter(goal=goal_with_group).delete()
+    assert list(get_summaries()) == [(student.id, goal_individual.id)]
+
+
+@pytest.mark.django_db
+def test_bulk_save_updates_summaries(superadmin, student, observation_on_group_goal, goal_with_group):
+    client = APIClient()
+    client.force_authenticate(user=superadmin)
+    items = [
+        {'id': observation_on_group_goal.id, 'mastery_value': 50, 'observed_at': '2026-01-02T10:00:00Z'},
+        {'student_id': student.id, 'goal_id': goal_with_group.id, 'mastery_value': 60,
+         'observed_at': '2026-01-01T10:00:00Z'},
+    ]
+    resp = client.post('/api/observations/bulk/', items, format='json')
+    assert resp.status_code == 201
+    assert get_summaries() == {(student.id, goal_with_group.id): [observation_on_group_goal.id, 50, 2]}
+
+
+@pytest.mark.django_db
+def test_cleaner_bot_soft_delete_updates_summaries(
+        school, student, goal_individual, observation_on_individual_goal):
+    assert (student.id, goal_individual.id) in get_summaries()
+    now = timezone.now()
+    student.deleted_at = now
+    student.save()
+    options = {"groups_earlier_than": now, "memberships_earlier_than": now}
+    list(update_data_integrity(school.org_number, options))
+    assert get_summaries() == {}
+
+
+@pytest.mark.django_db
+def test_rebuild(student, other_student, goal_with_group, goal_individual, observation_on_group_goal,
+                 observation_on_individual_goal):
+    models.Observation.objects.create(student=other_student, goal=goal_with_group, mastery_value=5)
+    expected = get_summaries()
+    assert len(expected) == 3
+    # Changes which send no signals leave the summaries stale, until they are rebuilt
+    models.Observation.objects.filter(student=other_student).update(mastery_value=7)
+    models.ObservationSummary.objects.filter(student=student).delete()
+    out = StringIO()
+    call_command("rebuild_observation_summaries", "--batch-size", "2", stdout=out)
+    assert "Rebuilt 3 observation summaries" in out.getvalue()
+    expected[(other_student.id, goal_with_group.id)][1] = 7
+    assert get_summaries() == expected
@@ -0,0 +1,124 @@
+import inspect
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_access_policy import AccessPolicy
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from django.utils import timezone
+from mastery import models
+from mastery.access_policies.base import BaseAccessPolicy
+from mastery.access_policies.scope import PrincipalScope, get_cached_principal_scope, get_scope_versions
+from mastery.data_import.cleaner_bot import update_data_integrity
+from mastery.data_import.import_users import import_memberships_in_bulk
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def count_scope_queries(queries):
+    return len([query for query in queries if 'FROM "mastery_userschool"' in query['sql']])
+
+
+@pytest.mark.django_db
+def test_scope_of_teacher(school, teacher, basis_group, teaching_group_with_members, teacher_role):
+    basis_group.add_member(teacher, teacher_role)
+    scope = PrincipalScope.for_user(teacher)
+    assert scope.role_names == {"teacher"}
+    assert scope.teacher_group_ids == {teaching_group_with_members.id, basis_group.id}
+    assert scope.teacher_teaching_group_ids == {teaching_group_with_members.id}
+    assert scope.teacher_basis_group_ids == {basis_group.id}
+    assert scope.student_group_ids == set()
+    assert scope.employee_school_ids == set()
+    assert scope.school_ids == {school.id}
+
+
+@pytest.mark.django_db
+def test_scope_of_school_admin(school, school_admin, superadmin):
+    scope = PrincipalScope.for_user(school_admin)
+    assert scope.role_names == {"admin"}
+    assert scope.admin_school_ids == {school.id}
+    assert scope.employee_school_ids == {school.id}
+    assert scope.school_ids == {school.id}
+    assert PrincipalScope.for_user(superadmin).role_names == {"superadmin"}
+    assert PrincipalScope.for_user(None).role_names == set()
+
+
+@pytest.mark.django_db
+def test_scope_is_cached_between_requests(school, teacher, goal_with_group, observation_on_group_goal):
+    client = APIClient()
+    client.force_authenticate(user=teacher)
+    params = {'group': goal_with_group.group.id, 'school': school.id}
+    # Computed once in the first request, even though several policies use it
+    with CaptureQueriesContext(connection) as queries:
+        resp = client.get('/api/goals/', params)
+    assert resp.status_code == 200
+    assert [goal['id'] for goal in resp.json()] == [goal_with_group.id]
+    assert count_scope_queries(queries) == 1
+
+    with CaptureQueriesContext(connection) as queries:
+        resp = client.get('/api/goals/', params)
+    assert [goal['id'] for goal in resp.json()] == [goal_with_group.id]
+    assert count_scope_queries(queries) == 0
+
+    # Losing the membership makes the cached scope stale
+    models.UserGroup.objects.filter(user=teacher).delete()
+    with CaptureQueriesContext(connection) as queries:
+        resp = client.get('/api/goals/', params)
+    assert resp.json() == []
+    assert count_scope_queries(queries) == 1
+
+
+@pytest.mark.django_db
+def test_bulk_import_invalidates_scope(teacher, teaching_group, teacher_role):
+    assert get_cached_principal_scope(teacher).teacher_group_ids == set()
+    memberships_data = {teaching_group.feide_id: {"teachers": [{"feide_id": teacher.feide_id}]}}
+    list(import_memberships_in_bulk(memberships_data))
+    assert get_cached_principal_scope(teacher).teacher_group_ids == {teaching_group.id}
+
+
+@pytest.mark.django_db
+def test_cleaner_bot_invalidates_scopes_at_school(school, teacher, teaching_group_with_members):
+    assert get_cached_principal_scope(teacher).teacher_group_ids == {teaching_group_with_members.id}
+    school_version = get_scope_versions(None, [school.id])
+    # Memberships which were not maintained are soft-deleted with an update, which sends no model signals
+    models.UserGroup.objects.filter(user=teacher).update(
+        maintained_at=timezone.now() - timezone.timedelta(days=1))
+    options = {"groups_earlier_than": timezone.now(), "memberships_earlier_than": timezone.now()}
+    list(update_data_integrity(school.org_number, options))
+    assert models.UserGroup.objects.filter(user=teacher, deleted_at__isnull=False).exists()
+    assert get_scope_versions(None, [school.id]) != school_version
+
+
+def test_library_principal_matching_is_unchanged():
+    """
+    BaseAccessPolicy overrides the private _get_statements_matching_principal of drf-access-policy.
+    If this fails after an upgrade of the library, the override must be checked against the new version
+    """
+    method = inspect.getattr_static(AccessPolicy, "_get_statements_matching_principal")
+    assert isinstance(method, classmethod)
+    assert list(inspect.signature(AccessPolicy._get_statements_matching_principal).parameters) == [
+        "request", "statements"]
+    assert "self._get_statements_matching_principal(request, statements)" in inspect.getsource(
+        AccessPolicy._evaluate_statements)
+
+
+@pytest.mark.django_db
+def test_principal_matching_agrees_with_library(
+        school_admin, teacher, superadmin, teaching_group_with_members):
+    # Not "admin" and "staff": the library reads is_superuser and is_staff, which our User does not have
+    statements = [{"action": ["list"], "principal": principal, "effect": "allow"} for principal in (
+        ["*"], ["authenticated"], ["anonymous"], ["role:teacher"], ["role:admin", "role:inspector"],
+        ["role:superadmin"], [f"id:{teacher.id}"], ["role:student"])]
+    library_matching = AccessPolicy._get_statements_matching_principal.__func__
+    for user in (school_admin, teacher, superadmin, AnonymousUser()):
+        request = Request(APIRequestFactory().get("/"))
+        request.user = user
+        assert (BaseAccessPolicy._get_statements_matching_principal(request, statements)
+                == library_matching(BaseAccessPolicy, request, statements))
@@ -0,0 +1,46 @@
+import pytest
+from rest_framework.test import APIRequestFactory, force_authenticate
+from rest_framework.request import Request
+from mastery import models, serializers
+from mastery.access_policies.group import GroupAccessPolicy
+
+
+def test_fields_are_built_once_per_class(monkeypatch):
+    calls = []
+    build_fields = serializers.BaseModelSerializer._build_fields
+
+    def counting_build_fields(self):
+        calls.append(type(self))
+        return build_fields(self)
+
+    monkeypatch.setattr(serializers.BaseModelSerializer, '_build_fields', counting_build_fields)
+    monkeypatch.setattr(serializers.BaseModelSerializer, '_fields_by_class', {})
+    first = serializers.GoalSerializer().fields
+    second = serializers.GoalSerializer().fields
+    assert calls == [serializers.GoalSerializer]
+    assert list(first) == list(second)
+    # Each serializer has its own field instances, bound to it
+    assert first['student_id'] is not second['student_id']
+    assert second['student_id'].parent is not first['student_id'].parent
+    assert first['created_at'].read_only and first['created_by_id'].read_only
+    assert 'is_individual' in second
+
+
+@pytest.mark.django_db
+def test_related_queryset_is_scoped_when_validating(monkeypatch, teacher, school, other_school,
+                                                    teaching_group_with_members, subject_owned_by_school):
+    other_group = models.Group.objects.create(
+        feide_id="fc:group:other", display_name="Annen skole", type="teaching", school=other_school)
+    monkeypatch.setattr(models.Group, 'access_policy', GroupAccessPolicy, raising=False)
+    http_request = APIRequestFactory().post('/')
+    force_authenticate(http_request, user=teacher)
+    request = Request(http_request)
+
+    def serializer_for(group):
+        data = {'school_id': school.id, 'group_id': group.id, 'subject_id': subject_owned_by_school.id}
+        return serializers.GoalSerializer(data=data, context={'request': request})
+
+    assert serializer_for(teaching_group_with_members).is_valid()
+    serializer = serializer_for(other_group)
+    assert not serializer.is_valid()
+    assert 'group_id' in serializer.errors
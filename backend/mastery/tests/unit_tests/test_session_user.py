@@ -0,0 +1,76 @@
+import pytest
+from importlib import import_module
+from django.conf import settings as django_settings
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from mastery.authentication import get_cached_user
+from mastery.data_import.cleaner_bot import soft_delete_users
+from mastery.data_import.import_users import import_memberships_in_bulk
+from mastery.models import UserGroup
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def count_auth_queries(queries):
+    return len([query for query in queries
+                if query['sql'].startswith('SELECT') and ('"django_session"' in query['sql']
+                                                          or 'FROM "mastery_user"' in query['sql'])])
+
+
+@pytest.mark.django_db
+def test_cached_user(teacher):
+    with CaptureQueriesContext(connection) as queries:
+        assert get_cached_user(teacher.id) == teacher
+        assert get_cached_user(teacher.id).name == teacher.name
+    assert len(queries) == 1
+
+    # Saving the user removes it from the cache
+    teacher.name = "Lærer Lund"
+    teacher.save()
+    with CaptureQueriesContext(connection) as queries:
+        assert get_cached_user(teacher.id).name == "Lærer Lund"
+    assert len(queries) == 1
+    assert get_cached_user("no-such-user") is None
+
+
+@pytest.mark.django_db
+def test_requests_without_auth_queries(settings, school, teacher):
+    settings.SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+    session = import_module(django_settings.SESSION_ENGINE).SessionStore()
+    session["user_id"] = teacher.id
+    session.save()
+    client = APIClient()
+    client.cookies[django_settings.SESSION_COOKIE_NAME] = session.session_key
+
+    resp = client.get('/api/schools/')
+    assert resp.status_code == 200
+    with CaptureQueriesContext(connection) as queries:
+        resp = client.get('/api/schools/')
+    assert resp.status_code == 200
+    assert count_auth_queries(queries) == 0
+
+
+@pytest.mark.django_db
+def test_bulk_changes_remove_cached_users(school, student, teaching_group_with_members):
+    now = timezone.now()
+    student.maintained_at = now - timezone.timedelta(days=1)
+    student.save()
+    assert get_cached_user(student.id).deleted_at is None
+    UserGroup.objects.filter(user=student).update(deleted_at=now)
+    assert soft_delete_users(school, now, now) == 1
+    assert get_cached_user(student.id).deleted_at is not None
+
+    # The bulk import undeletes the student
+    memberships_data = {teaching_group_with_members.feide_id: {"students": [
+        {"feide_id": student.feide_id, "name": "Elev Eng"}]}}
+    list(import_memberships_in_bulk(memberships_data))
+    user = get_cached_user(student.id)
+    assert (user.deleted_at, user.name) == (None, "Elev Eng")
@@ -0,0 +1,108 @@
+import pytest
+from datetime import datetime, timezone as dt_timezone
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from mastery import models
+from mastery.data_import.run_background_tasks import run
+from mastery.status_suggestions import (last_n_median, recency_weighted_mean, rescale, suggest_statuses,
+                                        suggest_statuses_for_school, trend)
+
+END_AT = datetime(2026, 6, 30, tzinfo=dt_timezone.utc)
+
+
+def points_at(*days_and_values):
+    return [(END_AT - timezone.timedelta(days=days), value) for days, value in days_and_values]
+
+
+def test_strategies():
+    points = points_at((60, 10), (30, 20), (0, 40))
+    # Weights 1/4, 1/2 and 1
+    expected = (10 / 4 + 20 / 2 + 40) / (1 / 4 + 1 / 2 + 1)
+    assert recency_weighted_mean(points, END_AT) == pytest.approx(expected)
+    assert recency_weighted_mean(points, END_AT, half_life_days=10**9) == pytest.approx(70 / 3)
+    assert last_n_median(points, END_AT) == 20
+    assert last_n_median(points, END_AT, last_n=2) == 30
+    # A straight line ending in 50 at end_at
+    assert trend(points_at((20, 30), (10, 40)), END_AT) == pytest.approx(50)
+    assert trend(points_at((10, 30), (10, 40)), END_AT) == pytest.approx(35)
+
+
+def test_rescale():
+    assert rescale(2, (1, 4), (1, 100)) == 34
+    assert rescale(2, (None, None), (1, 100)) == 2
+    assert rescale(2, (1, 4), (None, None)) == 2
+
+
+@pytest.mark.django_db
+def test_values_are_kept_within_schema(school, student, other_student, goal_with_group, mastery_schema):
+    four_levels = models.MasterySchema.objects.create(
+        school=school, config={"levels": [{"min_value": 1, "max_value": 4}]})
+    goal_with_group.mastery_schema = four_levels
+    goal_with_group.save()
+    for days, value in [(20, 2), (10, 3), (0, 4)]:
+        models.Observation.objects.create(student=student, goal=goal_with_group, mastery_value=value,
+                                          observed_at=END_AT - timezone.timedelta(days=days))
+    # Outside the period
+    models.Observation.objects.create(student=student, goal=goal_with_group, mastery_value=1,
+                                      observed_at=END_AT + timezone.timedelta(days=1))
+
+    begin_at = END_AT - timezone.timedelta(days=90)
+    suggestions = suggest_statuses(models.Observation.objects.all(), [student.id, other_student.id], begin_at,
+                                   END_AT, "trend", mastery_schema)
+    # The trend goes beyond 4, the top of the schema
+    assert suggestions[student.id] == {"mastery_value": 100, "observation_count": 3}
+    assert suggestions[other_student.id] == {"mastery_value": None, "observation_count": 0}
+    suggestions = suggest_statuses(models.Observation.objects.all(), [student.id], begin_at, END_AT,
+                                   "last_n_median", mastery_schema)
+    assert suggestions[student.id]["mastery_value"] == 67
+
+
+@pytest.mark.django_db
+def test_background_job(
+        school, student, teaching_group_with_members, subject_owned_by_school, goal_with_group):
+    teaching_group_with_members.subject = subject_owned_by_school
+    teaching_group_with_members.save()
+    models.Observation.objects.create(student=student, goal=goal_with_group, mastery_value=42,
+                                      observed_at=END_AT - timezone.timedelta(days=1))
+    task = models.DataMaintenanceTask.objects.create(
+        job_name="suggest_statuses",
+        job_params={"org_number": school.org_number, "begin_at": "2026-01-01", "end_at": "2026-06-30",
+                    "strategy": "last_n_median"},
+    )
+    run()
+    task.refresh_from_db()
+    assert task.status == "finished"
+    suggestions = task.result["suggestions"][teaching_group_with_members.id]
+    assert suggestions["subject_id"] == subject_owned_by_school.id
+    assert suggestions["students"] == {student.id: {"mastery_value": 42, "observation_count": 1}}
+
+
+@pytest.mark.django_db
+def test_background_job_queries_do_not_grow_with_groups(
+        school, student, other_student, student_role, subject_owned_by_school, goal_with_group):
+    models.Observation.objects.create(student=student, goal=goal_with_group, mastery_value=42,
+                                      subject=subject_owned_by_school,
+                                      observed_at=END_AT - timezone.timedelta(days=1))
+    options = {"begin_at": "2026-01-01", "end_at": "2026-06-30", "strategy": "last_n_median"}
+
+    def count_queries():
+        with CaptureQueriesContext(connection) as queries:
+            result = list(suggest_statuses_for_school(school.org_number, options))[-1]["result"]
+        return len(queries), result["suggestions"]
+
+    groups = []
+    for i in range(4):
+        group = models.Group.objects.create(
+            feide_id=f"fc:group:suggestions-{i}", display_name=f"Gruppe {i}", type="teaching", school=school,
+            subject=subject_owned_by_school, is_enabled=True)
+        group.add_member(student if i % 2 else other_student, student_role)
+        groups.append(group)
+        if i == 0:
+            query_count, _ = count_queries()
+    assert count_queries()[0] == query_count
+    suggestions = count_queries()[1]
+    assert suggestions[groups[1].id]["students"] == {
+        student.id: {"mastery_value": 42, "observation_count": 1}}
+    assert suggestions[groups[2].id]["students"] == {
+        other_student.id: {"mastery_value": None, "observation_count": 0}}
@@ -0,0 +1,48 @@
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from mastery.middleware import UpdateUserActivityMiddleware
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+    yield
+    cache.clear()
+
+
+def make_request(user):
+    request = RequestFactory().get('/api/goals/')
+    request.session = {"user_id": user.id}
+    return request
+
+
+def count_activity_writes(user, requests):
+    middleware = UpdateUserActivityMiddleware(lambda request: None)
+    with CaptureQueriesContext(connection) as queries:
+        for _ in range(requests):
+            middleware.process_request(make_request(user))
+    return len([query for query in queries if 'last_activity_at' in query['sql']])
+
+
+@pytest.mark.django_db
+def test_activity_is_written_once_per_interval(settings, teacher, student):
+    settings.USER_ACTIVITY_INTERVAL_SECONDS = 60
+    assert count_activity_writes(teacher, 5) == 1
+    teacher.refresh_from_db()
+    assert timezone.now() - teacher.last_activity_at < timezone.timedelta(seconds=60)
+    # Each user has an interval of their own
+    assert count_activity_writes(student, 2) == 1
+
+    # The interval is over when the cache entry expires
+    cache.clear()
+    assert count_activity_writes(teacher, 2) == 1
+
+
+@pytest.mark.django_db
+def test_activity_on_every_request(settings, teacher):
+    settings.USER_ACTIVITY_INTERVAL_SECONDS = 0
+    assert count_activity_writes(teacher, 3) == 3
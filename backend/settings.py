@@ -89,6 +89,10 @@ SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 SESSION_COOKIE_HTTPONLY = True
 SESSION_COOKIE_SECURE = True
 SESSION_COOKIE_SAMESITE = 'Strict'
+# Sessions are read from the database on every request by default. With a shared CACHE_BACKEND, use
+# django.contrib.sessions.backends.cached_db (or .cache) to read them from the cache. Not with the default
+# in-memory cache: a session ended in one process would live on in the caches of the others
+SESSION_ENGINE = os.environ.get('SESSION_ENGINE', 'django.contrib.sessions.backends.db')
 
 # cdn.jsdelivr.net is needed for swagger-ui
 CSP_DEFAULT_SRC = ("'self'", "'unsafe-inline'", "cdn.jsdelivr.net")
@@ -109,6 +113,32 @@ DATABASES = {
     }
 }
 
+# Cache, e.g. for access scopes of users. The default in-memory cache is per process: an invalidation only
+# reaches the process which made the change, not the other gunicorn workers or the background task runner.
+# Use a shared backend, like django.core.cache.backends.db.DatabaseCache (run createcachetable) or redis
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+IS_CACHE_SHARED = CACHE_BACKEND not in (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+# The caches below are invalidated when their data changes, so they are only on by default with a shared
+# cache. With a per-process cache, a revoked role or a deleted user would live on in the other processes
+# How long the access scope (roles, groups and schools) of a user is cached, 0 to disable
+PRINCIPAL_SCOPE_CACHE_SECONDS = int(
+    os.environ.get('PRINCIPAL_SCOPE_CACHE_SECONDS', '300' if IS_CACHE_SHARED else '0'))
+# How long the user of a session is cached, 0 to disable. Saving a user removes it from the cache
+USER_CACHE_SECONDS = int(os.environ.get('USER_CACHE_SECONDS', '60' if IS_CACHE_SHARED else '0'))
+# How long the schools of Feide affiliations are cached at login, 0 to disable. Saving a school removes it
+SCHOOL_CACHE_SECONDS = int(os.environ.get('SCHOOL_CACHE_SECONDS', '300' if IS_CACHE_SHARED else '0'))
+# User.last_activity_at is written at most once per this many seconds for each user, 0 to write every time
+USER_ACTIVITY_INTERVAL_SECONDS = int(os.environ.get('USER_ACTIVITY_INTERVAL_SECONDS', '60'))
+
 # Internationalization
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
@@ -139,6 +169,8 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # Only paginates lists when asked to, with the limit or cursor query parameter
+    'DEFAULT_PAGINATION_CLASS': 'mastery.pagination.KeysetPagination',
 }
 
 SPECTACULAR_SETTINGS = {